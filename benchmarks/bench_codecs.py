@@ -0,0 +1,69 @@
+"""Benchmarks the lossless video codecs of VideoEncoder
+
+Reports encode frames per second, output bytes per frame and whether the
+embedded LSBs survive a write/read round trip.
+
+Usage:
+    python -m benchmarks.bench_codecs [--video FILE] [--frames N] [--num-lsb N]
+"""
+import argparse
+import os
+import tempfile
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from steganography.decoder import VideoDecoder
+from steganography.encoder import VideoEncoder, VIDEO_CODECS
+
+
+def _synthetic_frames(n_frames: int, width: int, height: int) -> np.ndarray:
+    """Moving gradient with sensor-like noise, roughly as compressible as camera footage"""
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[:height, :width]
+    frames = np.empty((n_frames, height, width, 3), np.uint8)
+    for i in range(n_frames):
+        base = (x + 2 * i) % 256 * 0.6 + (y % 256) * 0.4
+        noise = rng.normal(0, 3, (height, width, 3))
+        frames[i] = np.clip(base[..., None] + noise, 0, 255)
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--video", help="cover video, synthetic frames if not given")
+    parser.add_argument("--frames", type=int, default=60)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--num-lsb", type=int, default=1)
+    args = parser.parse_args()
+
+    VideoParams = namedtuple("VideoParams", ["fps", "width", "height"])
+    if args.video:
+        frames, params = VideoDecoder().read_file(args.video)
+        frames = frames[:args.frames]
+        params = VideoParams(*params[:3])
+    else:
+        frames = _synthetic_frames(args.frames, args.width, args.height)
+        params = VideoParams(30.0, float(args.width), float(args.height))
+    secret_data = "x" * (frames.size * args.num_lsb // 8 // 2)
+    encoded_data = VideoEncoder().encode(frames, secret_data, args.num_lsb)
+
+    print(f"{len(frames)} frames of {int(params.width)}x{int(params.height)}, "
+          f"payload {len(secret_data)} bytes at {args.num_lsb} LSBs")
+    print(f"{'codec':>8} {'fps':>8} {'bytes/frame':>12} {'lossless':>9}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for codec in VIDEO_CODECS:
+            filename = os.path.join(temp_dir, f"{codec}.avi")
+            start = time.perf_counter()
+            VideoEncoder(codec).write_file(encoded_data, filename, params)
+            elapsed = time.perf_counter() - start
+            read_data, _ = VideoDecoder().read_file(filename)
+            lossless = np.array_equal(read_data, encoded_data)
+            print(f"{codec:>8} {len(frames) / elapsed:>8.1f} "
+                  f"{os.path.getsize(filename) // len(frames):>12} {str(lossless):>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Measures cold-start time of the package entry points
+
+Every scenario runs in a fresh interpreter, so nothing is cached between
+runs. Reports the median time to import and run it, and which heavy
+backends were loaded along the way.
+
+Usage:
+    python -m benchmarks.bench_imports [--runs N]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import wave
+
+# modules too heavy to load for jobs that do not need them
+BACKENDS = ["cv2", "ffmpeg", "PIL", "pygame", "moviepy"]
+# name to code run after the clock starts, `{wav}` is replaced by a WAV filepath
+SCENARIOS = {
+    "import cli": "import steganography.cli",
+    "import Steganography": "from steganography.steganography import Steganography",
+    "wav capacity": "from steganography.steganography import Steganography\n"
+                    "Steganography().capacity({wav!r})",
+    "wav encode/decode": "from steganography.steganography import Steganography\n"
+                         "stega = Steganography()\n"
+                         "stega.decode(stega.encode({wav!r}, 'secret', {wav!r} + '.out'))",
+    "image capacity": "from steganography.steganography import Steganography\n"
+                      "Steganography().capacity('tests/black_128.png')",
+}
+RUNNER = """
+import sys, time, json
+start = time.perf_counter()
+{code}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "loaded": [m for m in {backends!r} if m in sys.modules]}}))
+"""
+
+
+def _write_wav(filename: str):
+    with wave.open(filename, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(8000)
+        f.writeframes(bytes(16000))
+
+
+def _run(code: str) -> dict:
+    script = RUNNER.format(code=code, backends=BACKENDS)
+    output = subprocess.run(
+        [sys.executable, "-c", script], check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per scenario")
+    args = parser.parse_args()
+
+    print(f"{'scenario':>20} {'median ms':>10} {'min ms':>8}  backends loaded")
+    with tempfile.TemporaryDirectory() as directory:
+        wav = os.path.join(directory, "cover.wav")
+        _write_wav(wav)
+        for name, code in SCENARIOS.items():
+            runs = [_run(code.format(wav=wav)) for _ in range(args.runs)]
+            seconds = [run["seconds"] for run in runs]
+            print(f"{name:>20} {statistics.median(seconds) * 1e3:>10.1f} "
+                  f"{min(seconds) * 1e3:>8.1f}  {', '.join(runs[0]['loaded']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Benchmarks payload packing against the original string based implementation
+
+Usage:
+    python -m benchmarks.bench_packing [--size BYTES] [--repeat N]
+"""
+import argparse
+import time
+
+import numpy as np
+
+import steganography.bitplane as bitplane
+
+
+def _legacy_data_to_binarray(data: str, num_lsb=1) -> np.ndarray:
+    bin_str = ''.join([f"{ord(i):08b}" for i in data])
+    int_vals = [int(i) for i in bin_str]
+    padding = (num_lsb - (len(int_vals) % num_lsb)) % num_lsb
+    int_vals += [0] * padding
+    int_vals = [int_vals[i: i+num_lsb] for i in range(0, len(int_vals), num_lsb)]
+    int_vals = [int("".join([str(bit) for bit in bit_group]), 2) for bit_group in int_vals]
+    return np.array(int_vals, np.uint8)
+
+
+def _best_of(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=1 << 20,
+                        help="payload size in bytes")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    payload = "".join(map(chr, rng.integers(32, 127, args.size)))
+    print(f"payload: {args.size} bytes")
+    print(f"{'num_lsb':>7} {'legacy (s)':>11} {'numpy (s)':>10} {'speedup':>8} {'MB/s':>8}")
+    for num_lsb in range(1, 9):
+        expected = _legacy_data_to_binarray(payload, num_lsb)
+        assert np.array_equal(bitplane.pack(payload, num_lsb), expected)
+        legacy = _best_of(
+            lambda: _legacy_data_to_binarray(payload, num_lsb), args.repeat)
+        vectorized = _best_of(
+            lambda: bitplane.pack(payload, num_lsb), args.repeat)
+        print(f"{num_lsb:>7} {legacy:>11.3f} {vectorized:>10.4f} "
+              f"{legacy / vectorized:>7.0f}x {args.size / vectorized / 1e6:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+"""Measures throughput and peak memory of every encoder/decoder on synthetic media
+
+Generates images, WAV files and a lossless video in a temp directory, runs
+the encode and decode pipelines for each num_lsb and reports the wall time,
+tracemalloc peak and RSS peak of every stage. Each case is run without
+compression and with every method passed to --compression, reporting the
+compressed payload size and the effective capacity of the cover alongside.
+Results are written to JSON, and a previous results file can be passed to
+compare throughput against.
+
+Usage:
+    python -m benchmarks.bench_suite [--preset small|full] [--num-lsb N ...]
+                                     [--compression none|zlib|bz2|lzma ...]
+                                     [--output FILE] [--compare FILE]
+"""
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+import wave
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import cv2
+import numpy as np
+
+from benchmarks.bench_codecs import _synthetic_frames
+from steganography.decoder import AudioDecoder, ImageDecoder, VideoDecoder
+from steganography.encoder import AudioEncoder, ImageEncoder, VideoEncoder
+import steganography.payload as payload
+import steganography.probe as probe
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows, RSS is then not reported
+    resource = None
+
+# images as (width, height), WAVs as (sample width in bytes, channels, seconds) and videos as
+# (frames, width, height)
+PRESETS = {
+    "small": {
+        "image": [(640, 480), (1280, 800)],
+        "audio": [(1, 1, 10), (2, 2, 10), (4, 2, 10)],
+        "video": [(30, 320, 240)],
+    },
+    "full": {
+        "image": [(640, 480), (1920, 1080), (4000, 3000), (12000, 8400)],
+        "audio": [(1, 1, 600), (2, 1, 600), (2, 2, 600), (4, 2, 600), (2, 2, 3600)],
+        "video": [(120, 1280, 720), (60, 1920, 1080)],
+    },
+}
+WAV_FRAMERATE = 44100
+# seconds of audio generated at a time, so hour-long files never sit in memory
+WAV_BLOCK_SECONDS = 10
+# words text payloads are made of, so they compress like prose rather than noise
+PAYLOAD_WORDS = (
+    "the of and to in is was for on that with as by at from this it be are an or have "
+    "steganography image audio video frame sample payload cover header least significant bit "
+    "encode decode compress stream capacity message hidden secret data file channel pixel"
+).split()
+
+
+def _synthetic_image(width: int, height: int) -> np.ndarray:
+    """Diagonal gradient with mild noise"""
+    rng = np.random.default_rng(0)
+    y, x = np.ogrid[:height, :width]
+    base = ((x + y) * 255 // (width + height)).astype(np.uint8)
+    image = np.repeat(base[..., None], 3, axis=2)
+    image += rng.integers(0, 4, image.shape, dtype=np.uint8)
+    return image
+
+
+def _write_synthetic_wav(filename: str, sampwidth: int, nchannels: int, seconds: int):
+    """Writes a sine sweep with noise, generated block by block"""
+    rng = np.random.default_rng(0)
+    dtype = {1: np.uint8, 2: np.int16, 4: np.int32}[sampwidth]
+    info = np.iinfo(dtype)
+    amplitude = (int(info.max) - int(info.min)) // 4
+    offset = (int(info.max) + int(info.min) + 1) // 2
+    with wave.open(filename, "wb") as audio:
+        audio.setnchannels(nchannels)
+        audio.setsampwidth(sampwidth)
+        audio.setframerate(WAV_FRAMERATE)
+        for start in range(0, seconds, WAV_BLOCK_SECONDS):
+            t = np.arange(min(WAV_BLOCK_SECONDS, seconds - start) * WAV_FRAMERATE) / WAV_FRAMERATE
+            t += start
+            signal = np.sin(2 * np.pi * (220 + 10 * t) * t)[:, None] * amplitude + offset
+            signal = signal + rng.normal(0, amplitude / 100, (len(t), nchannels))
+            audio.writeframes(np.clip(signal, info.min, info.max).astype(dtype).tobytes())
+
+
+def _generate_media(preset: dict, directory: str) -> list[dict]:
+    """Writes the cover files of a preset
+
+    Args:
+        preset (dict): entry of `PRESETS`, possibly without some media types
+        directory (str): directory to write the files to
+
+    Returns:
+        list[dict]: cases with the media type, description and cover filepath
+    """
+    cases = []
+    for width, height in preset.get("image", []):
+        filename = os.path.join(directory, f"image_{width}x{height}.png")
+        cv2.imwrite(filename, _synthetic_image(width, height), [cv2.IMWRITE_PNG_COMPRESSION, 1])
+        cases.append({"media": "image", "config": f"{width}x{height} ({width * height / 1e6:.1f} MP)",
+                      "cover": filename})
+    for sampwidth, nchannels, seconds in preset.get("audio", []):
+        filename = os.path.join(directory, f"audio_{sampwidth * 8}bit_{nchannels}ch_{seconds}s.wav")
+        _write_synthetic_wav(filename, sampwidth, nchannels, seconds)
+        cases.append({"media": "audio", "config": f"{sampwidth * 8}-bit {nchannels}ch {seconds}s",
+                      "cover": filename})
+    for n_frames, width, height in preset.get("video", []):
+        filename = os.path.join(directory, f"video_{width}x{height}_{n_frames}.avi")
+        VideoParams = namedtuple("VideoParams", ["fps", "width", "height"])
+        VideoEncoder().write_file(_synthetic_frames(n_frames, width, height), filename,
+                                  VideoParams(30.0, float(width), float(height)))
+        cases.append({"media": "video", "config": f"{n_frames} frames {width}x{height}",
+                      "cover": filename})
+    return cases
+
+
+def _reset_peak_rss():
+    # writing 5 to clear_refs resets the peak RSS of the process (Linux only)
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _peak_rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    # ru_maxrss is in KiB on Linux, and cannot be reset
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+@contextmanager
+def _stage(stages: dict, name: str):
+    """Records wall time, tracemalloc peak and RSS peak of the enclosed code as stage `name`"""
+    _reset_peak_rss()
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        stages[name] = {"seconds": seconds, "tracemalloc_peak_mb": peak / 1e6,
+                        "rss_peak_mb": _peak_rss_mb()}
+
+
+def _text_payload(size: int, seed: int) -> str:
+    """Generates `size` characters of text from `PAYLOAD_WORDS`"""
+    rng = np.random.default_rng(seed)
+    words = rng.choice(PAYLOAD_WORDS, size // 4 + 1)
+    return " ".join(words)[:size]
+
+
+def _run_case(
+    case: dict,
+    num_lsb: int,
+    directory: str,
+    fill: float,
+    compression: str = None
+) -> dict:
+    """Encodes a payload filling `fill` of the capacity into a cover and decodes it again
+
+    Args:
+        case (dict): case from `_generate_media`
+        num_lsb (int): number of LSBs
+        directory (str): directory for output files
+        fill (float): payload size as a fraction of the capacity
+        compression (str, optional): method to compress the payload with. Defaults to None.
+
+    Returns:
+        dict: `case` with the payload size, stage measurements and throughput added
+    """
+    cover = case["cover"]
+    info = probe.cover_info(cover)
+    capacity = probe.capacity(info, num_lsb)
+    secret_data = _text_payload(int(capacity * fill), num_lsb)
+    compressed_bytes, effective_capacity = len(secret_data), capacity
+    if compression is not None:
+        estimate = probe.estimate_compression(info, secret_data, num_lsb, compression)
+        compressed_bytes, effective_capacity = \
+            estimate.compressed_size, estimate.effective_capacity
+    options = {"compression": compression}
+    output = os.path.join(directory, "output")
+    stages = {}
+    match case["media"]:
+        case "image":
+            encoder, decoder = ImageEncoder(**options), ImageDecoder()
+            output += ".bmp"
+            with _stage(stages, "read"):
+                data, params = encoder.read_file(cover)
+            with _stage(stages, "encode"):
+                encoded_data = encoder.encode(data, secret_data, num_lsb, inplace=True)
+            with _stage(stages, "write"):
+                encoder.write_file(encoded_data, output)
+            del data, encoded_data
+            with _stage(stages, "decode_read"):
+                data, params = decoder.read_file(output)
+            with _stage(stages, "decode"):
+                decoded_data = decoder.decode(data, num_lsb)
+        case "audio":
+            encoder, decoder = AudioEncoder(**options), AudioDecoder()
+            output += ".wav"
+            with _stage(stages, "encode_file"):
+                encoder.encode_file(cover, secret_data, output, num_lsb)
+            with _stage(stages, "decode_read"):
+                data, params = decoder.read_file(output)
+            with _stage(stages, "decode"):
+                decoded_data = decoder.decode(data, num_lsb)
+            del data
+        case "video":
+            encoder, decoder = VideoEncoder(**options), VideoDecoder()
+            output += ".avi"
+            with _stage(stages, "encode_write"):
+                video, params = encoder.open_file(cover)
+                encoder.write_file(encoder.batched_encode(video, secret_data, num_lsb), output, params)
+            with _stage(stages, "decode"):
+                frames, params = decoder.open_file(output)
+                decoded_data = decoder.decode(frames, num_lsb)
+    assert decoded_data == secret_data, f"round trip failed for {case['config']}"
+    encode_seconds = sum(stage["seconds"] for name, stage in stages.items()
+                         if not name.startswith("decode"))
+    decode_seconds = sum(stage["seconds"] for name, stage in stages.items()
+                         if name.startswith("decode"))
+    cover_bytes = os.path.getsize(cover)
+    os.remove(output)
+    return {
+        **case,
+        "encoder": type(encoder).__name__,
+        "decoder": type(decoder).__name__,
+        "num_lsb": num_lsb,
+        "compression": compression or "none",
+        "cover_bytes": cover_bytes,
+        "capacity_bytes": capacity,
+        "effective_capacity_bytes": effective_capacity,
+        "payload_bytes": len(secret_data),
+        "compressed_bytes": compressed_bytes,
+        "stages": stages,
+        "encode_seconds": encode_seconds,
+        "decode_seconds": decode_seconds,
+        "encode_cover_mb_s": cover_bytes / 1e6 / encode_seconds,
+        "encode_payload_mb_s": len(secret_data) / 1e6 / encode_seconds,
+        "decode_payload_mb_s": len(secret_data) / 1e6 / decode_seconds,
+        "peak_rss_mb": max((stage["rss_peak_mb"] or 0) for stage in stages.values()),
+        "peak_tracemalloc_mb": max(stage["tracemalloc_peak_mb"] for stage in stages.values()),
+    }
+
+
+def _case_id(result: dict) -> tuple:
+    return result["media"], result["config"], result["num_lsb"], result.get("compression", "none")
+
+
+def _print_comparison(results: list[dict], baseline_file: str):
+    with open(baseline_file) as f:
+        baseline = {_case_id(result): result for result in json.load(f)["results"]}
+    print(f"\ncompared to {baseline_file} (encode/decode speedup, rss new/old)")
+    print(f"{'media':>6} {'config':>28} {'lsb':>3} {'comp':>5} {'encode':>7} {'decode':>7} {'rss':>7}")
+    for result in results:
+        old = baseline.get(_case_id(result))
+        if old is None:
+            continue
+        print(f"{result['media']:>6} {result['config']:>28} {result['num_lsb']:>3} "
+              f"{result['compression']:>5} "
+              f"{old['encode_seconds'] / result['encode_seconds']:>6.2f}x "
+              f"{old['decode_seconds'] / result['decode_seconds']:>6.2f}x "
+              f"{result['peak_rss_mb'] / old['peak_rss_mb'] if old['peak_rss_mb'] else 0:>6.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--preset", choices=PRESETS, default="small",
+                        help="media sizes, 'full' goes up to 100 MP images and hour-long WAVs")
+    parser.add_argument("--num-lsb", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--media", choices=["image", "audio", "video"], nargs="+",
+                        default=["image", "audio", "video"])
+    parser.add_argument("--fill", type=float, default=0.5,
+                        help="payload size as a fraction of the cover capacity")
+    parser.add_argument("--compression", choices=["none", *payload.CODECS], nargs="+",
+                        default=["none", "zlib"], help="compression methods to run every case with")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON results file")
+    parser.add_argument("--compare", help="earlier JSON results file to compare against")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'media':>6} {'config':>28} {'lsb':>3} {'comp':>5} {'ratio':>5} {'enc s':>7} {'dec s':>7} "
+          f"{'enc MB/s':>9} {'dec MB/s':>9} {'rss MB':>7} {'trace MB':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        preset = {media: sizes for media, sizes in PRESETS[args.preset].items()
+                  if media in args.media}
+        for case in _generate_media(preset, directory):
+            for num_lsb in args.num_lsb:
+                for compression in args.compression:
+                    result = _run_case(
+                        case, num_lsb, directory, args.fill,
+                        None if compression == "none" else compression)
+                    result["cover"] = os.path.basename(result["cover"])
+                    results.append(result)
+                    ratio = result["payload_bytes"] / max(result["compressed_bytes"], 1)
+                    print(f"{result['media']:>6} {result['config']:>28} {num_lsb:>3} "
+                          f"{result['compression']:>5} {ratio:>5.1f} "
+                          f"{result['encode_seconds']:>7.3f} {result['decode_seconds']:>7.3f} "
+                          f"{result['encode_cover_mb_s']:>9.1f} {result['decode_payload_mb_s']:>9.1f} "
+                          f"{result['peak_rss_mb'] or 0:>7.0f} {result['peak_tracemalloc_mb']:>8.1f}")
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "meta": {
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "preset": args.preset,
+                "fill": args.fill,
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "opencv": cv2.__version__,
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+            },
+            "results": results,
+        }, f, indent=2)
+    print(f"results written to {args.output}")
+    if args.compare:
+        _print_comparison(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,6 @@
 import os
 import sys
 import threading
-import shutil
 
 from typing import Optional, Union
 from tkinter import *
@@ -9,22 +8,33 @@ from tkinter.ttk import *
 from tkinter import filedialog, messagebox, Event
 from functools import partial
 
-from PIL import Image, ImageTk
-import cv2
-import pygame
-from moviepy.editor import VideoFileClip
 from tkinterdnd2 import TkinterDnD, DND_FILES
-from steganography.encoder import AudioEncoder, ImageEncoder, VideoEncoder
 
 from steganography.steganography import Steganography
-from steganography.util import IMAGE_EXTENSIONS, AUDIO_EXTENSIONS, VIDEO_EXTENSIONS
+from steganography.cache import ResultCache
+from steganography.jobs import JobExecutor
+from steganography.preview import PreviewCache
+import steganography.sniff as sniff
+from steganography.util import lazy_import
+
+# Preview and playback backends, imported the first time a file is shown or played
+Image = lazy_import("PIL.Image")
+ImageTk = lazy_import("PIL.ImageTk")
+pygame = lazy_import("pygame")
+moviepy_editor = lazy_import("moviepy.editor")
 # steganography/util.py
 
 # Define image file extensions
 
 # image used <a href="https://www.flaticon.com/free-icons/equalizer" title="equalizer icons">Equalizer icons created by Ehtisham Abid - Flaticon</a>
 # Initialize Steganography and Decoders
-stega = Steganography()
+# Repeated previews decode the same files, so keep their results
+stega = Steganography(cache=ResultCache())
+# Encodes and decodes run off the main thread, one at a time, the window polls for their results
+executor = JobExecutor(workers=1, max_pending=2)
+POLL_INTERVAL_MS = 50
+# Downscaled previews of the covers and outputs shown, decoded once per file version
+previews = PreviewCache()
 temp_path = None
 
 
@@ -48,15 +58,18 @@ def drop(event: Event, encode=True):
         process_file(dropped_file_path, after_image, encode)
 
 
-def display_image(label: Label, image: Union[str, Image.Image]):
+def display_image(label: Label, image: Union[str, "Image.Image"]):
     """Displays the image in the specified label
 
     Args:
         label (Label): Label to display the image in
-        image (Union[str, Image.Image]): Image object or file path of the image to be displayed
+        image (Union[str, Image.Image]): Image object or file path of the image or video to be displayed
     """
     if isinstance(image, str):
-        image = Image.open(image)
+        preview = previews.get(image)
+        if preview is None:
+            return
+        image = Image.fromarray(preview)
     # Limit the size of the displayed image
     image.thumbnail((200, 200))
     photo = ImageTk.PhotoImage(image)
@@ -83,11 +96,11 @@ def process_file(
         display_image(after_image, file_path)
         after_image_path = file_path
     elif file_path:
-        file_extension = os.path.splitext(file_path)[1][1:].lower()
-        print(f"File Extension: {file_extension}")
-        if file_extension in IMAGE_EXTENSIONS:
+        media_type = sniff.media_type(file_path)
+        print(f"Media type: {media_type}")
+        if media_type == "image":
             display_image(placeholder_image_location, file_path)
-        elif file_extension in AUDIO_EXTENSIONS:
+        elif media_type == "audio":
             # Play Audio
             display_image(placeholder_image_location, "tests/audioimage.png")
             if encode:
@@ -98,14 +111,10 @@ def process_file(
                 play_file_button_decode = Button(
                     decode_button_frame, text="Play File", command=lambda: play_audio(file_path))
                 play_file_button_decode.grid(row=0, column=1)
-        elif file_extension in VIDEO_EXTENSIONS:
-            video = cv2.VideoCapture(file_path)
-            ret, frame = video.read()
-            if ret:
+        elif media_type == "video":
+            if previews.get(file_path) is not None:
                 # Display Before Image
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                pil_image = Image.fromarray(frame)
-                display_image(placeholder_image_location, pil_image)
+                display_image(placeholder_image_location, file_path)
                 if encode:
                     play_file_button_encode = Button(
                         encode_button_frame, text="Play File", command=lambda: play_video(root, file_path))
@@ -164,21 +173,21 @@ def encode_image(
 def decode_image():
     """Decodes the loaded image and displays the decoded message in the secret message entry box
     """
-    def _decode_image_thread():
-        global after_image_path
-        if after_image_path:
-            try:
-                num_lsb = int(lsb_combobox.get())
-                decoded_message = stega.decode(after_image_path, num_lsb)
-                secret_message_entry.delete("1.0", END)
-                secret_message_entry.insert("1.0", decoded_message)
-            except Exception as e:
-                messagebox.showerror(
-                    "Error", f"Error {type(e)} decoding message: {str(e)}")
-        else:
-            messagebox.showwarning("No File", "No dropped file to decode.")
-    decode_thread = threading.Thread(target=_decode_image_thread)
-    decode_thread.start()
+    if not after_image_path:
+        messagebox.showwarning("No File", "No dropped file to decode.")
+        return
+    file_path = after_image_path
+    num_lsb = int(lsb_combobox.get())
+
+    def _decode(reporter):
+        with stega.reporting(reporter):
+            return stega.decode(file_path, num_lsb)
+
+    def _done(decoded_message):
+        secret_message_entry.delete("1.0", END)
+        secret_message_entry.insert("1.0", decoded_message)
+
+    submit_job(_decode, "Decoding", _done, "decoding message")
 
 
 def encode_av(
@@ -201,89 +210,113 @@ def encode_av(
 
 
 def save_encoded_file():
-    """Saves the encoded file to a new file path
+    """Saves the last encoded file to a new file path
     """
-    global dropped_file_path, after_image_pil
-
-    if dropped_file_path:
-        file_extension = dropped_file_path.split('.')[-1].lower()
-        if file_extension in IMAGE_EXTENSIONS:
-            save_ext = ".bmp"
-            file_type = "image"
-        elif file_extension in AUDIO_EXTENSIONS:
-            save_ext = ".wav"
-            file_type = "audio"
-        elif file_extension in VIDEO_EXTENSIONS:
-            save_ext = ".avi"
-            file_type = "video"
-        else:
-            messagebox.showerror("Error", "Unsupported file format.")
-            return
-
-        save_path = filedialog.asksaveasfilename(defaultextension=save_ext, filetypes=[
-                                                 (f"{save_ext[1:].upper()} files", f"*{save_ext}")])
-        if save_path:
-            # Get path to current file to be saved
-            file_count = 1
-            while os.path.exists(os.path.join(stega.get_temp_file(), f"{file_type}{file_count}{save_ext}")):
-                file_count += 1
-            temp_file = os.path.join(
-                stega.get_temp_file(), f"{file_type}{file_count-1}{save_ext}")
-
-            # Copy file from temp directory to specified save path
-            shutil.copy(temp_file, save_path)
-            messagebox.showinfo(
-                "Success", f"Encoded {file_type} saved successfully.")
-        else:
-            messagebox.showinfo("Failed", f"Encoded {file_type} not saved.")
+    artifact = stega.artifacts.find(temp_path) if temp_path else None
+    if artifact is None:
+        messagebox.showwarning("No File", "No encoded file to save.")
+        return
+
+    save_ext = os.path.splitext(artifact.path)[1]
+    save_path = filedialog.asksaveasfilename(defaultextension=save_ext, filetypes=[
+                                             (f"{save_ext[1:].upper()} files", f"*{save_ext}")])
+    if save_path:
+        # Link or copy the file out of the artifact store to the specified save path
+        stega.artifacts.save(artifact, save_path)
+        messagebox.showinfo(
+            "Success", f"Encoded {artifact.media_type} saved successfully.")
     else:
-        messagebox.showwarning("No File", "No dropped file to encode.")
+        messagebox.showinfo("Failed", f"Encoded {artifact.media_type} not saved.")
 
 
 def encode_file():
     """General encode function that handles encoding for all file types
     """
-    def _encode_file_thread():
-        global dropped_file_path, after_image_pil, temp_path, play_file_button_decode, decode_button_frame, after_image_path
-        if dropped_file_path:
-            secret_message = secret_message_entry.get("1.0", 'end-1c')
-            if not secret_message:
-                messagebox.showwarning(
-                    "No Message", "No secret message to encode.")
-                return
-            if not dropped_file_path:
-                messagebox.showwarning("No File", "No dropped file to encode.")
-                return
-            num_lsb = int(lsb_combobox.get())
-            try:
-                temp_path = stega.encode(
-                    dropped_file_path, secret_message, True, num_lsb)
-                secret_message_entry.delete("1.0", END)
-                after_image_path = temp_path
-                match stega.encoder:
-                    case ImageEncoder():
-                        display_image(after_image, temp_path)
-                    case AudioEncoder():
-                        display_image(after_image, "tests/audioimage.png")
-                        play_file_button_decode = Button(
-                            decode_button_frame, text="Play File", command=lambda: play_audio(temp_path))
-                        play_file_button_decode.grid(row=0, column=1)
-                    case VideoEncoder():
-                        video = cv2.VideoCapture(temp_path)
-                        ret, frame = video.read()
-                        if ret:
-                            # Display after Image
-                            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                            after_image_pil = Image.fromarray(frame)
-                            display_image(after_image, after_image_pil)
-                        play_file_button_decode = Button(
-                            decode_button_frame, text="Play File", command=lambda: play_video(root, temp_path))
-                        play_file_button_decode.grid(row=0, column=1)
-            except Exception as e:
-                messagebox.showerror(
-                    "Error", f"Error {type(e)} encoding file: {str(e)}")
-    encode_thread = threading.Thread(target=_encode_file_thread)
-    encode_thread.start()
+    if not dropped_file_path:
+        messagebox.showwarning("No File", "No dropped file to encode.")
+        return
+    secret_message = secret_message_entry.get("1.0", 'end-1c')
+    if not secret_message:
+        messagebox.showwarning(
+            "No Message", "No secret message to encode.")
+        return
+    file_path = dropped_file_path
+    num_lsb = int(lsb_combobox.get())
+
+    def _encode(reporter):
+        with stega.reporting(reporter):
+            return stega.encode(file_path, secret_message, True, num_lsb)
+
+    def _done(output_path):
+        global temp_path, play_file_button_decode, after_image_path
+        temp_path = output_path
+        secret_message_entry.delete("1.0", END)
+        after_image_path = temp_path
+        match sniff.media_type(temp_path):
+            case "image":
+                display_image(after_image, temp_path)
+            case "audio":
+                display_image(after_image, "tests/audioimage.png")
+                play_file_button_decode = Button(
+                    decode_button_frame, text="Play File", command=lambda: play_audio(temp_path))
+                play_file_button_decode.grid(row=0, column=1)
+            case "video":
+                # Display after Image
+                display_image(after_image, temp_path)
+                play_file_button_decode = Button(
+                    decode_button_frame, text="Play File", command=lambda: play_video(root, temp_path))
+                play_file_button_decode.grid(row=0, column=1)
+
+    submit_job(_encode, "Encoding", _done, "encoding file")
+
+
+def submit_job(work, name: str, on_done, action: str):
+    """Runs `work` on the job executor, reporting its progress and outcome in the window
+
+    Args:
+        work (Callable[[Reporter], Any]): work to run off the main thread, called with the reporter
+            to run the encode or decode with
+        name (str): status shown while the job runs
+        on_done (Callable[[Any], None]): called on the main thread with the result of `work`
+        action (str): what the job does, for error messages
+    """
+    def _error(e):
+        status_label.config(text="")
+        messagebox.showerror(
+            "Error", f"Error {type(e)} {action}: {str(e)}")
+
+    def _cancelled():
+        status_label.config(text="Cancelled")
+
+    def _done(result):
+        status_label.config(text="Done")
+        on_done(result)
+
+    try:
+        executor.submit(work, name, on_done=_done, on_error=_error,
+                        on_progress=show_progress, on_cancelled=_cancelled)
+    except RuntimeError as e:
+        messagebox.showwarning("Busy", str(e))
+        return
+    progress_bar.config(value=0)
+    status_label.config(text=name + "...")
+
+
+def show_progress(task: str, done: int, total: Optional[int]):
+    """Shows the progress of the running job"""
+    if total:
+        progress_bar.config(value=100 * done / total)
+
+
+def cancel_jobs():
+    """Cancels the running and queued jobs, they stop at their next chunk of work"""
+    executor.cancel_all()
+
+
+def poll_jobs():
+    """Applies the progress and results of the jobs to the window, then polls again"""
+    executor.dispatch()
+    root.after(POLL_INTERVAL_MS, poll_jobs)
 
 
 def clear_images():
@@ -340,7 +373,7 @@ def _play_video(root, file_path):
         file_path (str): File path of the video file
     """
     try:
-        video_clip = VideoFileClip(file_path)
+        video_clip = moviepy_editor.VideoFileClip(file_path)
         video_clip.preview(
             fps=24, audio=True,
             # threaded=True, winname="Video Preview" # ! Doesn't work
@@ -352,10 +385,7 @@ def _play_video(root, file_path):
 def tempfile_cleanup():
     """Cleans up the temp files on exit
     """
-    global temp_path
-    temp_path = stega.get_temp_dir()
-    if temp_path is not None:
-        temp_path.cleanup()
+    stega.artifacts.cleanup()
 
 def clear_all_images():
     """Clears all the images and resets the global variables."""
@@ -375,10 +405,7 @@ after_image_path = None
 
 
 def main():
-    global before_image, after_image, dropped_image, secret_message_entry, lsb_combobox, root, encode_frame, encode_button_frame, decode_frame, decode_button_frame, after_image_path, play_file_button_decode
-    pygame.mixer.init()
-    pygame.font.init()
-
+    global before_image, after_image, dropped_image, secret_message_entry, lsb_combobox, root, progress_bar, status_label, encode_frame, encode_button_frame, decode_frame, decode_button_frame, after_image_path, play_file_button_decode
     root = TkinterDnD.Tk()
     root.title("Steganography")
     root.geometry("835x700")
@@ -473,7 +500,18 @@ def main():
     clear_all_button = Button(action_button_frame, text="Clear All", command=clear_all_images)
     clear_all_button.grid(row=0, column=3, padx=5,pady=5)
 
+    # Progress of the running encode or decode
+    progress_bar = Progressbar(action_button_frame, length=150, maximum=100)
+    progress_bar.grid(row=1, column=0, columnspan=2, padx=5, pady=5)
+    status_label = Label(action_button_frame, text="")
+    status_label.grid(row=1, column=2, pady=5)
+    cancel_button = Button(action_button_frame, text="Cancel", command=cancel_jobs)
+    cancel_button.grid(row=1, column=3, padx=5, pady=5)
+
+    root.after(POLL_INTERVAL_MS, poll_jobs)
     root.mainloop()
+    # Stop running jobs before their temp files are removed
+    executor.shutdown(cancel=True)
     tempfile_cleanup()
 
 
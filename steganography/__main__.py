@@ -0,0 +1,5 @@
+import sys
+
+from steganography.cli import main
+
+sys.exit(main())
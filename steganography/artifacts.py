@@ -0,0 +1,220 @@
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Union
+
+
+class Artifact(NamedTuple):
+    """Output file kept by an `ArtifactStore`
+
+    Attributes:
+        id (int): id of the artifact, unique within its store
+        path (str): filepath to the file
+        media_type (str): "image", "audio" or "video"
+        size (int): size of the file in bytes
+    """
+    id: int
+    path: str
+    media_type: str
+    size: int
+
+
+def link_or_copy(source: str, destination: str):
+    """Makes `destination` a hardlink to `source`, or else a copy of it
+
+    An existing `destination` is replaced atomically.
+
+    Args:
+        source (str): filepath to the file
+        destination (str): filepath to link or copy it to
+    """
+    staging = f"{destination}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.link(source, staging)
+    except OSError:
+        # other filesystem, or no hardlink support
+        shutil.copyfile(source, staging)
+    try:
+        os.replace(staging, destination)
+    except BaseException:
+        os.remove(staging)
+        raise
+
+
+class ArtifactStore:
+    """Directory of encoded outputs, indexed by id and path
+
+    Outputs are named from a counter per media type instead of probing the
+    directory for a free name, so the directory must only be written to by
+    the store. They are looked up through in-memory indexes. Once the
+    files exceed `max_bytes`, the least recently used ones are removed,
+    except the newest. The directory is created on first use, in the temp
+    directory unless one is given.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: int = 1 << 30):
+        """Initialises the store
+
+        Args:
+            directory (Optional[str], optional): directory to keep the files in. Defaults to None,
+                a temp directory removed by `cleanup`.
+            max_bytes (int, optional): maximum size of the files kept. Defaults to 1 GiB.
+        """
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.temp_dir = None
+        self._directory = directory
+        self._ids = itertools.count(1)
+        self._counters = {}
+        self._artifacts = OrderedDict()
+        self._paths = {}
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self) -> str:
+        """Directory the files are kept in, created if needed"""
+        with self._lock:
+            if self._directory is None:
+                self.temp_dir = tempfile.TemporaryDirectory()
+                self._directory = self.temp_dir.name
+            elif not os.path.isdir(self._directory):
+                os.makedirs(self._directory, exist_ok=True)
+            return self._directory
+
+    def __len__(self) -> int:
+        return len(self._artifacts)
+
+    @property
+    def latest(self) -> Optional[Artifact]:
+        """Most recently added or used artifact, None if the store is empty"""
+        with self._lock:
+            return next(reversed(self._artifacts.values()), None)
+
+    def reserve(self, media_type: str, ext: str) -> str:
+        """Picks the filepath of a new output, to write it to then `add` it
+
+        Args:
+            media_type (str): media type of the output, prefixed to the file name
+            ext (str): extension of the output, including the dot
+
+        Returns:
+            str: filepath to a new file name in the store
+        """
+        directory = self.directory
+        with self._lock:
+            counter = self._counters.setdefault(media_type, itertools.count(1))
+            return os.path.join(directory, f"{media_type}{next(counter)}{ext}")
+
+    def add(self, filename: str, media_type: str) -> Artifact:
+        """Records an output written to a path from `reserve`, evicting old outputs if over budget
+
+        Args:
+            filename (str): filepath to the output
+            media_type (str): "image", "audio" or "video"
+
+        Returns:
+            Artifact: handle of the output
+        """
+        path = os.path.abspath(filename)
+        with self._lock:
+            if path in self._paths:
+                self._forget(self._paths[path])
+            artifact = Artifact(next(self._ids), path, media_type, os.path.getsize(path))
+            self._artifacts[artifact.id] = artifact
+            self._paths[path] = artifact.id
+            self.total_bytes += artifact.size
+            self._evict()
+        return artifact
+
+    def get(self, artifact_id: int) -> Optional[Artifact]:
+        """Looks up an artifact by id, marking it as used
+
+        Args:
+            artifact_id (int): id of the artifact
+
+        Returns:
+            Optional[Artifact]: the artifact, None if unknown or evicted
+        """
+        with self._lock:
+            artifact = self._artifacts.get(artifact_id)
+            if artifact is not None:
+                self._artifacts.move_to_end(artifact_id)
+            return artifact
+
+    def find(self, filename: str) -> Optional[Artifact]:
+        """Looks up an artifact by filepath, marking it as used
+
+        Args:
+            filename (str): filepath to the output
+
+        Returns:
+            Optional[Artifact]: the artifact, None if the file is not in the store
+        """
+        artifact_id = self._paths.get(os.path.abspath(filename))
+        return None if artifact_id is None else self.get(artifact_id)
+
+    def save(self, artifact: Union[Artifact, int], destination: str, move: bool = False) -> str:
+        """Saves an artifact to `destination`, by hardlink or rename when possible
+
+        Args:
+            artifact (Union[Artifact, int]): artifact or its id
+            destination (str): filepath to save the output to, replaced if it exists
+            move (bool, optional): move the file out of the store instead of linking it.
+                Defaults to False.
+
+        Raises:
+            KeyError: artifact not in the store
+
+        Returns:
+            str: `destination`
+        """
+        artifact_id = artifact.id if isinstance(artifact, Artifact) else artifact
+        artifact = self.get(artifact_id)
+        if artifact is None:
+            raise KeyError(f"Artifact {artifact_id} not in the store.")
+        if move:
+            # rename within a filesystem, copy and delete across them
+            shutil.move(artifact.path, destination)
+            with self._lock:
+                self._forget(artifact.id, remove=False)
+        else:
+            link_or_copy(artifact.path, destination)
+        return destination
+
+    def remove(self, artifact: Union[Artifact, int]):
+        """Deletes an artifact and its file
+
+        Args:
+            artifact (Union[Artifact, int]): artifact or its id
+        """
+        with self._lock:
+            self._forget(artifact.id if isinstance(artifact, Artifact) else artifact)
+
+    def cleanup(self):
+        """Deletes every artifact, and the directory if it is a temp directory"""
+        with self._lock:
+            for artifact_id in list(self._artifacts):
+                self._forget(artifact_id)
+            if self.temp_dir is not None:
+                self.temp_dir.cleanup()
+                self.temp_dir = self._directory = None
+
+    def _forget(self, artifact_id: int, remove: bool = True):
+        artifact = self._artifacts.pop(artifact_id, None)
+        if artifact is None:
+            return
+        del self._paths[artifact.path]
+        self.total_bytes -= artifact.size
+        if remove:
+            try:
+                os.remove(artifact.path)
+            except FileNotFoundError:
+                pass
+
+    def _evict(self):
+        # the newest artifact is kept even if it alone exceeds the budget
+        while self.total_bytes > self.max_bytes and len(self._artifacts) > 1:
+            self._forget(next(iter(self._artifacts)))
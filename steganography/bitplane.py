@@ -0,0 +1,347 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Union
+
+import numpy as np
+
+# samples per block of the chunked engine, small enough for a block and its bits to stay in cache
+DEFAULT_BLOCK_SIZE = 1 << 18
+
+
+def sample_view(
+    samples: np.ndarray,
+    num_lsb: int = 1
+) -> np.ndarray:
+    """Views `samples` as a flat array of unsigned integers holding the LSBs
+
+    Signed samples are viewed as unsigned integers of the same width, and
+    packed samples with a structured dtype (e.g. 24-bit PCM) by their first,
+    least significant field. No data is copied for contiguous arrays.
+
+    Args:
+        samples (np.ndarray): integer samples of any shape
+        num_lsb (int, optional): number of LSBs that will be used. Defaults to 1.
+
+    Raises:
+        ValueError: samples are not integers
+        ValueError: num_lsb must be between 1 and bit_depth
+
+    Returns:
+        np.ndarray: flat unsigned view of `samples`
+    """
+    flat = samples.reshape(-1)
+    if flat.dtype.names:
+        flat = flat[flat.dtype.names[0]]
+    if flat.dtype.kind == "i":
+        flat = flat.view(flat.dtype.str.replace("i", "u"))
+    elif flat.dtype.kind != "u":
+        raise ValueError(f"Samples of type {flat.dtype} not supported, only integers.")
+    bit_depth = flat.dtype.itemsize * 8
+    if num_lsb > bit_depth or num_lsb < 1:
+        raise ValueError(f"num_lsb must be between 1 and {bit_depth}")
+    return flat
+
+
+def _for_each_block(
+    func: Callable[[int, int], None],
+    n_samples: int,
+    workers: int = 1,
+    block_size: int = DEFAULT_BLOCK_SIZE
+):
+    """Calls `func(start, stop)` for consecutive blocks of `n_samples` samples
+
+    Blocks keep the intermediate arrays in cache, which pays off even on one
+    thread. NumPy releases the GIL for the bitwise work, so with several
+    `workers` the blocks are processed on a thread pool.
+
+    Args:
+        func (Callable[[int, int], None]): processes samples `start` to `stop`
+        n_samples (int): total number of samples
+        workers (int, optional): number of threads. Defaults to 1.
+        block_size (int, optional): samples per block. Defaults to DEFAULT_BLOCK_SIZE.
+
+    Raises:
+        ValueError: block_size must be positive
+    """
+    if block_size < 1:
+        raise ValueError("block_size must be positive")
+    starts = range(0, n_samples, block_size)
+    if workers <= 1 or n_samples <= block_size:
+        for start in starts:
+            func(start, min(start + block_size, n_samples))
+        return
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # consume the results so exceptions of the workers are raised here
+        for _ in executor.map(lambda start: func(start, min(start + block_size, n_samples)), starts):
+            pass
+
+
+def _lsb_bits(
+    samples: np.ndarray,
+    num_lsb: int = 1,
+    workers: int = 1,
+    block_size: int = DEFAULT_BLOCK_SIZE
+) -> np.ndarray:
+    """Unpacks the `num_lsb` low bits of every sample into a flat bit array
+
+    Bits of each sample are emitted most significant first, so that the result
+    is the same bitstream the encoder wrote.
+
+    Args:
+        samples (np.ndarray): flat array of integer samples
+        num_lsb (int, optional): number of LSBs to unpack per sample. Defaults to 1.
+        workers (int, optional): number of threads. Defaults to 1.
+        block_size (int, optional): samples per block. Defaults to DEFAULT_BLOCK_SIZE.
+
+    Returns:
+        np.ndarray: array of 0/1 values of dtype uint8
+    """
+    if len(samples) > block_size:
+        bits = np.empty(len(samples) * num_lsb, np.uint8)
+
+        def unpack_block(start: int, stop: int):
+            bits[start * num_lsb:stop * num_lsb] = _lsb_bits(samples[start:stop], num_lsb)
+        _for_each_block(unpack_block, len(samples), workers, block_size)
+        return bits
+    if num_lsb == 1:
+        return (samples & 1).astype(np.uint8)
+    if num_lsb <= 8:
+        lsbs = (samples & (2 ** num_lsb - 1)).astype(np.uint8)
+        bits = np.unpackbits(lsbs).reshape(-1, 8)[:, 8 - num_lsb:]
+    else:
+        shifts = np.arange(num_lsb - 1, -1, -1, dtype=samples.dtype)
+        bits = ((samples[:, None] >> shifts) & 1).astype(np.uint8)
+    return bits.reshape(-1)
+
+
+def extract(
+    samples: np.ndarray,
+    num_lsb: int = 1,
+    workers: int = 1,
+    block_size: int = DEFAULT_BLOCK_SIZE
+) -> np.ndarray:
+    """Extracts the payload bytes stored in the `num_lsb` LSBs of `samples`
+
+    Trailing bits that do not make up a whole byte are dropped. Blocks are
+    rounded to a multiple of 8 samples, so every block unpacks to whole bytes
+    and is packed straight into its slice of the output.
+
+    Args:
+        samples (np.ndarray): array of integer samples of any shape
+        num_lsb (int, optional): number of LSBs to extract from. Defaults to 1.
+        workers (int, optional): number of threads. Defaults to 1.
+        block_size (int, optional): samples per block. Defaults to DEFAULT_BLOCK_SIZE.
+
+    Raises:
+        ValueError: num_lsb must be between 1 and bit_depth
+
+    Returns:
+        np.ndarray: packed payload of dtype uint8
+    """
+    flat = sample_view(samples, num_lsb)
+    payload = np.empty(len(flat) * num_lsb // 8, np.uint8)
+
+    def extract_block(start: int, stop: int):
+        bits = _lsb_bits(flat[start:stop], num_lsb)
+        n_bytes = len(bits) // 8
+        payload[start * num_lsb // 8:][:n_bytes] = np.packbits(bits[:n_bytes * 8])
+    _for_each_block(extract_block, len(flat), workers, max(block_size - block_size % 8, 8))
+    return payload
+
+
+class BitReader:
+    """Reads the LSB bitstream of a sequence of sample chunks on demand
+
+    Chunks (e.g. video frames) are only pulled from the iterable, and samples
+    only unpacked, once the bits they hold are actually requested.
+    """
+
+    def __init__(
+        self,
+        chunks: Iterable[np.ndarray],
+        num_lsb: int = 1,
+        workers: int = 1,
+        block_size: int = DEFAULT_BLOCK_SIZE
+    ):
+        """Initialises the reader
+
+        Args:
+            chunks (Iterable[np.ndarray]): arrays of integer samples of any shape
+            num_lsb (int, optional): number of LSBs to read per sample. Defaults to 1.
+            workers (int, optional): number of threads to unpack large reads with. Defaults to 1.
+            block_size (int, optional): samples per block. Defaults to DEFAULT_BLOCK_SIZE.
+        """
+        self.num_lsb = num_lsb
+        self.workers = workers
+        self.block_size = block_size
+        self.samples_read = 0
+        self._chunks = iter(chunks)
+        self._samples = np.empty(0, np.uint8)
+        self._bits = np.empty(0, np.uint8)
+
+    def _next_chunk(self) -> np.ndarray:
+        try:
+            samples = next(self._chunks)
+        except StopIteration:
+            raise ValueError(
+                "[!] Cover ended before the hidden data was complete.") from None
+        return sample_view(samples, self.num_lsb)
+
+    def read_bits(self, n_bits: int) -> np.ndarray:
+        """Reads the next `n_bits` bits of the bitstream
+
+        Args:
+            n_bits (int): number of bits to read
+
+        Raises:
+            ValueError: cover ended before `n_bits` bits could be read
+
+        Returns:
+            np.ndarray: array of 0/1 values of dtype uint8
+        """
+        parts = [self._bits]
+        available = len(self._bits)
+        while available < n_bits:
+            if len(self._samples) == 0:
+                self._samples = self._next_chunk()
+            n_samples = -(-(n_bits - available) // self.num_lsb)
+            samples = self._samples[:n_samples]
+            self._samples = self._samples[n_samples:]
+            parts.append(_lsb_bits(
+                samples, self.num_lsb, self.workers, self.block_size))
+            available += len(samples) * self.num_lsb
+            self.samples_read += len(samples)
+        bits = np.concatenate(parts) if len(parts) > 1 else parts[0]
+        self._bits = bits[n_bits:]
+        return bits[:n_bits]
+
+    def read_bytes(self, n_bytes: int) -> bytes:
+        """Reads the next `n_bytes` bytes of the bitstream
+
+        Args:
+            n_bytes (int): number of bytes to read
+
+        Raises:
+            ValueError: cover ended before `n_bytes` bytes could be read
+
+        Returns:
+            bytes: data read
+        """
+        return np.packbits(self.read_bits(n_bytes * 8)).tobytes()
+
+
+def _as_uint8(data: Union[str, bytes, bytearray, memoryview, np.ndarray]) -> np.ndarray:
+    """Views `data` as a flat uint8 array without copying where possible
+
+    Args:
+        data (Union[str, bytes, bytearray, memoryview, np.ndarray]): payload
+
+    Raises:
+        TypeError: data of unsupported type
+
+    Returns:
+        np.ndarray: payload bytes as a flat uint8 array
+    """
+    match data:
+        case str():
+            # each character maps to the byte of the same ordinal
+            return np.frombuffer(data.encode("latin-1"), np.uint8)
+        case bytes() | bytearray() | memoryview():
+            return np.frombuffer(data, np.uint8)
+        case np.ndarray() if data.dtype == np.uint8:
+            return data.reshape(-1)
+        case _:
+            raise TypeError(f"data of type {type(data)} not supported.")
+
+
+def pack(
+    data: Union[str, bytes, bytearray, memoryview, np.ndarray],
+    num_lsb: int = 1
+) -> np.ndarray:
+    """Splits the payload into `num_lsb`-bit symbols, one per cover sample
+
+    The last symbol is zero padded on the right if the payload size in bits is
+    not a multiple of `num_lsb`.
+
+    Args:
+        data (Union[str, bytes, bytearray, memoryview, np.ndarray]): payload to pack
+        num_lsb (int, optional): number of bits per symbol. Defaults to 1.
+
+    Raises:
+        ValueError: num_lsb must be between 1 and 8
+        TypeError: data of unsupported type
+
+    Returns:
+        np.ndarray: symbols of dtype uint8
+    """
+    if num_lsb > 8 or num_lsb < 1:
+        raise ValueError("num_lsb must be between 1 and 8")
+    payload = _as_uint8(data)
+    if num_lsb == 8:
+        return payload.copy()
+    if num_lsb == 1:
+        return np.unpackbits(payload)
+    if 8 % num_lsb == 0:
+        # symbols never straddle a byte, so shift them out of each byte directly
+        shifts = np.arange(8 - num_lsb, -1, -num_lsb, dtype=np.uint8)
+        symbols = (payload[:, None] >> shifts) & np.uint8(2 ** num_lsb - 1)
+        return symbols.reshape(-1)
+    bits = np.unpackbits(payload)
+    bits = np.concatenate((bits, np.zeros(-len(bits) % num_lsb, np.uint8)))
+    # packbits left-aligns each group of `num_lsb` bits within a byte
+    symbols = np.packbits(bits.reshape(-1, num_lsb), axis=1).reshape(-1)
+    return symbols >> np.uint8(8 - num_lsb)
+
+
+def embed(
+    cover: np.ndarray,
+    symbols: np.ndarray,
+    num_lsb: int = 1,
+    inplace: bool = False,
+    workers: int = 1,
+    block_size: int = DEFAULT_BLOCK_SIZE
+) -> np.ndarray:
+    """Writes `symbols` into the `num_lsb` LSBs of the first samples of `cover`
+
+    Only the flattened prefix of `cover` holding the payload is touched, the
+    remaining samples are left as they are. The bitwise operations run on an
+    unsigned view of the samples (see `sample_view`), so any integer width and
+    signedness is handled without a copy. Both passes over a block are done
+    while it is still in cache, by up to `workers` threads at once.
+
+    Args:
+        cover (np.ndarray): cover samples of any shape
+        symbols (np.ndarray): `num_lsb`-bit symbols, e.g. from `pack`
+        num_lsb (int, optional): number of LSBs to encode into. Defaults to 1.
+        inplace (bool, optional): write into `cover` instead of a copy. Defaults to False.
+        workers (int, optional): number of threads. Defaults to 1.
+        block_size (int, optional): samples per block. Defaults to DEFAULT_BLOCK_SIZE.
+
+    Raises:
+        ValueError: num_lsb must be between 1 and bit_depth
+        ValueError: Insufficient bytes, use a larger cover, greater LSBs, or less data.
+        ValueError: in-place encoding needs a writeable, contiguous cover
+
+    Returns:
+        np.ndarray: encoded cover, `cover` itself if `inplace` is set
+    """
+    if len(symbols) > cover.size:
+        raise ValueError(
+            "[!] Insufficient bytes, use a larger image,"
+            + " greater LSBs, or less data."
+        )
+    if inplace:
+        if not (cover.flags.c_contiguous and cover.flags.writeable):
+            raise ValueError(
+                "In-place encoding needs a writeable, contiguous cover.")
+        encoded = cover
+    else:
+        encoded = cover.copy()
+    prefix = sample_view(encoded, num_lsb)[:len(symbols)]
+    mask = np.invert(np.array(2 ** num_lsb - 1, prefix.dtype))
+
+    def embed_block(start: int, stop: int):
+        block = prefix[start:stop]
+        block &= mask
+        block |= symbols[start:stop]
+    _for_each_block(embed_block, len(symbols), workers, block_size)
+    return encoded
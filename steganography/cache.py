@@ -0,0 +1,229 @@
+import hashlib
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from typing import Optional, Union
+
+# size of the blocks files are hashed in
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def file_fingerprint(filename: str, hash_content: bool = False) -> str:
+    """Identifies the current content of a file
+
+    Args:
+        filename (str): filepath to the file
+        hash_content (bool, optional): hash the whole file instead of using its path, size and
+            modification time. Slower, but also matches copies of a file. Defaults to False.
+
+    Raises:
+        FileNotFoundError: file not found
+
+    Returns:
+        str: fingerprint, different whenever the file changes
+    """
+    if hash_content:
+        digest = hashlib.blake2b()
+        with open(filename, "rb") as f:
+            while block := f.read(HASH_BLOCK_SIZE):
+                digest.update(block)
+        return digest.hexdigest()
+    stat = os.stat(filename)
+    return f"{os.path.realpath(filename)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class ResultCache:
+    """Cache of decoded messages and encoded files, keyed by input content and parameters
+
+    Results are kept in an in-memory LRU bounded by entry count and text size.
+    With a `directory`, they are also stored on disk, evicting the least
+    recently used files once the store exceeds `max_disk_bytes`, so they
+    outlive the process and the temp files they were first written to.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        max_bytes: int = 64 << 20,
+        directory: Optional[str] = None,
+        max_disk_bytes: int = 1 << 30,
+        hash_content: bool = False
+    ):
+        """Initialises the cache
+
+        Args:
+            max_entries (int, optional): maximum number of results kept in memory. Defaults to 256.
+            max_bytes (int, optional): maximum size of decoded messages kept in memory. Defaults to 64 MiB.
+            directory (Optional[str], optional): directory of the on-disk store. Defaults to None, memory only.
+            max_disk_bytes (int, optional): maximum size of the on-disk store. Defaults to 1 GiB.
+            hash_content (bool, optional): key input files by content hash instead of path, size and
+                modification time, see `file_fingerprint`. Defaults to False.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.hash_content = hash_content
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def key(self, operation: str, filename: str, *params: Union[str, bytes, memoryview, int]) -> str:
+        """Builds the key of an operation on a file
+
+        Args:
+            operation (str): name of the operation, e.g. "encode"
+            filename (str): filepath to the input file
+            *params (Union[str, bytes, memoryview, int]): parameters the result depends on, e.g. secret data
+
+        Raises:
+            FileNotFoundError: file not found
+
+        Returns:
+            str: hex digest identifying the result
+        """
+        digest = hashlib.sha256()
+        for part in (operation, file_fingerprint(filename, self.hash_content), *params):
+            match part:
+                case bytes():
+                    data = part
+                case bytearray() | memoryview():
+                    data = bytes(part)
+                case str():
+                    data = part.encode("utf-8", "surrogatepass")
+                case _:
+                    data = repr(part).encode()
+            # length prefixed, so parameters cannot run into each other
+            digest.update(len(data).to_bytes(8, "little") + data)
+        return digest.hexdigest()
+
+    def get_text(self, key: str) -> Optional[str]:
+        """Looks up a decoded message
+
+        Args:
+            key (str): key from `key`
+
+        Returns:
+            Optional[str]: cached message, None if not cached
+        """
+        with self._lock:
+            text = None
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                text = self._entries[key][1]
+            disk_path = self._disk_path(key, ".txt")
+            if text is None and disk_path is not None and os.path.isfile(disk_path):
+                with open(disk_path, "r", encoding="latin-1", newline="") as f:
+                    text = f.read()
+                os.utime(disk_path)
+                self._remember(key, ("text", text), len(text))
+            self._count(text is not None)
+            return text
+
+    def put_text(self, key: str, text: str):
+        """Caches a decoded message
+
+        Args:
+            key (str): key from `key`
+            text (str): decoded message
+        """
+        with self._lock:
+            self._remember(key, ("text", text), len(text))
+            disk_path = self._disk_path(key, ".txt")
+            if disk_path is not None:
+                with open(disk_path, "w", encoding="latin-1", newline="") as f:
+                    f.write(text)
+                self._evict_disk()
+
+    def get_file(self, key: str, ext: str) -> Optional[str]:
+        """Looks up an encoded file
+
+        Files that were changed or removed since they were cached are ignored.
+
+        Args:
+            key (str): key from `key`
+            ext (str): extension of the file, including the dot
+
+        Returns:
+            Optional[str]: filepath to the cached file, None if not cached
+        """
+        with self._lock:
+            filename = None
+            if key in self._entries:
+                _, cached_filename, fingerprint = self._entries[key]
+                if os.path.isfile(cached_filename) \
+                        and file_fingerprint(cached_filename) == fingerprint:
+                    self._entries.move_to_end(key)
+                    filename = cached_filename
+                else:
+                    self._forget(key)
+            disk_path = self._disk_path(key, ext)
+            if filename is None and disk_path is not None and os.path.isfile(disk_path):
+                os.utime(disk_path)
+                self._remember(key, ("file", disk_path, file_fingerprint(disk_path)), 0)
+                filename = disk_path
+            self._count(filename is not None)
+            return filename
+
+    def put_file(self, key: str, filename: str):
+        """Caches an encoded file
+
+        Args:
+            key (str): key from `key`
+            filename (str): filepath to the encoded file, which is copied to the on-disk store
+        """
+        with self._lock:
+            self._remember(key, ("file", filename, file_fingerprint(filename)), 0)
+            disk_path = self._disk_path(key, os.path.splitext(filename)[1])
+            if disk_path is not None and os.path.abspath(filename) != os.path.abspath(disk_path):
+                shutil.copyfile(filename, disk_path)
+                self._evict_disk()
+
+    def clear(self):
+        """Removes all results from memory and from the on-disk store"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self.directory is not None:
+                for entry in os.scandir(self.directory):
+                    os.remove(entry.path)
+
+    def _disk_path(self, key: str, ext: str) -> Optional[str]:
+        if self.directory is None:
+            return None
+        return os.path.join(self.directory, key + ext)
+
+    def _count(self, hit: bool):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def _remember(self, key: str, entry: tuple, size: int):
+        self._forget(key)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._forget(next(iter(self._entries)))
+
+    def _forget(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None and entry[0] == "text":
+            self._bytes -= len(entry[1])
+
+    def _evict_disk(self):
+        # least recently used first, hits refresh the modification time
+        files = sorted(os.scandir(self.directory), key=lambda entry: entry.stat().st_mtime_ns)
+        total = sum(entry.stat().st_size for entry in files)
+        for entry in files:
+            if total <= self.max_disk_bytes:
+                break
+            total -= entry.stat().st_size
+            os.remove(entry.path)
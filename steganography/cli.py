@@ -0,0 +1,267 @@
+"""Headless command line interface
+
+Usage:
+    python -m steganography encode COVER OUTPUT (--message TEXT | --message-file FILE | --payload-file FILE)
+                                   [--num-lsb N] [--compress METHOD [--level N]]
+    python -m steganography decode FILE [--num-lsb N|auto] [--output FILE] [--workers N]
+    python -m steganography capacity FILE [--num-lsb N] [--compress METHOD [--level N] --sample FILE]
+    python -m steganography batch MANIFEST [--workers N] [--results FILE]
+
+A batch manifest holds one JSON job per line, e.g.
+    {"op": "encode", "cover": "in.png", "output": "out.png", "message": "hi", "num_lsb": 2}
+    {"op": "encode", "cover": "in.wav", "output": "out.wav", "message_file": "secret.txt"}
+    {"op": "encode", "cover": "in.mp4", "output": "out.avi", "payload_file": "archive.zip"}
+    {"op": "encode", "cover": "in.png", "output": "out.png", "message": "hi", "compression": "lzma"}
+    {"op": "decode", "file": "out.png", "num_lsb": 2, "output": "decoded.txt"}
+    {"op": "decode", "file": "out.wav", "num_lsb": null}  (null detects the number of LSBs)
+
+"message_file" is read as text, "payload_file" is streamed as raw bytes and
+decodes to bytes. "compression" (zlib, bz2 or lzma) and "compression_level"
+compress the payload before embedding, decoding detects it. Decoded messages
+are written to "output" as is.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import steganography.payload as payload
+from steganography.steganography import Steganography
+
+# one instance per worker process, reused across the jobs it runs
+_stega = None
+
+
+def _get_stega() -> Steganography:
+    global _stega
+    if _stega is None:
+        _stega = Steganography()
+    return _stega
+
+
+def _read_message(job: dict) -> str:
+    if "message_file" in job:
+        with open(job["message_file"], "r") as f:
+            return f.read()
+    return job["message"]
+
+
+def _encode(stega: Steganography, job: dict) -> str:
+    options = (job.get("num_lsb", 1), job.get("compression"), job.get("compression_level"))
+    if "payload_file" in job:
+        # streamed, so payloads larger than memory can be embedded into long videos
+        with open(job["payload_file"], "rb") as f:
+            return stega.encode(job["cover"], f, job["output"], *options)
+    return stega.encode(job["cover"], _read_message(job), job["output"], *options)
+
+
+def run_job(job: dict) -> dict:
+    """Runs a single encode or decode job
+
+    Args:
+        job (dict): job description, see the module docstring
+
+    Returns:
+        dict: `job` with the outcome added: "ok", "seconds", "bytes" (size of the input file),
+            "stages" (time, bytes and frames per pipeline stage, see `instrument.Recorder`),
+            "result" (output filepath or decoded message, binary messages as latin-1 text
+            flagged by "binary") or "error"
+    """
+    result = dict(job)
+    start = time.perf_counter()
+    stega = _get_stega()
+    with stega.recording() as recorder:
+        _run_op(stega, job, result)
+    result["stages"] = recorder.as_dict()
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def _run_op(stega: Steganography, job: dict, result: dict):
+    try:
+        match job.get("op"):
+            case "encode":
+                result["bytes"] = os.path.getsize(job["cover"])
+                result["result"] = _encode(stega, job)
+            case "decode":
+                result["bytes"] = os.path.getsize(job["file"])
+                if job.get("output"):
+                    with open(job["output"], "wb") as f:
+                        stega.decode(job["file"], job.get("num_lsb", 1), job.get("workers"), f)
+                    result["result"] = job["output"]
+                else:
+                    message = stega.decode(job["file"], job.get("num_lsb", 1), job.get("workers"))
+                    if isinstance(message, bytes):
+                        # kept JSON serialisable, one character per byte
+                        message = message.decode("latin-1")
+                        result["binary"] = True
+                    result["result"] = message
+            case op:
+                raise ValueError(f"Unknown operation '{op}', use 'encode' or 'decode'.")
+        result["ok"] = True
+    except Exception as e:
+        result["ok"] = False
+        result["error"] = f"{type(e).__name__}: {e}"
+
+
+def run_batch(
+    jobs: list[dict],
+    workers: Optional[int] = None,
+    results_file=None
+) -> dict:
+    """Runs jobs on a process pool
+
+    Args:
+        jobs (list[dict]): jobs to run, see the module docstring
+        workers (Optional[int], optional): number of worker processes. Defaults to the number of CPUs.
+        results_file (optional): text file to write one JSON result per line to, in job order.
+            Defaults to None.
+
+    Returns:
+        dict: summary with job counts, failed job results, wall time and throughput
+    """
+    start = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for result in executor.map(run_job, jobs):
+            results.append(result)
+            if results_file is not None:
+                results_file.write(json.dumps(result) + "\n")
+                results_file.flush()
+    wall_time = time.perf_counter() - start
+    failures = [result for result in results if not result["ok"]]
+    total_bytes = sum(result.get("bytes", 0) for result in results)
+    return {
+        "jobs": len(results),
+        "succeeded": len(results) - len(failures),
+        "failed": len(failures),
+        "wall_seconds": wall_time,
+        "jobs_per_second": len(results) / wall_time if wall_time else 0.0,
+        "mb_per_second": total_bytes / 1e6 / wall_time if wall_time else 0.0,
+        "failures": failures,
+    }
+
+
+def _num_lsb(value: str) -> Optional[int]:
+    return None if value == "auto" else int(value)
+
+
+def _read_manifest(filename: str) -> list[dict]:
+    with open(filename, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m steganography",
+        description="Hide data in the LSBs of images, WAV audio and video.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    encode = subparsers.add_parser("encode", help="encode a message into a cover file")
+    encode.add_argument("cover", help="cover file")
+    encode.add_argument("output", help="output file, its extension is chosen by media type")
+    message = encode.add_mutually_exclusive_group(required=True)
+    message.add_argument("--message", help="message to encode")
+    message.add_argument("--message-file", help="text file holding the message to encode")
+    message.add_argument("--payload-file", help="file of any type to encode, read in chunks")
+    encode.add_argument("--num-lsb", type=int, default=1)
+    encode.add_argument("--compress", choices=payload.CODECS, default=None,
+                        help="compress the message before embedding")
+    encode.add_argument("--level", type=int, default=None, help="compression level")
+
+    decode = subparsers.add_parser("decode", help="decode the message from a file")
+    decode.add_argument("file", help="encoded file")
+    decode.add_argument("--num-lsb", type=_num_lsb, default=1,
+                        help="number of LSBs, or 'auto' to detect it")
+    decode.add_argument("--output", help="file to write the message to instead of stdout")
+    decode.add_argument("--workers", type=int, default=None,
+                        help="number of processes to decode a video with")
+
+    capacity = subparsers.add_parser("capacity", help="print how many bytes fit into a cover file")
+    capacity.add_argument("file", help="cover file")
+    capacity.add_argument("--num-lsb", type=int, default=1)
+    capacity.add_argument("--compress", choices=payload.CODECS, default=None,
+                          help="also report the capacity for --sample compressed with this method")
+    capacity.add_argument("--level", type=int, default=None, help="compression level")
+    capacity.add_argument("--sample", help="payload, or a sample of it, to estimate the compression of")
+
+    batch = subparsers.add_parser("batch", help="run the jobs of a JSON-lines manifest")
+    batch.add_argument("manifest", help="JSON-lines file with one job per line")
+    batch.add_argument("--workers", type=int, default=None,
+                       help="number of worker processes, defaults to the number of CPUs")
+    batch.add_argument("--results", help="file to write per-job JSON results to, defaults to stdout")
+    return parser
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """Entry point of `python -m steganography`
+
+    Args:
+        argv (Optional[list[str]], optional): command line arguments. Defaults to sys.argv[1:].
+
+    Returns:
+        int: exit code, 1 if any job failed
+    """
+    args = _build_parser().parse_args(argv)
+    match args.command:
+        case "encode":
+            job = {"op": "encode", "cover": args.cover, "output": args.output,
+                   "num_lsb": args.num_lsb, "compression": args.compress,
+                   "compression_level": args.level}
+            if args.payload_file is not None:
+                job["payload_file"] = args.payload_file
+            elif args.message_file is not None:
+                job["message_file"] = args.message_file
+            else:
+                job["message"] = args.message
+            result = run_job(job)
+            if result["ok"]:
+                print(result["result"])
+        case "decode":
+            result = run_job({"op": "decode", "file": args.file, "num_lsb": args.num_lsb,
+                              "output": args.output, "workers": args.workers})
+            if result["ok"] and args.output is None:
+                if result.get("binary"):
+                    sys.stdout.flush()
+                    sys.stdout.buffer.write(result["result"].encode("latin-1"))
+                else:
+                    sys.stdout.write(result["result"])
+        case "capacity":
+            try:
+                if args.compress is None:
+                    print(_get_stega().capacity(args.file, args.num_lsb))
+                elif args.sample is None:
+                    raise ValueError("--compress needs a --sample to estimate the compression of.")
+                else:
+                    with open(args.sample, "rb") as sample:
+                        estimate = _get_stega().estimate_compression(
+                            args.file, sample, args.num_lsb, args.compress, args.level)
+                    print(json.dumps(estimate._asdict()))
+            except (OSError, ValueError) as e:
+                print(f"{type(e).__name__}: {e}", file=sys.stderr)
+                return 1
+            return 0
+        case "batch":
+            jobs = _read_manifest(args.manifest)
+            if args.results:
+                with open(args.results, "w") as results_file:
+                    summary = run_batch(jobs, args.workers, results_file)
+            else:
+                summary = run_batch(jobs, args.workers, sys.stdout)
+            print(
+                f"{summary['jobs']} jobs, {summary['failed']} failed in "
+                f"{summary['wall_seconds']:.2f}s ({summary['jobs_per_second']:.1f} jobs/s, "
+                f"{summary['mb_per_second']:.1f} MB/s)",
+                file=sys.stderr
+            )
+            for failure in summary["failures"]:
+                print(f"  {failure.get('op')} {failure.get('cover', failure.get('file'))}: "
+                      f"{failure['error']}", file=sys.stderr)
+            return 1 if summary["failed"] else 0
+    if not result["ok"]:
+        print(result["error"], file=sys.stderr)
+        return 1
+    return 0
@@ -4,79 +4,204 @@ import sys
 
 import abc
 import io
-from typing import NamedTuple, Union
-import wave
-from math import prod
-import re
+from typing import BinaryIO, Generator, Iterable, Iterator, NamedTuple, Optional, Union
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, repeat
 
 import numpy as np
-import cv2
-from tqdm.auto import tqdm
 
 import steganography.util as util
+import steganography.bitplane as bitplane
+import steganography.header as header
+import steganography.wav as wav
+import steganography.instrument as instrument
+import steganography.payload as payload
+import steganography.sniff as sniff
+from steganography.payload import DecodedData
+
+# imported on first use, see `util.lazy_import`
+cv2 = util.lazy_import("cv2")
+
+# payload bytes extracted between progress reports
+PROGRESS_CHUNK_SIZE = 1 << 22
+
+
 class Decoder(abc.ABC):
-    def __init__(self, *args, **kwargs):
+    def __init__(
+        self,
+        workers: int = 1,
+        block_size: int = bitplane.DEFAULT_BLOCK_SIZE,
+        *args,
+        reporter: instrument.Reporter = None,
+        **kwargs
+    ):
+        """Initialises the decoder
+
+        Args:
+            workers (int, optional): number of threads unpacking blocks of large payloads. Defaults to 1.
+            block_size (int, optional): samples per block. Defaults to bitplane.DEFAULT_BLOCK_SIZE.
+            reporter (instrument.Reporter, optional): receives stage timings and progress.
+                Defaults to None, reporting nothing.
+        """
         self.decoded_data = ""
+        self.workers = workers
+        self.block_size = block_size
+        self.reporter = reporter or instrument.NULL_REPORTER
 
     @abc.abstractmethod
     def decode(
         self,
         encoded_data: np.ndarray[Union[int, np.uint8, np.int16, np.int32]],
-        num_lsb: int = 1
-    ) -> str:
+        num_lsb: Optional[int] = 1,
+        output: Optional[BinaryIO] = None
+    ) -> DecodedData:
         raise NotImplementedError("Method not implemented.")
 
     def _decode_frame(
         self,
         encoded_frame: np.ndarray[Union[int, np.uint8, np.int16, np.int32]],
-        num_lsb: int = 1,
-        early_stop: str = "=====",
-        keep_early_stop: bool = False
-    ) -> str:
+        num_lsb: Optional[int] = 1,
+        output: Optional[BinaryIO] = None
+    ) -> DecodedData:
         """Decodes the secret data from an encoded frame or frames
 
         Args:
             encoded_frame (np.ndarray[Union[int, np.uint8, np.int16, np.int32]]): encoded frame or frames
-            num_lsb (int, optional): number of LSBs to decode from. Defaults to 1.
-            early_stop (str, optional): stop condition. Defaults to "=====".
-            keep_early_stop (bool, optional): keep the stop condition in the returned string. Defaults to False.
+            num_lsb (Optional[int], optional): number of LSBs to decode from, None to detect it.
+                Defaults to 1.
+            output (Optional[BinaryIO], optional): binary file object to write the payload to.
+                Defaults to None, returning it.
 
         Raises:
             ValueError: num_lsb must be between 1 and bit_depth
+            ValueError: no hidden data found
 
         Returns:
-            str: decoded secret data
+            DecodedData: decoded secret data, see `_decode_stream`
         """
-        binary_data = ""
-        self.decoded_data = ""
-        bit_depth = encoded_frame.dtype.itemsize * 8
-        if num_lsb > bit_depth or num_lsb < 1:
-            raise ValueError(f"num_lsb must be between 1 and {bit_depth}")
-        bitmask = 2 ** num_lsb - 1
-        n_channels = encoded_frame.shape[-1]
-        channel_bitmask = [bitmask] * n_channels
-        mask = np.array(channel_bitmask, encoded_frame.dtype)
-        mask = np.tile(mask, (*encoded_frame.shape[:-1], 1))
-        masked_data = np.bitwise_and(encoded_frame, mask)
-        # convert each element to binary string and take last `num_lsb` bits
-        masked_data = masked_data.reshape((prod(masked_data.shape)))
-        masked_data_str = [f"{i:08b}"[-num_lsb:] for i in masked_data]
-        # concat all the binary strings and split by byte
-        binary_data = "".join(masked_data_str)
-        all_bytes = [binary_data[i: i+8]
-                     for i in range(0, len(binary_data), 8)]
-        # iterate over all bytes and convert from bits to characters sequentially
-        # until the stop condition is reached
-        for byte in tqdm(all_bytes):
-            self.decoded_data += chr(int(byte, 2))
-            if early_stop is not None:
-                if self.decoded_data[-len(early_stop):] == early_stop:
-                    if not keep_early_stop:
-                        self.decoded_data = self.decoded_data[:-
-                                                              len(early_stop)]
-                    break
+        return self._decode_stream([encoded_frame], num_lsb, output)
+
+    def _decode_stream(
+        self,
+        encoded_chunks: Iterable[np.ndarray[Union[int, np.uint8, np.int16, np.int32]]],
+        num_lsb: Optional[int] = 1,
+        output: Optional[BinaryIO] = None
+    ) -> DecodedData:
+        """Decodes the secret data from a sequence of encoded chunks
+
+        The payload header is read first, after which exactly the number of
+        bits it announces are read. Chunks past the end of the payload are
+        never pulled from `encoded_chunks`. With `output`, the payload is
+        written to it chunk by chunk instead of being held in memory.
+
+        Args:
+            encoded_chunks (Iterable[np.ndarray[Union[int, np.uint8, np.int16, np.int32]]]):
+                encoded frames or sample blocks, in order
+            num_lsb (Optional[int], optional): number of LSBs to decode from, None to detect it.
+                Defaults to 1.
+            output (Optional[BinaryIO], optional): binary file object to write the payload to.
+                Defaults to None, returning it.
+
+        Raises:
+            ValueError: num_lsb must be between 1 and bit_depth
+            ValueError: no hidden data found
+
+        Returns:
+            DecodedData: number of bytes written with `output`, otherwise bytes for binary
+                payloads and str for text
+        """
+        encoded_chunks, num_lsb = self._resolve_num_lsb(encoded_chunks, num_lsb)
+        reader = bitplane.BitReader(
+            encoded_chunks, num_lsb, self.workers, self.block_size)
+        with instrument.stage(self.reporter, "header", header.HEADER_SIZE):
+            payload_header = header.unpack_header(
+                reader.read_bytes(header.HEADER_SIZE))
+        if payload_header.num_lsb != num_lsb:
+            raise ValueError(
+                f"[!] Data was encoded with {payload_header.num_lsb} LSBs, not {num_lsb}.")
+        length = payload_header.length
+
+        def read_parts() -> Iterator[bytes]:
+            with instrument.stage(self.reporter, "extract", length):
+                # read in chunks, so progress is reported without slowing down large payloads
+                for start in range(0, length, PROGRESS_CHUNK_SIZE):
+                    part = reader.read_bytes(min(PROGRESS_CHUNK_SIZE, length - start))
+                    yield part
+                    self.reporter.progress("decode", start + len(part), length)
+
+        self.decoded_data = self._collect(read_parts(), payload_header, output)
         return self.decoded_data
 
+    @staticmethod
+    def _collect(
+        parts: Iterable[bytes],
+        payload_header: header.PayloadHeader,
+        output: Optional[BinaryIO] = None
+    ) -> DecodedData:
+        """Writes the decoded parts of a payload to `output`, or joins them
+
+        Compressed payloads are decompressed part by part on the way.
+
+        Args:
+            parts (Iterable[bytes]): payload, in order
+            payload_header (header.PayloadHeader): header of the payload
+            output (Optional[BinaryIO], optional): binary file object to write to. Defaults to None.
+
+        Raises:
+            ValueError: unknown compression method or truncated compressed data
+
+        Returns:
+            DecodedData: number of bytes written with `output`, otherwise bytes for binary
+                payloads and str for text
+        """
+        parts = payload.decompress(parts, payload_header.flags)
+        if output is not None:
+            written = 0
+            for part in parts:
+                output.write(part)
+                written += len(part)
+            return written
+        data = b"".join(parts)
+        if payload_header.flags & header.FLAG_BINARY:
+            return data
+        # each byte maps to the character of the same ordinal
+        return data.decode("latin-1")
+
+    @staticmethod
+    def _resolve_num_lsb(
+        encoded_chunks: Iterable[np.ndarray],
+        num_lsb: Optional[int]
+    ) -> (Iterator[np.ndarray], int):
+        """Detects the number of LSBs from the header if `num_lsb` is None
+
+        Only the chunks needed for the first `HEADER_SIZE * 8` samples are
+        pulled, and they are put back in front of the returned iterator.
+
+        Args:
+            encoded_chunks (Iterable[np.ndarray]): encoded frames or sample blocks, in order
+            num_lsb (Optional[int]): number of LSBs, or None to detect it
+
+        Raises:
+            ValueError: no hidden data found for any number of LSBs
+
+        Returns:
+            (Iterator[np.ndarray], int): all chunks and the number of LSBs
+        """
+        chunks = iter(encoded_chunks)
+        if num_lsb is not None:
+            return chunks, num_lsb
+        pulled, prefix, n_samples = [], [], 0
+        for chunk in chunks:
+            pulled.append(chunk)
+            prefix.append(bitplane.sample_view(chunk)[:header.HEADER_SIZE * 8 - n_samples])
+            n_samples += len(prefix[-1])
+            if n_samples >= header.HEADER_SIZE * 8:
+                break
+        if not prefix:
+            raise ValueError("[!] No hidden data found for any number of LSBs.")
+        payload_header = header.find_header(np.concatenate(prefix))
+        return chain(pulled, chunks), payload_header.num_lsb
+
     @abc.abstractmethod
     def read_file(
         self,
@@ -104,18 +229,22 @@ class ImageDecoder(Decoder):
     def decode(
         self,
         encoded_data: np.ndarray[Union[int, np.uint8, np.int16, np.int32]],
-        num_lsb: int = 1
-    ) -> str:
+        num_lsb: Optional[int] = 1,
+        output: Optional[BinaryIO] = None
+    ) -> DecodedData:
         """Decodes the secret data from the image file
 
         Args:
             encoded_data (np.ndarray[Union[int, np.uint8, np.int16, np.int32]]): image data
-            num_lsb (int, optional): number of LSBs to decode from. Defaults to 1.
+            num_lsb (Optional[int], optional): number of LSBs to decode from, None to detect it.
+                Defaults to 1.
+            output (Optional[BinaryIO], optional): binary file object to write the payload to.
+                Defaults to None, returning it.
 
         Returns:
-            str: decoded secret data
+            DecodedData: decoded secret data, see `Decoder._decode_stream`
         """
-        self.decoded_data = super()._decode_frame(encoded_data, num_lsb)
+        self.decoded_data = super()._decode_frame(encoded_data, num_lsb, output)
         return self.decoded_data
 
     def read_file(
@@ -134,7 +263,8 @@ class ImageDecoder(Decoder):
             FileNotFoundError: image file not found
         """
         super().read_file(filename)
-        image = cv2.imread(filename)
+        with instrument.stage(self.reporter, "read", os.path.getsize(filename), 1):
+            image = cv2.imread(filename, cv2.IMREAD_ANYDEPTH | cv2.IMREAD_COLOR)
         if image is None:
             raise IOError(f"File {filename} is not a valid image file.")
         return image, None
@@ -147,18 +277,22 @@ class AudioDecoder(Decoder):
     def decode(
         self,
         encoded_data: np.ndarray[Union[int, np.uint8, np.int16, np.int32]],
-        num_lsb: int = 1
-    ) -> str:
+        num_lsb: Optional[int] = 1,
+        output: Optional[BinaryIO] = None
+    ) -> DecodedData:
         """Decodes the secret data from the audio file
 
         Args:
             encoded_data (np.ndarray[Union[int, np.uint8, np.int16, np.int32]]): audio data
-            num_lsb (int, optional): number of LSBs to decode from. Defaults to 1.
+            num_lsb (Optional[int], optional): number of LSBs to decode from, None to detect it.
+                Defaults to 1.
+            output (Optional[BinaryIO], optional): binary file object to write the payload to.
+                Defaults to None, returning it.
 
         Returns:
-            str: decoded secret data
+            DecodedData: decoded secret data, see `Decoder._decode_stream`
         """
-        self.decoded_data = super()._decode_frame(encoded_data, num_lsb)
+        self.decoded_data = super()._decode_frame(encoded_data, num_lsb, output)
         return self.decoded_data
 
     def read_file(
@@ -177,25 +311,11 @@ class AudioDecoder(Decoder):
             np.ndarray[Union[int, np.uint8, np.int16, np.int32]]: audio data as a numpy array
         """
         super().read_file(filename)
-        ext = os.path.splitext(filename)[1][1:]
-        if ext not in util.AUDIO_EXTENSIONS:
+        if sniff.media_type(filename) != "audio":
             raise ValueError(
                 f"Invalid audio file format. Only .wav files are supported.")
-        audio = wave.open(filename, mode="rb")
-        audio_data = audio.readframes(audio.getnframes())
-        audio_bits = audio.getsampwidth() * 8
-        params = audio.getparams()
-        match audio_bits:
-            case 8:
-                audio_data = np.frombuffer(audio_data, dtype=np.uint8)
-            case 16:
-                audio_data = np.frombuffer(audio_data, dtype=np.int16)
-            case 32:
-                audio_data = np.frombuffer(audio_data, dtype=np.int32)
-            case _:
-                audio_data = np.frombuffer(audio_data, dtype=np.uint8)
-        audio_data = audio_data.reshape(-1, audio.getnchannels())
-        return audio_data, params
+        # memory-mapped, so only the samples holding the payload are read from disk
+        return wav.open_samples(filename, mode="r")
 
 
 class VideoDecoder(Decoder):
@@ -204,49 +324,33 @@ class VideoDecoder(Decoder):
 
     def decode(
         self,
-        encoded_data: np.ndarray,
-        num_lsb: int = 1
-    ) -> str:
-        self.decoded_data = self._batched_decode(encoded_data, num_lsb)
-        return self.decoded_data
+        encoded_data: Union[np.ndarray, Iterable[np.ndarray]],
+        num_lsb: Optional[int] = 1,
+        output: Optional[BinaryIO] = None
+    ) -> DecodedData:
+        """Decodes the secret data from the video frames
 
-    def _batched_decode(
-        self,
-        encoded_data,
-        num_lsb,
-        batch_size=10,
-        early_stop="====="
-    ) -> str:
-        """Decode the encoded video file in batches
+        Frames are only pulled from `encoded_data`, flattened and unpacked as
+        far as the payload reaches. Frame iterators from `open_file` are closed
+        once the payload is complete, without reading the rest of the video.
 
         Args:
-            encoded_data (np.ndarray): video frames
-            num_lsb (int): number of LSBs to use for decoding
-            batch_size (int, optional): number of video frames to decode at a time. Defaults to 10.
+            encoded_data (Union[np.ndarray, Iterable[np.ndarray]]): video frames or frame iterator
+            num_lsb (Optional[int], optional): number of LSBs to decode from, None to detect it.
+                Defaults to 1.
+            output (Optional[BinaryIO], optional): binary file object to write the payload to.
+                Defaults to None, returning it.
 
         Returns:
-            str: encoded data
+            DecodedData: decoded secret data, see `Decoder._decode_stream`
         """
-        # raise NotImplementedError("Method not implemented.")
-        decoded_data_all = ""
-        num_equals = 0
-        for i in range(0, encoded_data.shape[0], batch_size):
-            decoded_data = self._decode_frame(
-                encoded_data[i:i+batch_size], num_lsb, keep_early_stop=True)
-            leading_num_equals = re.search(r"={1,5}", decoded_data[:5])
-            if leading_num_equals is not None:
-                leading_num_equals = len(leading_num_equals.group())
-                if leading_num_equals + num_equals >= 5:
-                    decoded_data_all = decoded_data_all[:-num_equals]
-                    return decoded_data_all
-            stop_location = decoded_data.find(early_stop)
-            if stop_location != -1:
-                return decoded_data_all + decoded_data[:stop_location]
-            elif re.search(r"={1,4}", decoded_data[-4:]):
-                # check if trailing characters are all '=
-                num_equals = len(re.search(r"=", decoded_data[-5:]).group())
-                decoded_data_all += decoded_data[:-num_equals]
-        return decoded_data_all
+        frames = iter(encoded_data)
+        try:
+            self.decoded_data = self._decode_stream(frames, num_lsb, output)
+        finally:
+            if isinstance(frames, Generator):
+                frames.close()
+        return self.decoded_data
 
     def read_file(
         self,
@@ -260,16 +364,142 @@ class VideoDecoder(Decoder):
         Returns:
             np.ndarray[Union[int, np.uint8, np.int16, np.int32]]: video data as a numpy array
         """
+        frames, params = self.open_file(filename)
+        video_data = np.array(list(frames))
+        return video_data, params
+
+    def open_file(
+        self,
+        filename: str
+    ) -> (Generator[np.ndarray, None, None], NamedTuple):
+        """Opens the video file for lazy, frame by frame decoding
+
+        Args:
+            filename (str): filepath to the video file
+
+        Raises:
+            FileNotFoundError: video file not found
+
+        Returns:
+            Generator[np.ndarray, None, None]: frames, read from the file only when requested
+        """
         super().read_file(filename)
         video = cv2.VideoCapture(filename)
         params = namedtuple("VideoParams", ["fps", "width", "height"])(video.get(
             cv2.CAP_PROP_FPS), video.get(cv2.CAP_PROP_FRAME_WIDTH), video.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        video_data = []
-        while video.isOpened():
-            ret, frame = video.read()
-            if ret:
-                video_data.append(frame)
-            else:
-                break
-        video_data = np.array(video_data)
-        return video_data, params
+        return self._iter_frames(video, self.reporter), params
+
+    def parallel_decode(
+        self,
+        filename: str,
+        num_lsb: Optional[int] = 1,
+        workers: Optional[int] = None,
+        output: Optional[BinaryIO] = None,
+    ) -> DecodedData:
+        """Decodes the secret data from a video file using multiple processes
+
+        The header is read from the start of the video, then the payload is
+        split into byte ranges. Each range is decoded by a worker process that
+        opens its own capture and seeks to the frame holding the first bit of
+        its range, and the ranges are joined back, or written to `output`, in order.
+
+        Args:
+            filename (str): filepath to the video file
+            num_lsb (Optional[int], optional): number of LSBs to decode from, None to detect it.
+                Defaults to 1.
+            workers (Optional[int], optional): number of worker processes. Defaults to the number of CPUs.
+            output (Optional[BinaryIO], optional): binary file object to write the payload to.
+                Defaults to None, returning it.
+
+        Raises:
+            FileNotFoundError: video file not found
+            ValueError: no hidden data found
+
+        Returns:
+            DecodedData: decoded secret data, see `Decoder._decode_stream`
+        """
+        frames, params = self.open_file(filename)
+        try:
+            chunks, num_lsb = self._resolve_num_lsb(frames, num_lsb)
+            reader = bitplane.BitReader(chunks, num_lsb)
+            payload_header = header.unpack_header(
+                reader.read_bytes(header.HEADER_SIZE))
+        finally:
+            frames.close()
+        if payload_header.num_lsb != num_lsb:
+            raise ValueError(
+                f"[!] Data was encoded with {payload_header.num_lsb} LSBs, not {num_lsb}.")
+        samples_per_frame = int(params.width) * int(params.height) * 3
+        workers = workers or os.cpu_count() or 1
+        # a few ranges per worker balances the load, but each should span at least a frame
+        range_size = max(
+            -(-payload_header.length // (workers * 4)),
+            samples_per_frame * num_lsb // 8,
+            1
+        )
+        starts = range(
+            header.HEADER_SIZE, header.HEADER_SIZE + payload_header.length, range_size)
+        ends = [min(start + range_size, header.HEADER_SIZE + payload_header.length)
+                for start in starts]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            parts = executor.map(
+                _decode_video_range,
+                repeat(filename), repeat(num_lsb), starts, ends, repeat(samples_per_frame)
+            )
+            self.decoded_data = self._collect(parts, payload_header, output)
+        return self.decoded_data
+
+    @staticmethod
+    def _iter_frames(
+        video: "cv2.VideoCapture",
+        reporter: instrument.Reporter = instrument.NULL_REPORTER
+    ) -> Generator[np.ndarray, None, None]:
+        try:
+            while video.isOpened():
+                with instrument.stage(reporter, "read") as counter:
+                    ret, frame = video.read()
+                    if ret:
+                        counter.bytes, counter.frames = frame.nbytes, 1
+                if not ret:
+                    break
+                yield frame
+        finally:
+            video.release()
+
+
+def _decode_video_range(
+    filename: str,
+    num_lsb: int,
+    start: int,
+    end: int,
+    samples_per_frame: int
+) -> bytes:
+    """Decodes bytes `start` to `end` of the bitstream hidden in a video file
+
+    Runs in a worker process of `VideoDecoder.parallel_decode`.
+
+    Args:
+        filename (str): filepath to the video file
+        num_lsb (int): number of LSBs to decode from
+        start (int): offset of the first byte to decode, including the header
+        end (int): offset after the last byte to decode
+        samples_per_frame (int): number of samples in a frame
+
+    Returns:
+        bytes: decoded bytes
+    """
+    first_sample, skip_bits = divmod(start * 8, num_lsb)
+    first_frame, sample_offset = divmod(first_sample, samples_per_frame)
+    video = cv2.VideoCapture(filename)
+    video.set(cv2.CAP_PROP_POS_FRAMES, first_frame)
+    frames = VideoDecoder._iter_frames(video)
+    try:
+        first = next(frames, None)
+        if first is None:
+            raise ValueError("[!] Cover ended before the hidden data was complete.")
+        chunks = chain([first.reshape(-1)[sample_offset:]], frames)
+        reader = bitplane.BitReader(chunks, num_lsb)
+        reader.read_bits(skip_bits)
+        return reader.read_bytes(end - start)
+    finally:
+        frames.close()
@@ -4,79 +4,191 @@ import sys
 
 import warnings
 import abc
-from typing import Union, NamedTuple
+import contextlib
+from typing import Iterable, Iterator, NamedTuple, Optional, Union
 from collections import namedtuple
 import wave
-from math import prod
+import subprocess
+import tempfile
 
-import cv2
 import numpy as np
-import ffmpeg
 
 import steganography.util as util
+import steganography.bitplane as bitplane
+import steganography.wav as wav
+import steganography.instrument as instrument
+import steganography.payload as payload
+import steganography.sniff as sniff
+from steganography.payload import SecretData
+
+# imported on first use, see `util.lazy_import`
+cv2 = util.lazy_import("cv2")
+ffmpeg = util.lazy_import("ffmpeg")
+
+# payload symbols packed and embedded at a time when streaming into a file
+SYMBOL_CHUNK_SIZE = 1 << 22
 
 
 class Encoder(abc.ABC):
     """ Abstract class for encoding data into a cover file
     """
 
-    def __init__(self, *args, **kwargs):
-        pass
+    def __init__(
+        self,
+        workers: int = 1,
+        block_size: int = bitplane.DEFAULT_BLOCK_SIZE,
+        *args,
+        reporter: instrument.Reporter = None,
+        compression: Optional[str] = None,
+        compression_level: Optional[int] = None,
+        **kwargs
+    ):
+        """Initialises the encoder
+
+        Args:
+            workers (int, optional): Number of threads embedding blocks of large covers. Defaults to 1.
+            block_size (int, optional): Samples per block. Defaults to bitplane.DEFAULT_BLOCK_SIZE.
+            reporter (instrument.Reporter, optional): Receives stage timings and progress.
+                Defaults to None, reporting nothing.
+            compression (Optional[str], optional): Method to compress payloads with before embedding,
+                one of `payload.CODECS`. Defaults to None, embedding payloads as is.
+            compression_level (Optional[int], optional): Compression level. Defaults to None,
+                the default level of the method.
+
+        Raises:
+            ValueError: Unknown compression method or level out of range
+        """
+        if compression is not None:
+            payload.get_codec(compression, compression_level)
+        self.workers = workers
+        self.block_size = block_size
+        self.reporter = reporter or instrument.NULL_REPORTER
+        self.compression = compression
+        self.compression_level = compression_level
 
     @abc.abstractmethod
     def encode(
         self,
         cover_file_bytes: np.ndarray,
-        secret_data: str,
+        secret_data: SecretData,
         num_lsb: int = 1,
+        inplace: bool = False,
     ) -> np.ndarray:
         """Encodes secret data into a cover frame using the specified number of LSBs
 
+        The payload is prefixed with a header recording its length, so the
+        decoder knows exactly how much to read. Only the samples the payload
+        occupies are modified. With `inplace` the cover buffer itself is
+        written to, so no copy of the cover is made.
+
         Args:
             cover_file_bytes (numpy.ndarray): Image/Audio/Video frames as a numpy array
-            secret_data (str): Data to encode into the cover file
+            secret_data (SecretData): Data to encode into the cover file, ASCII text, or bytes
+                from a bytes-like object or binary file object
             num_lsb (int): Number of LSBs to use for encoding
+            inplace (bool, optional): Encode into `cover_file_bytes` directly. Defaults to False.
 
         Raises:
             ValueError: Insufficient bytes, need bigger image or less data.
             ValueError: Secret data has to be ASCII encoded.
-            IndexError: num_lsb must be between 1 and 8
+            ValueError: num_lsb must be between 1 and 8
 
         Returns:
             numpy.ndarray: Encoded cover file
         """
-        n_bytes = prod(cover_file_bytes.shape)
-        bit_depth = cover_file_bytes.dtype.itemsize * 8
-        if len(secret_data) != len(secret_data.encode()):
-            raise ValueError("Secret data must be ASCII.")
-        binary_secret_data = util._data_to_binarray(secret_data, num_lsb)
-        and_mask = np.bitwise_or(
-            (2 ** bit_depth - 1) - (2 ** num_lsb - 1),
-            binary_secret_data
-        )
-        data_len = len(binary_secret_data)
-        if data_len * bit_depth > n_bytes * num_lsb:
-            raise ValueError(
-                "[!] Insufficient bytes, use a larger image,"
-                + " greater LSBs, or less data."
-            )
-        padding = n_bytes - data_len
-        # padded values should be 255 for AND mask and 0 for OR mask
-        and_mask = np.pad(
-            and_mask,
-            (0, padding),
-            constant_values=255
-        )
-        # reshape to the shape of the cover file
-        and_mask = and_mask.reshape(*cover_file_bytes.shape)
-        or_mask = np.pad(binary_secret_data, (0, padding), constant_values=0)
-        or_mask = or_mask.reshape(*cover_file_bytes.shape)
-        # encode data into image with the bitwise operations A + (A * B)
-        and_op = np.bitwise_and(cover_file_bytes, and_mask)
-        or_op = np.bitwise_or(and_op, or_mask)
-        # ensure that the bit depth is the same
-        or_op = or_op.astype(cover_file_bytes.dtype)
-        return or_op
+        stream = self._symbol_stream(secret_data, num_lsb)
+        binary_secret_data = self._read_symbols(stream, len(stream))
+        encoded_data = self._embed(cover_file_bytes, binary_secret_data, num_lsb, inplace)
+        self.reporter.progress("encode", stream.header.length, stream.header.length)
+        return encoded_data
+
+    def _embed(
+        self,
+        cover: np.ndarray,
+        symbols: np.ndarray,
+        num_lsb: int,
+        inplace: bool
+    ) -> np.ndarray:
+        """Runs `bitplane.embed` as the "embed" stage
+
+        Args:
+            cover (np.ndarray): Image, audio samples, or a batch of video frames
+            symbols (np.ndarray): Symbols to embed
+            num_lsb (int): Number of LSBs to use for encoding
+            inplace (bool): Encode into `cover` directly
+
+        Returns:
+            np.ndarray: Encoded cover
+        """
+        match cover.ndim:
+            case 4:
+                frames = -(-len(symbols) // cover[0].size)
+            case 3:
+                frames = 1
+            case _:
+                frames = 0
+        with instrument.stage(
+                self.reporter, "embed", min(len(symbols), cover.size) * cover.itemsize, frames):
+            return bitplane.embed(
+                cover, symbols, num_lsb, inplace, self.workers, self.block_size)
+
+    def _symbol_stream(self, secret_data: SecretData, num_lsb: int) -> payload.SymbolStream:
+        """Opens the symbol stream of a payload, compressing it first as the "compress" stage
+
+        Args:
+            secret_data (SecretData): Data to encode into the cover file
+            num_lsb (int): Number of LSBs to use for encoding
+
+        Raises:
+            ValueError: Secret data has to be ASCII encoded.
+            ValueError: num_lsb must be between 1 and 8
+
+        Returns:
+            payload.SymbolStream: Payload symbols
+        """
+        if self.compression is None:
+            return payload.SymbolStream(secret_data, num_lsb)
+        with instrument.stage(
+                self.reporter, "compress", payload.payload_size(secret_data)):
+            return payload.SymbolStream(
+                secret_data, num_lsb, compression=self.compression,
+                compression_level=self.compression_level)
+
+    def _read_symbols(self, stream: payload.SymbolStream, n_symbols: int) -> np.ndarray:
+        """Runs `SymbolStream.read` as the "pack" stage
+
+        Args:
+            stream (payload.SymbolStream): Payload symbols
+            n_symbols (int): Maximum number of symbols to read
+
+        Returns:
+            np.ndarray: Next symbols of the stream
+        """
+        with instrument.stage(self.reporter, "pack") as counter:
+            start = stream.payload_read
+            symbols = stream.read(n_symbols)
+            counter.bytes = stream.payload_read - start
+        return symbols
+
+    def _check_file(self, filename: str, media_type: str, description: str):
+        """Checks that a cover file exists and holds `media_type`
+
+        The type is sniffed from the content rather than the extension, so mislabeled
+        covers are still read, and covers of the wrong type are rejected before decoding.
+
+        Args:
+            filename (str): Filepath to the cover file
+            media_type (str): "image", "audio" or "video"
+            description (str): What the file should be, for the error message, e.g. "an image"
+
+        Raises:
+            FileNotFoundError: File not found
+            io.UnsupportedOperation: Wrong filetype
+        """
+        if not os.path.isfile(filename):
+            raise FileNotFoundError("File not found.")
+        if sniff.media_type(filename) != media_type:
+            raise io.UnsupportedOperation(f"File {filename} is not {description}.")
 
     @abc.abstractmethod
     def read_file(self, filename) -> (np.ndarray, NamedTuple):
@@ -110,7 +222,7 @@ class Encoder(abc.ABC):
             warnings.warn("File already exists. Overwriting file.", UserWarning)
         else:
             dir_to_file = os.path.dirname(filename)
-            if not os.path.exists(dir_to_file):
+            if dir_to_file and not os.path.exists(dir_to_file):
                 os.makedirs(dir_to_file, exist_ok=True)
                 return
 
@@ -121,27 +233,23 @@ class ImageEncoder(Encoder):
     def encode(
         self,
         cover_file_bytes: np.ndarray,
-        secret_data: str,
+        secret_data: SecretData,
         num_lsb: int = 1,
+        inplace: bool = False,
     ) -> np.ndarray:
-        stop_condition = "====="
-        secret_data += stop_condition
-        return super().encode(cover_file_bytes, secret_data, num_lsb)
+        return super().encode(cover_file_bytes, secret_data, num_lsb, inplace)
 
     def read_file(self, filename) -> (np.ndarray, NamedTuple):
-        if os.path.isfile(filename):
-            ext = os.path.splitext(filename)[1][1:]
-            if ext in util.IMAGE_EXTENSIONS:
-                image = cv2.imread(filename)
-                return image, None
-            else:
-                raise io.UnsupportedOperation(f"File with extension {ext} is not an image.")
-        else:
-            raise FileNotFoundError("File not found.")
+        self._check_file(filename, "image", "an image")
+        # keep 16-bit PNG/TIFF samples instead of scaling them down to 8 bits
+        with instrument.stage(self.reporter, "read", os.path.getsize(filename), 1):
+            image = cv2.imread(filename, cv2.IMREAD_ANYDEPTH | cv2.IMREAD_COLOR)
+        return image, None
 
     def write_file(self, data: np.ndarray, filename: str, params: NamedTuple = None):
         super().write_file(data, filename)
-        cv2.imwrite(filename, data)
+        with instrument.stage(self.reporter, "write", data.nbytes, 1):
+            cv2.imwrite(filename, data)
 
 
 class AudioEncoder(Encoder):
@@ -150,37 +258,81 @@ class AudioEncoder(Encoder):
     def encode(
         self,
         cover_file_bytes: np.ndarray,
-        secret_data: str,
+        secret_data: SecretData,
         num_lsb: int = 1,
+        inplace: bool = False,
     ) -> np.ndarray:
-        stop_condition = "====="
-        secret_data += stop_condition
-        encoded_data = super().encode(cover_file_bytes, secret_data, num_lsb)
+        encoded_data = super().encode(
+            cover_file_bytes, secret_data, num_lsb, inplace)
         return encoded_data
 
     def read_file(self, filename) -> (np.ndarray, NamedTuple):
-        if os.path.isfile(filename): 
-            ext = os.path.splitext(filename)[1][1:]
-            if ext in util.AUDIO_EXTENSIONS:
-                audio = wave.open(filename, mode="rb")
-                audio_data = audio.readframes(audio.getnframes())
-                audio_bits = audio.getsampwidth() * 8
-                params = audio.getparams()
-                match audio_bits:
-                    case 8:
-                        audio_data = np.frombuffer(audio_data, dtype=np.uint8)
-                    case 16:
-                        audio_data = np.frombuffer(audio_data, dtype=np.int16)
-                    case 32:
-                        audio_data = np.frombuffer(audio_data, dtype=np.int32)
-                    case _:
-                        audio_data = np.frombuffer(audio_data, dtype=np.uint8)
-                audio_data = audio_data.reshape(-1, audio.getnchannels())
-                return audio_data, params
-            else:
-                raise io.UnsupportedOperation(f"File with extension {ext} is not an audio file.")
-        else:
-            raise FileNotFoundError("File not found.")
+        """Memory-maps the samples of a WAV file
+
+        The map is copy-on-write: samples are read from disk only when accessed
+        and encoding into them in place never modifies the file.
+
+        Args:
+            filename (str): Filepath to the WAV file
+
+        Raises:
+            FileNotFoundError: File not found
+            io.UnsupportedOperation: Wrong filetype
+
+        Returns:
+            (np.ndarray, NamedTuple): Samples of shape (frames, channels) and audio parameters
+        """
+        self._check_file(filename, "audio", "an audio file")
+        return wav.open_samples(filename, mode="c")
+
+    def encode_file(
+        self,
+        cover_filename: str,
+        secret_data: SecretData,
+        filename: str,
+        num_lsb: int = 1,
+    ) -> NamedTuple:
+        """Encodes secret data into a copy of a WAV file
+
+        The cover file is copied as is and only the samples holding the payload
+        are patched in the copy, so the audio is never loaded into memory. The
+        payload is packed and embedded `SYMBOL_CHUNK_SIZE` symbols at a time,
+        so it is not held in memory either.
+
+        Args:
+            cover_filename (str): Filepath to the cover WAV file
+            secret_data (SecretData): Data to encode into the cover file, ASCII text, or bytes
+                from a bytes-like object or binary file object
+            filename (str): Filepath to write the encoded WAV file to
+            num_lsb (int, optional): Number of LSBs to use for encoding. Defaults to 1.
+
+        Raises:
+            ValueError: Insufficient bytes, need bigger audio or less data.
+
+        Returns:
+            NamedTuple: Audio parameters
+        """
+        _, params = self.read_file(cover_filename)
+        stream = self._symbol_stream(secret_data, num_lsb)
+        if len(stream) > params.nframes * params.nchannels:
+            raise ValueError(
+                "[!] Insufficient bytes, use a larger audio file,"
+                + " greater LSBs, or less data."
+            )
+        super().write_file(None, filename)
+        with instrument.stage(self.reporter, "write", os.path.getsize(cover_filename)):
+            audio_data, params = wav.copy_samples(cover_filename, filename)
+        samples = audio_data.reshape(-1)
+        offset = 0
+        while len(stream):
+            symbols = self._read_symbols(stream, SYMBOL_CHUNK_SIZE)
+            self._embed(samples[offset:offset + len(symbols)], symbols, num_lsb, inplace=True)
+            offset += len(symbols)
+            self.reporter.progress("encode", stream.payload_read, stream.header.length)
+        if isinstance(audio_data, np.memmap):
+            audio_data.flush()
+        del audio_data, samples
+        return params
 
     def write_file(self, data: np.ndarray, filename: str, params: NamedTuple = None):
         super().write_file(data, filename)
@@ -189,76 +341,227 @@ class AudioEncoder(Encoder):
         audio.writeframes(data.tobytes())
 
 
+# ffmpeg output options of the lossless codecs `VideoEncoder` can write,
+# roughly from smallest output to fastest encode
+VIDEO_CODECS = {
+    # FFV1 version 3 splits every frame into slices that are coded on separate threads
+    "ffv1": {"vcodec": "ffv1", "level": 3, "slices": 16, "threads": 0},
+    # lossless H.264 in RGB, "preset" trades encode speed against size
+    "x264": {"vcodec": "libx264rgb", "qp": 0, "preset": "ultrafast", "pix_fmt": "bgr24", "threads": 0},
+    "utvideo": {"vcodec": "utvideo", "pix_fmt": "gbrp", "threads": 0},
+    "huffyuv": {"vcodec": "huffyuv"},
+}
+
+
 class VideoEncoder(Encoder):
     """This class is for encoding data into a video file"""
 
+    def __init__(self, codec: str = "ffv1", codec_options: dict = None, *args, **kwargs):
+        """Initialises the encoder with the lossless codec to write video with
+
+        Args:
+            codec (str, optional): Key of `VIDEO_CODECS`. Defaults to "ffv1".
+            codec_options (dict, optional): ffmpeg output options overriding the codec's defaults,
+                e.g. {"preset": "fast"} for x264. Defaults to None.
+
+        Raises:
+            ValueError: Unsupported codec
+        """
+        super().__init__(*args, **kwargs)
+        if codec not in VIDEO_CODECS:
+            raise ValueError(
+                f"Codec '{codec}' not supported, use one of {list(VIDEO_CODECS)}.")
+        self.codec = codec
+        self.codec_options = {**VIDEO_CODECS[codec], **(codec_options or {})}
+
     def encode(
         self,
         cover_file_bytes: np.ndarray,
-        secret_data: str,
+        secret_data: SecretData,
         num_lsb: int = 1,
+        inplace: bool = False,
     ) -> np.ndarray:
-        stop_condition = "====="
-        secret_data += stop_condition
-        encoded_data = super().encode(cover_file_bytes, secret_data, num_lsb)
+        encoded_data = super().encode(
+            cover_file_bytes, secret_data, num_lsb, inplace)
         return encoded_data
 
     def read_file(self, filename) -> (np.ndarray, NamedTuple):
-        if os.path.isfile(filename):
-            ext = os.path.splitext(filename)[1][1:]
-            if ext in util.VIDEO_EXTENSIONS:
-                video = cv2.VideoCapture(filename)
-                video_params = namedtuple(
-                    "VideoParams",
-                    ["fps", "width", "height", "filename"]
-                )(
-                    video.get(cv2.CAP_PROP_FPS),
-                    video.get(cv2.CAP_PROP_FRAME_WIDTH),
-                    video.get(cv2.CAP_PROP_FRAME_HEIGHT),
-                    filename
-                )
-                video_data = []
-                while video.isOpened():
-                    ret, frame = video.read()
-                    if ret:
-                        video_data.append(frame)
-                    else:
-                        break
-                video_data = np.array(video_data)
-                return video_data, video_params
+        video, video_params = self.open_file(filename)
+        video_data = []
+        while video.isOpened():
+            ret, frame = video.read()
+            if ret:
+                video_data.append(frame)
             else:
-                raise io.UnsupportedOperation(f"File with extension {ext} is not a video.")
-        else:
-            raise FileNotFoundError("File not found.")
+                break
+        video.release()
+        video_data = np.array(video_data)
+        return video_data, video_params
+
+    def open_file(self, filename) -> ("cv2.VideoCapture", NamedTuple):
+        """Opens a video file for reading frame by frame
+
+        Args:
+            filename (str): Filepath to the video file
+
+        Raises:
+            FileNotFoundError: File not found
+            io.UnsupportedOperation: Wrong filetype
+
+        Returns:
+            (cv2.VideoCapture, NamedTuple): Opened video capture and video parameters
+        """
+        self._check_file(filename, "video", "a video")
+        video = cv2.VideoCapture(filename)
+        video_params = namedtuple(
+            "VideoParams",
+            ["fps", "width", "height", "filename"]
+        )(
+            video.get(cv2.CAP_PROP_FPS),
+            video.get(cv2.CAP_PROP_FRAME_WIDTH),
+            video.get(cv2.CAP_PROP_FRAME_HEIGHT),
+            filename
+        )
+        return video, video_params
 
     def batched_encode(
         self,
-        video_capture: cv2.VideoCapture,
-        secret_data: str,
+        video_capture: "cv2.VideoCapture",
+        secret_data: SecretData,
         num_lsb: int = 1,
         minibatch_size: int = 30,
+    ) -> Iterator[np.ndarray]:
+        """Encodes secret data into a video while streaming its frames
+
+        Frames are read from `video_capture` `minibatch_size` at a time and the
+        next part of the payload is packed and embedded into each minibatch, so
+        memory use depends neither on the length of the video nor on the size
+        of the payload. The minibatches are meant to be consumed one by one,
+        e.g. by `write_file`.
+
+        Args:
+            video_capture (cv2.VideoCapture): Opened cover video, released once exhausted
+            secret_data (SecretData): Data to encode into the cover file, ASCII text, or bytes
+                from a bytes-like object or binary file object, read as the frames need it
+            num_lsb (int, optional): Number of LSBs to use for encoding. Defaults to 1.
+            minibatch_size (int, optional): Number of frames to read at a time. Defaults to 30.
+
+        Raises:
+            ValueError: Insufficient bytes, need bigger video or less data.
+            ValueError: Secret data has to be ASCII encoded.
+
+        Returns:
+            Iterator[np.ndarray]: Encoded minibatches of frames
+        """
+        stream = self._symbol_stream(secret_data, num_lsb)
+        width = int(video_capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(video_capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        n_frames = int(video_capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        # the frame count is only an estimate for some containers, check again at the end
+        if 0 < n_frames * width * height * 3 < len(stream):
+            video_capture.release()
+            raise ValueError(
+                "[!] Insufficient bytes, use a larger video,"
+                + " greater LSBs, or less data."
+            )
+        return self._encode_minibatches(
+            video_capture, stream, num_lsb, minibatch_size, (height, width, 3),
+            n_frames or None)
+
+    def _encode_minibatches(
+        self,
+        video_capture: "cv2.VideoCapture",
+        stream: payload.SymbolStream,
+        num_lsb: int,
+        minibatch_size: int,
+        frame_shape: tuple[int, int, int],
+        n_frames: int = None,
+    ) -> Iterator[np.ndarray]:
+        frames_done = 0
+        try:
+            while True:
+                minibatch = np.empty((minibatch_size, *frame_shape), np.uint8)
+                n_read = 0
+                with instrument.stage(self.reporter, "read") as counter:
+                    while n_read < minibatch_size:
+                        # decode straight into the minibatch buffer
+                        ret, frame = video_capture.read(minibatch[n_read])
+                        if not ret:
+                            break
+                        if not np.shares_memory(frame, minibatch):
+                            minibatch[n_read] = frame
+                        n_read += 1
+                    counter.frames, counter.bytes = n_read, minibatch[:n_read].nbytes
+                if n_read == 0:
+                    break
+                minibatch = minibatch[:n_read]
+                if len(stream):
+                    symbols = self._read_symbols(stream, minibatch.size)
+                    self._embed(minibatch, symbols, num_lsb, inplace=True)
+                frames_done += n_read
+                self.reporter.progress("encode", frames_done, n_frames)
+                yield minibatch
+        finally:
+            video_capture.release()
+        if len(stream):
+            raise ValueError(
+                "[!] Insufficient bytes, use a larger video,"
+                + " greater LSBs, or less data."
+            )
+
+    def write_file(
+        self,
+        data: Union[np.ndarray, Iterable[np.ndarray]],
+        filename: str,
+        params: NamedTuple = None
     ):
-        raise NotImplementedError("Method not implemented.")
+        """Writes the encoded video to a file
 
-    def write_file(self, data: np.ndarray, filename: str, params: NamedTuple = None):
+        Args:
+            data (Union[np.ndarray, Iterable[np.ndarray]]):
+                Encoded frames, or minibatches of frames e.g. from `batched_encode`
+            filename (str): Filepath to write the encoded video to
+            params (NamedTuple, optional): Video parameters from `read_file` or `open_file`. Defaults to None.
+        """
         super().write_file(data, filename)
-        fps = params.fps
-        video = cv2.VideoWriter(filename, cv2.VideoWriter_fourcc(*"FFV1"), fps, (data.shape[2], data.shape[1]), True)
-        for frame in data:
-            video.write(frame)
-        video.release()
-        in_file = ffmpeg.input(filename)
-        audio_in_file = params.filename
-        # merge audio from original video file with new video file
-        temp_filename = filename.replace(".avi", "_temp.avi")
-        try:
-            v_input = in_file["v"]
-            a_input = ffmpeg.input(audio_in_file)["a"]
-            joined = ffmpeg.concat(v_input, a_input, v=1, a=1).node
-            output = ffmpeg.output(joined[0], joined[1], temp_filename, vcodec="ffv1")
-            output.run()
-            os.remove(filename)
-            os.rename(temp_filename, filename)
-        except Exception as e:
-            # silently fail if audio file is not found
-            pass
\ No newline at end of file
+        if isinstance(data, np.ndarray):
+            data = [data]
+        width, height = int(params.width), int(params.height)
+        streams = [
+            ffmpeg.input(
+                "pipe:", format="rawvideo", pix_fmt="bgr24",
+                s=f"{width}x{height}", framerate=params.fps
+            )["v"]
+        ]
+        # mux in the audio of the original video file, if it has any, without re-encoding it
+        audio_in_file = getattr(params, "filename", None)
+        if audio_in_file is not None:
+            streams.append(ffmpeg.input(audio_in_file)["a?"])
+        output = ffmpeg.output(*streams, filename, acodec="copy", **self.codec_options)
+        args = output.compile(cmd=["ffmpeg", "-loglevel", "error", "-y"])
+        with tempfile.TemporaryFile() as log:
+            process = subprocess.Popen(args, stdin=subprocess.PIPE, stderr=log)
+            try:
+                for minibatch in data:
+                    with instrument.stage(self.reporter, "write", minibatch.nbytes, len(minibatch)):
+                        process.stdin.write(np.ascontiguousarray(minibatch).data)
+            except BrokenPipeError:
+                # ffmpeg exited early, the reason is in its log
+                pass
+            except BaseException:
+                # encoding failed or was cancelled, do not let ffmpeg finalise a partial file
+                process.kill()
+                raise
+            finally:
+                # flushing into a dead or killed ffmpeg must not hide the error being raised
+                with contextlib.suppress(BrokenPipeError, OSError):
+                    process.stdin.close()
+                # ffmpeg still encodes what is buffered and finalises the container
+                with instrument.stage(self.reporter, "mux"):
+                    return_code = process.wait()
+            if return_code != 0:
+                log.seek(0)
+                raise RuntimeError(
+                    f"ffmpeg failed to write {filename} (exit code {return_code}): "
+                    + log.read().decode(errors="replace").strip()
+                )
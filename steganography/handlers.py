@@ -0,0 +1,128 @@
+import importlib
+import io
+from functools import cache
+from typing import NamedTuple, Optional
+
+import steganography.sniff as sniff
+from steganography.util import IMAGE_EXTENSIONS, AUDIO_EXTENSIONS, VIDEO_EXTENSIONS
+
+
+class MediaHandler(NamedTuple):
+    """Encoder and decoder of a media type
+
+    The classes are named rather than referenced, so their modules, and the
+    backends those import, are only loaded once a file of this type is used.
+
+    Attributes:
+        media_type (str): name of the media type, e.g. "image"
+        extensions (tuple[str, ...]): file extensions handled, without the dot, the first one
+            is given to encoded files
+        encoder (str): encoder class as "module:Class"
+        decoder (str): decoder class as "module:Class"
+        threaded (bool): whether the encoder and decoder take worker threads and a block size
+        streaming (Optional[str]): how covers are encoded to a file. None reads the whole cover
+            and writes the result with `write_file`, "file" copies the cover and patches it in
+            place with `encode_file`, "frames" streams it through `open_file` and
+            `batched_encode`, which also decodes it lazily.
+    """
+    media_type: str
+    extensions: tuple[str, ...]
+    encoder: str
+    decoder: str
+    threaded: bool = True
+    streaming: Optional[str] = None
+
+
+# media type and file extension to handler
+_handlers = {}
+_extensions = {}
+
+
+def register(handler: MediaHandler):
+    """Adds a media type, or replaces the handler of an existing one
+
+    Extensions already claimed by another media type are taken over.
+
+    Args:
+        handler (MediaHandler): handler to add
+    """
+    previous = _handlers.get(handler.media_type)
+    if previous is not None:
+        for ext in previous.extensions:
+            if _extensions.get(ext) is previous:
+                del _extensions[ext]
+    _handlers[handler.media_type] = handler
+    for ext in handler.extensions:
+        _extensions[ext] = handler
+
+
+def get_handler(media_type: str) -> MediaHandler:
+    """Looks up the handler of a media type
+
+    Args:
+        media_type (str): name of the media type, e.g. "image"
+
+    Raises:
+        KeyError: media type not registered
+
+    Returns:
+        MediaHandler: registered handler
+    """
+    return _handlers[media_type]
+
+
+def handler_for(filename: str) -> MediaHandler:
+    """Looks up the handler of a file by its content, or else its extension
+
+    The container is sniffed from the first bytes of the file, so mislabeled
+    files are routed by what they hold. The handler of the container's usual
+    extension is used, or failing that the one of its media type. Files that
+    are not recognised, or do not exist yet, are routed by their extension.
+
+    Args:
+        filename (str): filepath
+
+    Raises:
+        io.UnsupportedOperation: no handler for the content or extension
+
+    Returns:
+        MediaHandler: registered handler
+    """
+    container = sniff.sniff(filename)
+    # containers of several media types are routed by extension
+    if container is not None and container.media_type is not None:
+        handler = _extensions.get(container.extension) or _handlers.get(container.media_type)
+        if handler is not None:
+            return handler
+    ext = sniff.extension(filename)
+    handler = _extensions.get(ext)
+    if handler is None:
+        raise io.UnsupportedOperation(f"File extension '{ext}' not supported.")
+    return handler
+
+
+@cache
+def load(path: str) -> type:
+    """Imports a class named as "module:Class"
+
+    Args:
+        path (str): module and class name
+
+    Returns:
+        type: the class
+    """
+    module_name, class_name = path.split(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+register(MediaHandler(
+    "image", tuple(IMAGE_EXTENSIONS),
+    "steganography.encoder:ImageEncoder", "steganography.decoder:ImageDecoder"))
+register(MediaHandler(
+    "audio", tuple(AUDIO_EXTENSIONS),
+    "steganography.encoder:AudioEncoder", "steganography.decoder:AudioDecoder", streaming="file"))
+# videos are parallelised across frames and processes rather than blocks
+register(MediaHandler(
+    "video", tuple(VIDEO_EXTENSIONS),
+    "steganography.encoder:VideoEncoder", "steganography.decoder:VideoDecoder", threaded=False,
+    streaming="frames"))
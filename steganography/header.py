@@ -0,0 +1,94 @@
+import struct
+from typing import NamedTuple
+
+import numpy as np
+
+import steganography.bitplane as bitplane
+
+# magic value and format version, followed by payload length, num_lsb and flags
+MAGIC = b"STG\x01"
+HEADER_FORMAT = "<4sQBB"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+# the payload is arbitrary bytes rather than ASCII text
+FLAG_BINARY = 0x01
+# bits 1-2 hold the compression method of the payload, 0 if stored as is
+COMPRESSION_SHIFT = 1
+COMPRESSION_MASK = 0x03 << COMPRESSION_SHIFT
+
+
+class PayloadHeader(NamedTuple):
+    """Header embedded in front of every payload
+
+    Attributes:
+        length (int): payload length in bytes, excluding the header
+        num_lsb (int): number of LSBs the payload was encoded with
+        flags (int): bit field describing how the payload is stored
+    """
+    length: int
+    num_lsb: int
+    flags: int = 0
+
+
+def pack_header(header: PayloadHeader) -> bytes:
+    """Serialises `header` into its binary form
+
+    Args:
+        header (PayloadHeader): header to serialise
+
+    Returns:
+        bytes: `HEADER_SIZE` bytes starting with `MAGIC`
+    """
+    return struct.pack(HEADER_FORMAT, MAGIC, *header)
+
+
+def unpack_header(data: bytes) -> PayloadHeader:
+    """Parses a header serialised by `pack_header`
+
+    Args:
+        data (bytes): at least `HEADER_SIZE` bytes
+
+    Raises:
+        ValueError: No hidden data found, the magic value does not match.
+
+    Returns:
+        PayloadHeader: parsed header
+    """
+    magic, length, num_lsb, flags = struct.unpack_from(HEADER_FORMAT, data)
+    if magic != MAGIC:
+        raise ValueError(
+            "[!] No hidden data found, check the file and number of LSBs.")
+    return PayloadHeader(length, num_lsb, flags)
+
+
+def find_header(samples: np.ndarray) -> PayloadHeader:
+    """Finds the header at the start of `samples`, whatever number of LSBs it was encoded with
+
+    The bit planes of the first `HEADER_SIZE * 8` samples are unpacked once,
+    and the header bitstream for every number of LSBs is sliced out of them.
+    A header only matches if it was encoded with the number of LSBs it records.
+
+    Args:
+        samples (np.ndarray): first samples of the cover, at least `HEADER_SIZE * 8` if available
+
+    Raises:
+        ValueError: No hidden data found for any number of LSBs.
+
+    Returns:
+        PayloadHeader: parsed header
+    """
+    flat = bitplane.sample_view(samples)[:HEADER_SIZE * 8]
+    bit_depth = flat.dtype.itemsize * 8
+    shifts = np.arange(bit_depth - 1, -1, -1, dtype=flat.dtype)
+    # bit_planes[i, j] is bit `bit_depth - 1 - j` of sample i, most significant first
+    bit_planes = ((flat[:, None] >> shifts) & 1).astype(np.uint8)
+    # payloads are packed into at most 8 bits per sample, see `bitplane.pack`
+    for num_lsb in range(1, min(bit_depth, 8) + 1):
+        bits = bit_planes[:, bit_depth - num_lsb:].reshape(-1)
+        if len(bits) < HEADER_SIZE * 8:
+            continue
+        data = np.packbits(bits[:HEADER_SIZE * 8]).tobytes()
+        magic, length, header_num_lsb, flags = struct.unpack(HEADER_FORMAT, data)
+        if magic == MAGIC and header_num_lsb == num_lsb:
+            return PayloadHeader(length, num_lsb, flags)
+    raise ValueError("[!] No hidden data found for any number of LSBs.")
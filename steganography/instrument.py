@@ -0,0 +1,156 @@
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, NamedTuple, Optional
+
+
+class StageTiming(NamedTuple):
+    """Measurements of one run of a pipeline stage
+
+    Attributes:
+        name (str): stage name, e.g. "read", "pack", "embed", "write" or "extract"
+        seconds (float): wall time spent in the stage
+        bytes (int): bytes the stage processed, payload bytes for "pack"/"extract" and
+            cover bytes for the others
+        frames (int): frames (images count as one) the stage touched
+    """
+    name: str
+    seconds: float
+    bytes: int = 0
+    frames: int = 0
+
+
+class Reporter:
+    """Receives stage timings and progress of encoders and decoders
+
+    All methods do nothing, subclasses override the ones they need.
+    """
+
+    def stage_finished(self, timing: StageTiming):
+        """Called after every run of a stage
+
+        Args:
+            timing (StageTiming): measurements of the run
+        """
+
+    def progress(self, task: str, done: int, total: Optional[int]):
+        """Called after every chunk of work, e.g. a minibatch of frames or a block of payload
+
+        Args:
+            task (str): "encode" or "decode"
+            done (int): units done so far, frames when encoding videos, payload bytes otherwise
+            total (Optional[int]): units in total, None if unknown
+        """
+
+
+# shared default, reporting to nobody
+NULL_REPORTER = Reporter()
+
+
+class _StageCounter:
+    """Counts what a stage processes, see `stage`"""
+
+    def __init__(self):
+        self.bytes = 0
+        self.frames = 0
+
+
+@contextmanager
+def stage(reporter: Reporter, name: str, nbytes: int = 0, frames: int = 0) -> Iterator[_StageCounter]:
+    """Times the enclosed code as a run of stage `name`
+
+    The counter yielded can be increased while the stage runs, for sizes
+    that are only known at the end.
+
+    Args:
+        reporter (Reporter): reporter to send the timing to
+        name (str): stage name
+        nbytes (int, optional): bytes processed, if known upfront. Defaults to 0.
+        frames (int, optional): frames touched, if known upfront. Defaults to 0.
+
+    Yields:
+        _StageCounter: counter with `bytes` and `frames` attributes
+    """
+    if reporter is NULL_REPORTER:
+        # skip the clock when nobody listens
+        yield _StageCounter()
+        return
+    counter = _StageCounter()
+    counter.bytes, counter.frames = nbytes, frames
+    start = time.perf_counter()
+    try:
+        yield counter
+    finally:
+        reporter.stage_finished(StageTiming(
+            name, time.perf_counter() - start, counter.bytes, counter.frames))
+
+
+class StageTotals(NamedTuple):
+    """Measurements of all runs of a stage
+
+    Attributes:
+        seconds (float): total wall time
+        bytes (int): total bytes processed
+        frames (int): total frames touched
+        calls (int): number of runs
+    """
+    seconds: float = 0.0
+    bytes: int = 0
+    frames: int = 0
+    calls: int = 0
+
+
+class Recorder(Reporter):
+    """Reporter that adds up the timings of every stage
+
+    Stages of streamed videos run interleaved, once per minibatch, so their
+    totals add up to the wall time of the whole job.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.last_progress = None
+
+    def stage_finished(self, timing: StageTiming):
+        totals = self.stages.get(timing.name, StageTotals())
+        self.stages[timing.name] = StageTotals(
+            totals.seconds + timing.seconds, totals.bytes + timing.bytes,
+            totals.frames + timing.frames, totals.calls + 1)
+
+    def progress(self, task: str, done: int, total: Optional[int]):
+        self.last_progress = (task, done, total)
+
+    def as_dict(self) -> dict:
+        """Returns the totals as plain dicts, e.g. for JSON
+
+        Returns:
+            dict: stage name to a dict of `StageTotals` fields
+        """
+        return {name: totals._asdict() for name, totals in self.stages.items()}
+
+
+class CallbackReporter(Reporter):
+    """Reporter forwarding to plain functions, e.g. to drive a progress bar"""
+
+    def __init__(
+        self,
+        on_progress: Optional[Callable[[str, int, Optional[int]], None]] = None,
+        on_stage: Optional[Callable[[StageTiming], None]] = None
+    ):
+        """Initialises the reporter
+
+        Args:
+            on_progress (Optional[Callable[[str, int, Optional[int]], None]], optional):
+                called with the arguments of `Reporter.progress`. Defaults to None.
+            on_stage (Optional[Callable[[StageTiming], None]], optional):
+                called with the arguments of `Reporter.stage_finished`. Defaults to None.
+        """
+        self.on_progress = on_progress
+        self.on_stage = on_stage
+
+    def stage_finished(self, timing: StageTiming):
+        if self.on_stage is not None:
+            self.on_stage(timing)
+
+    def progress(self, task: str, done: int, total: Optional[int]):
+        if self.on_progress is not None:
+            self.on_progress(task, done, total)
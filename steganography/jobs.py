@@ -0,0 +1,225 @@
+import itertools
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, NamedTuple, Optional
+
+import steganography.instrument as instrument
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once it has been cancelled"""
+
+
+class JobEvent(NamedTuple):
+    """Progress or outcome of a job, queued by the worker threads
+
+    Attributes:
+        job_id (int): id of the job
+        kind (str): "progress", "done", "error" or "cancelled"
+        value (Any): (task, done, total) for "progress", the result for "done",
+            the exception for "error" and None for "cancelled"
+    """
+    job_id: int
+    kind: str
+    value: Any = None
+
+
+class Job:
+    """Handle of a submitted job
+
+    The callbacks are only ever called by `JobExecutor.dispatch`, on the thread
+    polling the executor, so they may touch the UI.
+    """
+
+    def __init__(
+        self,
+        job_id: int,
+        name: str = "",
+        on_done: Optional[Callable[[Any], None]] = None,
+        on_error: Optional[Callable[[Exception], None]] = None,
+        on_progress: Optional[Callable[[str, int, Optional[int]], None]] = None,
+        on_cancelled: Optional[Callable[[], None]] = None
+    ):
+        """Initialises the job
+
+        Args:
+            job_id (int): id of the job, unique within its executor
+            name (str, optional): description of the job, e.g. for a status bar. Defaults to "".
+            on_done (Optional[Callable[[Any], None]], optional): called with the result. Defaults to None.
+            on_error (Optional[Callable[[Exception], None]], optional): called with the exception
+                the job raised. Defaults to None.
+            on_progress (Optional[Callable[[str, int, Optional[int]], None]], optional): called with
+                the arguments of `instrument.Reporter.progress`. Defaults to None.
+            on_cancelled (Optional[Callable[[], None]], optional): called once the job stopped after
+                being cancelled. Defaults to None.
+        """
+        self.id = job_id
+        self.name = name
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.on_cancelled = on_cancelled
+        self.finished = False
+        self._cancel = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def cancel(self):
+        """Asks the job to stop at its next stage or progress report
+
+        Jobs that have not started yet never run.
+        """
+        self._cancel.set()
+
+    def check_cancelled(self):
+        """Raises `JobCancelled` if the job has been cancelled
+
+        Raises:
+            JobCancelled: the job has been cancelled
+        """
+        if self._cancel.is_set():
+            raise JobCancelled(f"Job {self.id} cancelled.")
+
+
+class _JobReporter(instrument.Reporter):
+    """Checks for cancellation at every stage and progress report of a job, and queues its progress"""
+
+    def __init__(self, job: Job, events: queue.SimpleQueue):
+        self.job = job
+        self.events = events
+
+    def stage_finished(self, timing: instrument.StageTiming):
+        self.job.check_cancelled()
+
+    def progress(self, task: str, done: int, total: Optional[int]):
+        self.job.check_cancelled()
+        self.events.put(JobEvent(self.job.id, "progress", (task, done, total)))
+
+
+class JobExecutor:
+    """Runs jobs on a bounded pool of worker threads for a UI event loop
+
+    Workers never call back into the UI. Progress and outcomes are queued
+    and delivered by `dispatch`, which the UI calls periodically from its own
+    thread, e.g. with Tk's `root.after`. Jobs are passed a reporter to run
+    their encodes and decodes with, through which they can be cancelled
+    between pipeline stages, minibatches and payload chunks.
+    """
+
+    def __init__(self, workers: int = 1, max_pending: int = 4):
+        """Initialises the executor
+
+        Args:
+            workers (int, optional): number of worker threads. Defaults to 1, as a
+                `Steganography` instance runs one job at a time.
+            max_pending (int, optional): number of jobs that may wait for a worker. Defaults to 4.
+        """
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="stega-job")
+        self._events = queue.SimpleQueue()
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        self._ids = itertools.count(1)
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    @property
+    def jobs(self) -> list[Job]:
+        """Jobs submitted and not finished yet, oldest first"""
+        with self._lock:
+            return list(self._jobs.values())
+
+    def submit(
+        self,
+        func: Callable[[instrument.Reporter], Any],
+        name: str = "",
+        **callbacks
+    ) -> Job:
+        """Queues a job
+
+        Args:
+            func (Callable[[instrument.Reporter], Any]): work to run, called with the reporter
+                to pass to `Steganography` or the encoders and decoders
+            name (str, optional): description of the job. Defaults to "".
+            **callbacks: `on_done`, `on_error`, `on_progress` and `on_cancelled`, see `Job`
+
+        Raises:
+            RuntimeError: too many jobs queued
+
+        Returns:
+            Job: handle to cancel the job with
+        """
+        if not self._slots.acquire(blocking=False):
+            raise RuntimeError("Too many jobs queued, wait for one to finish.")
+        job = Job(next(self._ids), name, **callbacks)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, func)
+        return job
+
+    def _run(self, job: Job, func: Callable[[instrument.Reporter], Any]):
+        try:
+            job.check_cancelled()
+            event = JobEvent(job.id, "done", func(_JobReporter(job, self._events)))
+        except JobCancelled:
+            event = JobEvent(job.id, "cancelled")
+        except Exception as e:
+            event = JobEvent(job.id, "cancelled" if job.cancelled else "error", e)
+        finally:
+            self._slots.release()
+        self._events.put(event)
+
+    def cancel_all(self):
+        """Cancels every job that has not finished"""
+        for job in self.jobs:
+            job.cancel()
+
+    def dispatch(self, max_events: int = 100) -> int:
+        """Calls the callbacks of queued events, on the calling thread
+
+        Only the latest progress of a job is delivered per call, so a slow UI
+        does not fall behind fast jobs.
+
+        Args:
+            max_events (int, optional): maximum number of events to take from the queue. Defaults to 100.
+
+        Returns:
+            int: number of events taken from the queue
+        """
+        events = []
+        try:
+            while len(events) < max_events:
+                events.append(self._events.get_nowait())
+        except queue.Empty:
+            pass
+        latest_progress = {event.job_id: event for event in events if event.kind == "progress"}
+        for event in events:
+            with self._lock:
+                job = self._jobs.get(event.job_id)
+                if job is not None and event.kind != "progress":
+                    job.finished = True
+                    del self._jobs[event.job_id]
+            if job is None:
+                continue
+            match event.kind:
+                case "progress" if latest_progress[event.job_id] is event and job.on_progress:
+                    job.on_progress(*event.value)
+                case "done" if job.on_done:
+                    job.on_done(event.value)
+                case "error" if job.on_error:
+                    job.on_error(event.value)
+                case "cancelled" if job.on_cancelled:
+                    job.on_cancelled()
+        return len(events)
+
+    def shutdown(self, cancel: bool = True, wait: bool = True):
+        """Stops the executor
+
+        Args:
+            cancel (bool, optional): cancel unfinished jobs first. Defaults to True.
+            wait (bool, optional): wait for running jobs to stop. Defaults to True.
+        """
+        if cancel:
+            self.cancel_all()
+        self._executor.shutdown(wait=wait)
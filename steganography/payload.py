@@ -0,0 +1,358 @@
+import bz2
+import io
+import lzma
+import os
+import tempfile
+import zlib
+from typing import BinaryIO, Callable, Iterable, Iterator, NamedTuple, Optional, Union
+
+import numpy as np
+
+import steganography.bitplane as bitplane
+import steganography.header as header
+
+# bytes read from payload files at a time
+PAYLOAD_CHUNK_SIZE = 1 << 20
+
+# compressed payloads are kept in memory up to this size, then spilled to a temp file
+SPOOL_SIZE = 64 << 20
+
+SecretData = Union[str, bytes, bytearray, memoryview, BinaryIO]
+# text for ASCII payloads, bytes for binary ones, byte count when written to a file object
+DecodedData = Union[str, bytes, int]
+
+
+class Codec(NamedTuple):
+    """Compression method payloads can be stored with
+
+    Attributes:
+        method_id (int): value stored in the header flags, see `header.COMPRESSION_MASK`
+        compressor (Callable[[int], object]): builds a compressor object for a level
+        decompressor (Callable[[], object]): builds a decompressor object
+        levels (range): valid compression levels
+        default_level (int): level used if none is given
+    """
+    method_id: int
+    compressor: Callable[[int], object]
+    decompressor: Callable[[], object]
+    levels: range
+    default_level: int
+
+
+CODECS = {
+    "zlib": Codec(1, zlib.compressobj, zlib.decompressobj, range(0, 10), 6),
+    "bz2": Codec(2, bz2.BZ2Compressor, bz2.BZ2Decompressor, range(1, 10), 9),
+    "lzma": Codec(
+        3, lambda level: lzma.LZMACompressor(preset=level), lzma.LZMADecompressor, range(0, 10), 6),
+}
+
+
+def is_file(secret_data: SecretData) -> bool:
+    """Tells readable file objects apart from in-memory payloads"""
+    return hasattr(secret_data, "read")
+
+
+def payload_size(secret_data: SecretData) -> int:
+    """Returns the size of a payload in bytes, without reading it
+
+    Args:
+        secret_data (SecretData): ASCII text, bytes-like object or binary file object
+
+    Raises:
+        TypeError: secret data of unsupported type
+
+    Returns:
+        int: payload size, for file objects the bytes left from the current position
+    """
+    match secret_data:
+        case str() | bytes() | bytearray():
+            return len(secret_data)
+        case memoryview():
+            return secret_data.nbytes
+        case _ if is_file(secret_data):
+            if secret_data.seekable():
+                position = secret_data.tell()
+                size = secret_data.seek(0, io.SEEK_END) - position
+                secret_data.seek(position)
+                return size
+            return os.fstat(secret_data.fileno()).st_size
+        case _:
+            raise TypeError(f"Secret data of type {type(secret_data)} not supported.")
+
+
+def payload_header(secret_data: SecretData, num_lsb: int) -> header.PayloadHeader:
+    """Builds the header of a payload
+
+    Text payloads must be ASCII, anything else is marked as binary so it is
+    decoded as bytes.
+
+    Args:
+        secret_data (SecretData): ASCII text, bytes-like object or binary file object
+        num_lsb (int): number of LSBs the payload is encoded with
+
+    Raises:
+        ValueError: Secret data has to be ASCII encoded.
+        TypeError: secret data of unsupported type
+
+    Returns:
+        header.PayloadHeader: header to embed in front of the payload
+    """
+    if isinstance(secret_data, str):
+        if not secret_data.isascii():
+            raise ValueError("Secret data must be ASCII.")
+        return header.PayloadHeader(len(secret_data), num_lsb)
+    return header.PayloadHeader(
+        payload_size(secret_data), num_lsb, header.FLAG_BINARY)
+
+
+def iter_chunks(
+    secret_data: SecretData,
+    length: int,
+    chunk_size: int = PAYLOAD_CHUNK_SIZE
+) -> Iterator[memoryview]:
+    """Yields the payload in chunks of at most `chunk_size` bytes
+
+    In-memory payloads are sliced without copying, file objects are read
+    `chunk_size` bytes at a time.
+
+    Args:
+        secret_data (SecretData): ASCII text, bytes-like object or binary file object
+        length (int): payload size from `payload_size`
+        chunk_size (int, optional): bytes per chunk. Defaults to PAYLOAD_CHUNK_SIZE.
+
+    Raises:
+        ValueError: the file ended before `length` bytes were read
+
+    Yields:
+        memoryview: next chunk of the payload
+    """
+    if is_file(secret_data):
+        remaining = length
+        while remaining > 0:
+            chunk = secret_data.read(min(chunk_size, remaining))
+            if not chunk:
+                raise ValueError("[!] Secret data file ended early.")
+            remaining -= len(chunk)
+            yield memoryview(chunk)
+        return
+    if isinstance(secret_data, str):
+        secret_data = secret_data.encode("ascii")
+    data = memoryview(secret_data).cast("B")
+    for start in range(0, length, chunk_size):
+        yield data[start:start + chunk_size]
+
+
+def get_codec(compression: str, level: Optional[int] = None) -> (Codec, int):
+    """Looks up a compression method and checks the level
+
+    Args:
+        compression (str): method name, one of `CODECS`
+        level (Optional[int], optional): compression level. Defaults to None, the default level.
+
+    Raises:
+        ValueError: unknown method or level out of range
+
+    Returns:
+        (Codec, int): codec and level to use
+    """
+    if compression not in CODECS:
+        raise ValueError(
+            f"Compression '{compression}' not supported, use one of {list(CODECS)}.")
+    codec = CODECS[compression]
+    level = codec.default_level if level is None else level
+    if level not in codec.levels:
+        raise ValueError(
+            f"{compression} level must be between {codec.levels.start} and {codec.levels.stop - 1}")
+    return codec, level
+
+
+def _compressed_chunks(
+    secret_data: SecretData,
+    compression: str,
+    level: Optional[int] = None,
+    chunk_size: int = PAYLOAD_CHUNK_SIZE
+) -> Iterator[bytes]:
+    codec, level = get_codec(compression, level)
+    compressor = codec.compressor(level)
+    for chunk in iter_chunks(secret_data, payload_size(secret_data), chunk_size):
+        yield compressor.compress(chunk)
+    yield compressor.flush()
+
+
+def compress(
+    secret_data: SecretData,
+    compression: str,
+    level: Optional[int] = None,
+    chunk_size: int = PAYLOAD_CHUNK_SIZE
+) -> BinaryIO:
+    """Compresses a payload chunk by chunk
+
+    Args:
+        secret_data (SecretData): ASCII text, bytes-like object or binary file object
+        compression (str): method name, one of `CODECS`
+        level (Optional[int], optional): compression level. Defaults to None, the default level.
+        chunk_size (int, optional): payload bytes read at a time. Defaults to PAYLOAD_CHUNK_SIZE.
+
+    Raises:
+        ValueError: unknown method or level out of range
+
+    Returns:
+        BinaryIO: compressed payload, rewound, in memory up to `SPOOL_SIZE` and in a temp file beyond
+    """
+    compressed = tempfile.SpooledTemporaryFile(SPOOL_SIZE)
+    for chunk in _compressed_chunks(secret_data, compression, level, chunk_size):
+        compressed.write(chunk)
+    compressed.seek(0)
+    return compressed
+
+
+def compressed_size(
+    secret_data: SecretData,
+    compression: str,
+    level: Optional[int] = None
+) -> int:
+    """Measures the size of a payload once compressed, without keeping the result
+
+    Seekable file objects are rewound to where they were.
+
+    Args:
+        secret_data (SecretData): ASCII text, bytes-like object or binary file object
+        compression (str): method name, one of `CODECS`
+        level (Optional[int], optional): compression level. Defaults to None, the default level.
+
+    Raises:
+        ValueError: unknown method or level out of range
+
+    Returns:
+        int: compressed size in bytes
+    """
+    position = secret_data.tell() if is_file(secret_data) and secret_data.seekable() else None
+    size = sum(len(chunk) for chunk in _compressed_chunks(secret_data, compression, level))
+    if position is not None:
+        secret_data.seek(position)
+    return size
+
+
+def decompress(parts: Iterable[bytes], flags: int) -> Iterator[bytes]:
+    """Undoes the compression recorded in the header flags, part by part
+
+    Args:
+        parts (Iterable[bytes]): payload as embedded, in order
+        flags (int): header flags of the payload
+
+    Raises:
+        ValueError: unknown compression method or truncated data
+
+    Yields:
+        bytes: next part of the original payload
+    """
+    method_id = (flags & header.COMPRESSION_MASK) >> header.COMPRESSION_SHIFT
+    if not method_id:
+        yield from parts
+        return
+    codec = next((codec for codec in CODECS.values() if codec.method_id == method_id), None)
+    if codec is None:
+        raise ValueError(f"[!] Unknown compression method {method_id}.")
+    decompressor = codec.decompressor()
+    for part in parts:
+        yield decompressor.decompress(part)
+    if hasattr(decompressor, "flush"):
+        yield decompressor.flush()
+    if not decompressor.eof:
+        raise ValueError("[!] Compressed data is incomplete.")
+
+
+class SymbolStream:
+    """Packs a header and payload into `num_lsb`-bit symbols on demand
+
+    Payload chunks are only read, and packed, once the symbols they make up
+    are requested, so the payload never has to be in memory as a whole.
+    Compressed payloads are compressed upfront, as the header records the
+    compressed length, see `compress`.
+    """
+
+    def __init__(
+        self,
+        secret_data: SecretData,
+        num_lsb: int = 1,
+        chunk_size: int = PAYLOAD_CHUNK_SIZE,
+        compression: Optional[str] = None,
+        compression_level: Optional[int] = None
+    ):
+        """Initialises the stream
+
+        Args:
+            secret_data (SecretData): ASCII text, bytes-like object or binary file object
+            num_lsb (int, optional): number of bits per symbol. Defaults to 1.
+            chunk_size (int, optional): payload bytes read at a time. Defaults to PAYLOAD_CHUNK_SIZE.
+            compression (Optional[str], optional): compression method, one of `CODECS`.
+                Defaults to None, storing the payload as is.
+            compression_level (Optional[int], optional): compression level. Defaults to None,
+                the default level of the method.
+
+        Raises:
+            ValueError: Secret data has to be ASCII encoded.
+            ValueError: num_lsb must be between 1 and 8
+            ValueError: unknown compression method or level out of range
+            TypeError: secret data of unsupported type
+        """
+        if num_lsb > 8 or num_lsb < 1:
+            raise ValueError("num_lsb must be between 1 and 8")
+        self.num_lsb = num_lsb
+        self.header = payload_header(secret_data, num_lsb)
+        if compression is not None:
+            codec, _ = get_codec(compression, compression_level)
+            secret_data = compress(secret_data, compression, compression_level, chunk_size)
+            self.header = header.PayloadHeader(
+                payload_size(secret_data), num_lsb,
+                self.header.flags | codec.method_id << header.COMPRESSION_SHIFT)
+        total_bits = (header.HEADER_SIZE + self.header.length) * 8
+        # number of symbols, the last one padded if the bits do not divide evenly
+        self.total = -(-total_bits // num_lsb)
+        self.remaining = self.total
+        self._chunks = iter_chunks(secret_data, self.header.length, chunk_size)
+        self._pending = header.pack_header(self.header)
+        self._symbols = np.empty(0, np.uint8)
+
+    def __len__(self) -> int:
+        return self.remaining
+
+    @property
+    def payload_read(self) -> int:
+        """Payload bytes, excluding the header, fully covered by the symbols read so far"""
+        done = (self.total - self.remaining) * self.num_lsb // 8 - header.HEADER_SIZE
+        return min(max(done, 0), self.header.length)
+
+    def read(self, n_symbols: int) -> np.ndarray:
+        """Returns the next `n_symbols` symbols, fewer at the end of the payload
+
+        Args:
+            n_symbols (int): maximum number of symbols to return
+
+        Raises:
+            ValueError: a payload file ended early
+
+        Returns:
+            np.ndarray: symbols of dtype uint8
+        """
+        n_symbols = min(n_symbols, self.remaining)
+        parts = [self._symbols]
+        available = len(self._symbols)
+        while available < n_symbols:
+            data = self._pending
+            self._pending = b""
+            chunk = next(self._chunks, None)
+            if chunk is None and not data:
+                raise ValueError("[!] Secret data ended before its announced length.")
+            if chunk is not None:
+                data = bytes(data) + bytes(chunk) if data else chunk
+                # a whole number of symbols only fits a multiple of num_lsb bytes
+                split = len(data) - len(data) % self.num_lsb
+                data, self._pending = data[:split], bytes(data[split:])
+            symbols = bitplane.pack(data, self.num_lsb)
+            parts.append(symbols)
+            available += len(symbols)
+        symbols = np.concatenate(parts) if len(parts) > 1 else parts[0]
+        self._symbols = symbols[n_symbols:]
+        self.remaining -= n_symbols
+        return symbols[:n_symbols]
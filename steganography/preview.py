@@ -0,0 +1,144 @@
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+import steganography.cache as cache
+import steganography.probe as probe
+import steganography.sniff as sniff
+import steganography.util as util
+
+# imported on first use, see `util.lazy_import`
+cv2 = util.lazy_import("cv2")
+
+# bounding box of previews, (width, height)
+PREVIEW_SIZE = (200, 200)
+# reduction factors OpenCV can decode images at, largest first
+_REDUCED_FLAGS = ((8, "IMREAD_REDUCED_COLOR_8"), (4, "IMREAD_REDUCED_COLOR_4"), (2, "IMREAD_REDUCED_COLOR_2"))
+
+
+def _fit(image: np.ndarray, size: (int, int)) -> np.ndarray:
+    """Downscales `image` to fit in `size`, keeping its aspect ratio, and converts it to RGB"""
+    height, width = image.shape[:2]
+    scale = min(size[0] / width, size[1] / height, 1)
+    if scale < 1:
+        image = cv2.resize(
+            image, (max(1, round(width * scale)), max(1, round(height * scale))),
+            interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+
+def image_preview(filename: str, size: (int, int) = PREVIEW_SIZE) -> Optional[np.ndarray]:
+    """Decodes a downscaled preview of an image
+
+    The dimensions are read from the header (see `probe.image_size`) to
+    decode at the largest reduction that still fills `size`. JPEG is then
+    decoded at that scale directly, other formats are decoded in full and
+    subsampled.
+
+    Args:
+        filename (str): filepath to the image file
+        size ((int, int), optional): bounding box of the preview. Defaults to PREVIEW_SIZE.
+
+    Returns:
+        Optional[np.ndarray]: 8-bit RGB preview, None if the image could not be read
+    """
+    flag = cv2.IMREAD_COLOR
+    dimensions = probe.image_size(filename)
+    if dimensions is not None:
+        width, height, _ = dimensions
+        for factor, name in _REDUCED_FLAGS:
+            if width // factor >= size[0] or height // factor >= size[1]:
+                flag = getattr(cv2, name)
+                break
+    image = cv2.imread(filename, flag)
+    if image is None:
+        return None
+    return _fit(image, size)
+
+
+def video_preview(filename: str, size: (int, int) = PREVIEW_SIZE) -> Optional[np.ndarray]:
+    """Decodes a downscaled preview of the first frame of a video
+
+    The first frame is always a keyframe, so no other frame is decoded.
+
+    Args:
+        filename (str): filepath to the video file
+        size ((int, int), optional): bounding box of the preview. Defaults to PREVIEW_SIZE.
+
+    Returns:
+        Optional[np.ndarray]: 8-bit RGB preview, None if the video could not be read
+    """
+    video = cv2.VideoCapture(filename)
+    try:
+        ret, frame = video.read()
+    finally:
+        video.release()
+    if not ret:
+        return None
+    return _fit(frame, size)
+
+
+class PreviewCache:
+    """LRU cache of previews, keyed by file path, size and modification time
+
+    Previews of images and of the first frame of videos are decoded at
+    reduced resolution, see `image_preview` and `video_preview`, so misses
+    stay cheap even for large covers. Audio files have no preview.
+    """
+
+    def __init__(self, max_entries: int = 64, size: (int, int) = PREVIEW_SIZE):
+        """Initialises the cache
+
+        Args:
+            max_entries (int, optional): maximum number of previews kept. Defaults to 64.
+            size ((int, int), optional): bounding box of the previews. Defaults to PREVIEW_SIZE.
+        """
+        self.max_entries = max_entries
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, filename: str) -> Optional[np.ndarray]:
+        """Returns the preview of a file, decoding it if it is not cached or has changed
+
+        Args:
+            filename (str): filepath to an image or video file
+
+        Raises:
+            FileNotFoundError: file not found
+
+        Returns:
+            Optional[np.ndarray]: 8-bit RGB preview, None if the file has no preview
+        """
+        key = cache.file_fingerprint(filename)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        match sniff.media_type(filename):
+            case "image":
+                preview = image_preview(filename, self.size)
+            case "video":
+                preview = video_preview(filename, self.size)
+            case _:
+                preview = None
+        if preview is not None:
+            with self._lock:
+                self._entries[key] = preview
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return preview
+
+    def clear(self):
+        """Removes every preview"""
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,215 @@
+import os
+import struct
+from typing import NamedTuple
+
+import steganography.header as header
+import steganography.payload as payload
+import steganography.sniff as sniff
+import steganography.util as util
+import steganography.wav as wav
+
+# imported on first use, see `util.lazy_import`
+cv2 = util.lazy_import("cv2")
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# SOFn markers holding the frame size, C4 (DHT), C8 (JPG) and CC (DAC) are not frames
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# TIFF field types holding the integers we need, by size in bytes
+TIFF_TYPES = {1: "B", 3: "H", 4: "I"}
+
+
+class CompressionEstimate(NamedTuple):
+    """How a payload compresses, and what that means for the capacity of a cover
+
+    Attributes:
+        capacity (int): largest payload that fits the cover as is, see `capacity`
+        payload_size (int): size of the payload
+        compressed_size (int): size of the payload once compressed
+        effective_capacity (int): largest payload compressing as well as this one that fits
+            the cover once compressed
+        fits (bool): whether the payload fits the cover once compressed
+    """
+    capacity: int
+    payload_size: int
+    compressed_size: int
+    effective_capacity: int
+    fits: bool
+
+
+class CoverInfo(NamedTuple):
+    """Sample count and depth of a cover, as the encoders see it
+
+    Attributes:
+        samples (int): number of samples the payload can be spread over
+        bit_depth (int): bits per sample available for LSBs
+    """
+    samples: int
+    bit_depth: int
+
+
+def image_size(filename: str) -> (int, int, int):
+    """Reads the width, height and bits per sample from an image header
+
+    PNG, BMP, JPEG and TIFF headers are parsed directly.
+
+    Args:
+        filename (str): filepath to the image file
+
+    Returns:
+        (int, int, int): width, height and bits per sample, or None for other formats
+    """
+    with open(filename, "rb") as f:
+        head = f.read(32)
+        if head.startswith(PNG_SIGNATURE) and head[12:16] == b"IHDR":
+            width, height, bits = struct.unpack(">IIB", head[16:25])
+            return width, height, bits
+        if head.startswith(b"BM"):
+            dib_size, = struct.unpack_from("<I", head, 14)
+            if dib_size == 12:
+                width, height = struct.unpack_from("<HH", head, 18)
+            else:
+                width, height = struct.unpack_from("<ii", head, 18)
+            return width, abs(height), 8
+        if head.startswith(b"\xff\xd8"):
+            return _jpeg_size(f)
+        if head[:4] in (b"II*\x00", b"MM\x00*"):
+            return _tiff_size(f, "<" if head[:2] == b"II" else ">")
+    return None
+
+
+def _jpeg_size(f) -> (int, int, int):
+    f.seek(2)
+    while True:
+        marker = f.read(4)
+        if len(marker) < 4 or marker[0] != 0xFF:
+            return None
+        segment_size, = struct.unpack(">H", marker[2:])
+        if marker[1] in JPEG_SOF_MARKERS:
+            bits, height, width = struct.unpack(">BHH", f.read(5))
+            return width, height, bits
+        f.seek(segment_size - 2, os.SEEK_CUR)
+
+
+def _tiff_size(f, byte_order: str) -> (int, int, int):
+    f.seek(4)
+    ifd_offset, = struct.unpack(byte_order + "I", f.read(4))
+    f.seek(ifd_offset)
+    n_entries, = struct.unpack(byte_order + "H", f.read(2))
+    fields = {}
+    for _ in range(n_entries):
+        tag, field_type, count, value = struct.unpack(byte_order + "HHI4s", f.read(12))
+        if tag not in (256, 257, 258) or field_type not in TIFF_TYPES:
+            continue
+        fmt = byte_order + TIFF_TYPES[field_type]
+        if count * struct.calcsize(fmt) > 4:
+            # values that do not fit the entry are stored at an offset, the first one is enough
+            position = f.tell()
+            f.seek(struct.unpack(byte_order + "I", value)[0])
+            value = f.read(4)
+            f.seek(position)
+        fields[tag], = struct.unpack_from(fmt, value)
+    if 256 not in fields or 257 not in fields:
+        return None
+    return fields[256], fields[257], fields.get(258, 1)
+
+
+def cover_info(filename: str) -> CoverInfo:
+    """Probes the sample count and depth of a cover from its headers only
+
+    The media type is sniffed from the content, see `sniff.media_type`.
+    Images are read as 3 channels by the encoders, 8-bit unless they are
+    16-bit PNG/TIFF. WAV files are parsed with `wav.read_info`, and video
+    frame counts come from the container (`CAP_PROP_FRAME_COUNT`), which is
+    only an estimate for some formats. Image formats without a header parser
+    are decoded with OpenCV instead.
+
+    Args:
+        filename (str): filepath to the cover file
+
+    Raises:
+        FileNotFoundError: file not found
+        ValueError: unsupported file type or file could not be read
+
+    Returns:
+        CoverInfo: sample count and depth
+    """
+    if not os.path.isfile(filename):
+        raise FileNotFoundError(f"File {filename} not found.")
+    media_type = sniff.media_type(filename)
+    if media_type == "image":
+        size = image_size(filename)
+        if size is None:
+            image = cv2.imread(filename, cv2.IMREAD_ANYDEPTH | cv2.IMREAD_COLOR)
+            if image is None:
+                raise ValueError(f"File {filename} is not a valid image file.")
+            return CoverInfo(image.size, image.dtype.itemsize * 8)
+        width, height, bits = size
+        return CoverInfo(width * height * 3, 16 if bits == 16 else 8)
+    if media_type == "audio":
+        params = wav.read_info(filename).params
+        # 24-bit samples are embedded into their low byte, see `wav.PCM24`
+        bit_depth = 8 if params.sampwidth == 3 else params.sampwidth * 8
+        return CoverInfo(params.nframes * params.nchannels, bit_depth)
+    if media_type == "video":
+        video = cv2.VideoCapture(filename)
+        try:
+            if not video.isOpened():
+                raise ValueError(f"File {filename} is not a valid video file.")
+            samples = (int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+                       * int(video.get(cv2.CAP_PROP_FRAME_WIDTH))
+                       * int(video.get(cv2.CAP_PROP_FRAME_HEIGHT)) * 3)
+        finally:
+            video.release()
+        return CoverInfo(max(samples, 0), 8)
+    raise ValueError(f"File extension '{sniff.extension(filename)}' not supported.")
+
+
+def capacity(info: CoverInfo, num_lsb: int = 1) -> int:
+    """Computes the largest payload that fits a cover
+
+    Args:
+        info (CoverInfo): cover sample count and depth, e.g. from `cover_info`
+        num_lsb (int, optional): number of LSBs to encode into. Defaults to 1.
+
+    Raises:
+        ValueError: num_lsb must be between 1 and bit_depth, and at most 8
+
+    Returns:
+        int: payload size in bytes, excluding the header
+    """
+    # payloads are packed into at most 8 bits per sample, see `bitplane.pack`
+    max_lsb = min(info.bit_depth, 8)
+    if num_lsb > max_lsb or num_lsb < 1:
+        raise ValueError(f"num_lsb must be between 1 and {max_lsb}")
+    return max(info.samples * num_lsb // 8 - header.HEADER_SIZE, 0)
+
+
+def estimate_compression(
+    info: CoverInfo,
+    secret_data: payload.SecretData,
+    num_lsb: int = 1,
+    compression: str = "zlib",
+    compression_level: int = None
+) -> CompressionEstimate:
+    """Compresses a payload, or a sample of it, to compare the capacity of a cover with and without compression
+
+    Args:
+        info (CoverInfo): cover sample count and depth, e.g. from `cover_info`
+        secret_data (payload.SecretData): payload, seekable file objects are rewound afterwards
+        num_lsb (int, optional): number of LSBs to encode into. Defaults to 1.
+        compression (str, optional): compression method, one of `payload.CODECS`. Defaults to "zlib".
+        compression_level (int, optional): compression level. Defaults to None, the default level.
+
+    Raises:
+        ValueError: num_lsb out of range, or unknown compression method or level
+
+    Returns:
+        CompressionEstimate: payload sizes and effective capacity
+    """
+    raw_capacity = capacity(info, num_lsb)
+    size = payload.payload_size(secret_data)
+    compressed = payload.compressed_size(secret_data, compression, compression_level)
+    return CompressionEstimate(
+        raw_capacity, size, compressed,
+        raw_capacity * size // compressed if compressed else raw_capacity,
+        compressed <= raw_capacity)
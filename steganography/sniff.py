@@ -0,0 +1,122 @@
+import os
+from typing import BinaryIO, NamedTuple, Optional, Union
+
+from steganography.util import IMAGE_EXTENSIONS, AUDIO_EXTENSIONS, VIDEO_EXTENSIONS
+
+# bytes read from the start of a file to identify it
+SNIFF_SIZE = 16
+
+
+class Container(NamedTuple):
+    """File format identified from the leading bytes of a file
+
+    Attributes:
+        extension (str): usual extension of the format, without the dot
+        media_type (Optional[str]): "image", "audio" or "video", None if the format holds
+            either and the file extension decides
+    """
+    extension: str
+    media_type: Optional[str]
+
+
+# (offset, magic) pairs that must all match, and the container they identify
+SIGNATURES = [
+    (((0, b"RIFF"), (8, b"WAVE")), Container("wav", "audio")),
+    (((0, b"RIFF"), (8, b"AVI ")), Container("avi", "video")),
+    (((0, b"RIFF"), (8, b"WEBP")), Container("webp", "image")),
+    (((0, b"\x89PNG\r\n\x1a\n"),), Container("png", "image")),
+    # the reserved field after the file size is zero, "BM" alone is too common
+    (((0, b"BM"), (6, b"\x00\x00\x00\x00")), Container("bmp", "image")),
+    (((0, b"II*\x00"),), Container("tiff", "image")),
+    (((0, b"MM\x00*"),), Container("tiff", "image")),
+    (((0, b"\xff\xd8\xff"),), Container("jpg", "image")),
+    # EBML header of Matroska and WebM
+    (((0, b"\x1a\x45\xdf\xa3"),), Container("mkv", "video")),
+    # ISO base media files start with a box of type "ftyp", whose major brand tells
+    # still images (AVIF, HEIF) and audio (M4A, M4B) from movies (MP4, MOV, 3GP)
+    (((4, b"ftyp"), (8, b"avif")), Container("avif", "image")),
+    (((4, b"ftyp"), (8, b"avis")), Container("avif", "image")),
+    (((4, b"ftyp"), (8, b"heic")), Container("heic", "image")),
+    (((4, b"ftyp"), (8, b"mif1")), Container("heif", "image")),
+    (((4, b"ftyp"), (8, b"M4A ")), Container("m4a", "audio")),
+    (((4, b"ftyp"), (8, b"M4B ")), Container("m4a", "audio")),
+    (((4, b"ftyp"),), Container("mp4", "video")),
+    (((4, b"moov"),), Container("mov", "video")),
+    (((0, b"FLV\x01"),), Container("flv", "video")),
+    # Ogg holds Vorbis or Opus audio as often as Theora video
+    (((0, b"OggS"),), Container("ogg", None)),
+    (((0, b"\x00\x00\x01\xba"),), Container("mpg", "video")),
+    (((0, b"\x30\x26\xb2\x75\x8e\x66\xcf\x11"),), Container("asf", "video")),
+]
+
+# media type of every known extension, used when the content is not recognised
+_EXTENSION_MEDIA_TYPES = {
+    ext: media_type
+    for media_type, extensions in (
+        ("video", VIDEO_EXTENSIONS), ("audio", AUDIO_EXTENSIONS), ("image", IMAGE_EXTENSIONS))
+    for ext in extensions
+}
+
+
+def sniff_bytes(head: bytes) -> Optional[Container]:
+    """Identifies a container from the first bytes of a file
+
+    Args:
+        head (bytes): first `SNIFF_SIZE` bytes of the file, or all of it if shorter
+
+    Returns:
+        Optional[Container]: identified container, None if unknown
+    """
+    for magics, container in SIGNATURES:
+        if all(head[offset:offset + len(magic)] == magic for offset, magic in magics):
+            return container
+    return None
+
+
+def sniff(source: Union[str, os.PathLike, BinaryIO]) -> Optional[Container]:
+    """Identifies the container of a file or binary stream from its leading bytes
+
+    Streams are read from their current position, which is restored
+    afterwards. Buffered streams are peeked at, other streams must be seekable.
+
+    Args:
+        source (Union[str, os.PathLike, BinaryIO]): filepath or binary file object
+
+    Returns:
+        Optional[Container]: identified container, None if unknown or unreadable
+    """
+    if isinstance(source, (str, os.PathLike)):
+        try:
+            with open(source, "rb") as f:
+                head = f.read(SNIFF_SIZE)
+        except OSError:
+            return None
+    elif hasattr(source, "peek"):
+        head = source.peek(SNIFF_SIZE)[:SNIFF_SIZE]
+    else:
+        position = source.tell()
+        head = source.read(SNIFF_SIZE)
+        source.seek(position)
+    return sniff_bytes(head)
+
+
+def extension(filename: str) -> str:
+    """Returns the extension of `filename`, lowercase and without the dot"""
+    return os.path.splitext(filename)[1][1:].lower()
+
+
+def media_type(filename: str) -> Optional[str]:
+    """Finds the media type of a file from its content, or else its extension
+
+    The extension also decides for containers holding several media types, such as Ogg.
+
+    Args:
+        filename (str): filepath to the file
+
+    Returns:
+        Optional[str]: "image", "audio" or "video", None if neither is recognised
+    """
+    container = sniff(filename)
+    if container is not None and container.media_type is not None:
+        return container.media_type
+    return _EXTENSION_MEDIA_TYPES.get(extension(filename))
@@ -1,27 +1,82 @@
 import os
 import sys
 
-import io
-from typing import Union
-import tempfile
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator, Union
+import shutil
 
 import numpy as np
 
-from steganography.encoder import *
-from steganography.decoder import *
-from steganography.util import IMAGE_EXTENSIONS, AUDIO_EXTENSIONS, VIDEO_EXTENSIONS
+import steganography.bitplane as bitplane
+import steganography.handlers as handlers
+import steganography.probe as probe
+import steganography.instrument as instrument
+import steganography.payload as payload
+from steganography.artifacts import ArtifactStore, link_or_copy
+from steganography.cache import ResultCache
+from steganography.payload import DecodedData
 
 
 class Steganography:
     """Class for encoding and decoding data into a cover file using LSB steganography
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        threads: int = 1,
+        block_size: int = bitplane.DEFAULT_BLOCK_SIZE,
+        cache: Union[ResultCache, None] = None,
+        reporter: Union[instrument.Reporter, None] = None,
+        artifacts: Union[ArtifactStore, None] = None
+    ):
+        """Initialises the class
+
+        Args:
+            threads (int, optional): Number of threads embedding and extracting blocks of large
+                images and audio. Defaults to 1.
+            block_size (int, optional): Samples per block. Defaults to bitplane.DEFAULT_BLOCK_SIZE.
+            cache (Union[ResultCache, None], optional): Cache returning the results of repeated
+                decodes, and the output files of repeated encodes to a file. Defaults to None.
+            reporter (Union[instrument.Reporter, None], optional): Receives the stage timings and
+                progress of every encode and decode. Defaults to None, reporting nothing.
+            artifacts (Union[ArtifactStore, None], optional): Store of the files encoded with
+                `output_file=True`. Defaults to None, a store in a temp directory.
+        """
+        self.threads = threads
+        self.block_size = block_size
+        self.cache = cache
+        self.reporter = reporter or instrument.NULL_REPORTER
         self.encoder = None
         self.decoder = None
+        self.media_type = None
         self.encoded_data = None
         self.encoded_data_params = None
-        self.temp_dir = None
+        self.artifacts = artifacts or ArtifactStore()
+
+    def _init_handlers(self, filename: str, **encoder_options) -> handlers.MediaHandler:
+        """Creates the encoder and decoder for the media type of `filename`
+
+        Files are routed by their content, or by their extension if it is not
+        recognised or the file does not exist, see `handlers.handler_for`.
+
+        Args:
+            filename (str): filepath
+            **encoder_options: extra keyword arguments of the encoder, e.g. compression
+
+        Raises:
+            io.UnsupportedOperation: neither the content nor the extension of `filename` is supported
+
+        Returns:
+            handlers.MediaHandler: handler of the media type
+        """
+        handler = handlers.handler_for(filename)
+        options = {"reporter": self.reporter}
+        if handler.threaded:
+            options.update(workers=self.threads, block_size=self.block_size)
+        self.encoder = handlers.load(handler.encoder)(**options, **encoder_options)
+        self.decoder = handlers.load(handler.decoder)(**options)
+        self.media_type = handler.media_type
+        return handler
 
     def _to_bin(
         self,
@@ -37,27 +92,121 @@ class Steganography:
         """
         raise NotImplementedError("Method not implemented.")
 
+    @contextmanager
+    def reporting(self, reporter: instrument.Reporter) -> Iterator[instrument.Reporter]:
+        """Sends the stage timings and progress of the encodes and decodes run inside the block to `reporter`
+
+        Args:
+            reporter (instrument.Reporter): reporter to use inside the block
+
+        Yields:
+            instrument.Reporter: `reporter`
+        """
+        previous, self.reporter = self.reporter, reporter
+        try:
+            yield reporter
+        finally:
+            self.reporter = previous
+
+    @contextmanager
+    def recording(self) -> Iterator[instrument.Recorder]:
+        """Records the stage timings of the encodes and decodes run inside the block
+
+        Example:
+            with stega.recording() as recorder:
+                stega.encode("cover.png", "secret", "output")
+            print(recorder.stages["embed"].seconds)
+
+        Yields:
+            instrument.Recorder: totals of every stage, see `instrument.Recorder`
+        """
+        with self.reporting(instrument.Recorder()) as recorder:
+            yield recorder
+
+    def capacity(
+        self,
+        cover_file: str,
+        num_lsb: int = 1
+    ) -> int:
+        """Returns how many bytes of secret data fit into `cover_file`
+
+        Only the file headers are read, so this is cheap enough to reject jobs
+        before any pixels, samples or frames are loaded. The result is exact for
+        images and audio; for videos it relies on the frame count stored in the
+        container.
+
+        Args:
+            cover_file (str): Cover filepath
+            num_lsb (int, optional): Number of LSBs to encode data into. Defaults to 1.
+
+        Raises:
+            FileNotFoundError: `cover_file` is not a valid filepath
+            ValueError: Unsupported file type, or num_lsb must be between 1 and bit_depth
+
+        Returns:
+            int: Capacity in bytes
+        """
+        return probe.capacity(probe.cover_info(cover_file), num_lsb)
+
+    def estimate_compression(
+        self,
+        cover_file: str,
+        secret_data: payload.SecretData,
+        num_lsb: int = 1,
+        compression: str = "zlib",
+        compression_level: Union[int, None] = None
+    ) -> probe.CompressionEstimate:
+        """Compares the capacity of `cover_file` with and without compressing `secret_data`
+
+        Args:
+            cover_file (str): Cover filepath
+            secret_data (payload.SecretData): Data to estimate the compression of, or a sample of it
+            num_lsb (int, optional): Number of LSBs to encode data into. Defaults to 1.
+            compression (str, optional): Compression method, one of `payload.CODECS`. Defaults to "zlib".
+            compression_level (Union[int, None], optional): Compression level. Defaults to None,
+                the default level of the method.
+
+        Raises:
+            FileNotFoundError: `cover_file` is not a valid filepath
+            ValueError: Unsupported file type, num_lsb out of range, or unknown compression method
+
+        Returns:
+            probe.CompressionEstimate: Payload sizes and effective capacity
+        """
+        return probe.estimate_compression(
+            probe.cover_info(cover_file), secret_data, num_lsb, compression, compression_level)
+
     def encode(
         self,
         cover_file: str,
-        secret_data: str,
+        secret_data: payload.SecretData,
         output_file: Union[str, None, bool] = None,
-        num_lsb: int = 1
+        num_lsb: int = 1,
+        compression: Union[str, None] = None,
+        compression_level: Union[int, None] = None
     ) -> Union[str, np.ndarray]:
         """Encodes `secret_data` into `cover_file`
 
         Args:
             cover_file (Union[str, bytes, io.BytesIO, Image.Image, cv2.VideoCapture]):
                 Cover file, file-like object or filepath to encode `secret_data` into
-            secret_data (Union[str, bytes, int]): Data to encode into `cover_file`
+            secret_data (payload.SecretData): Data to encode into `cover_file`, ASCII text, or bytes
+                from a bytes-like object or binary file object. File objects are read in chunks
+                from their current position, as the encoder needs them.
             output_file (Union[str, None, bool], optional):
                 Output file or filepath to write encoded data to. If True, write to a temp directory.
                 Defaults to None.
             num_lsb (int, optional): Number of LSBs to encode data into. Defaults to 1.
+            compression (Union[str, None], optional): Method to compress `secret_data` with before
+                embedding, one of `payload.CODECS`. It is recorded in the header, so decoding
+                decompresses automatically. Defaults to None, embedding `secret_data` as is.
+            compression_level (Union[int, None], optional): Compression level. Defaults to None,
+                the default level of the method.
 
         Raises:
             NotImplementedError: Method not implemented.
             FileNotFoundError: `cover_file` or `output_file` is not a valid filepath
+            ValueError: `output_file` would overwrite `cover_file`
 
         Returns:
             Union[str, np.ndarray]:
@@ -66,35 +215,27 @@ class Steganography:
         # Check if `cover_file` is a valid filepath
         if not os.path.isfile(cover_file):
             raise FileNotFoundError(f"File '{cover_file}' not found.")
-        else:
-            # Initialise encoder based on `cover_file` type (image, audio, or video)
-            ext = os.path.splitext(cover_file)[1][1:]
-            if ext in IMAGE_EXTENSIONS:
-                self.encoder = ImageEncoder()
-                self.decoder = ImageDecoder()
-                file_type = "image"
-            elif ext in AUDIO_EXTENSIONS:
-                self.encoder = AudioEncoder()
-                self.decoder = AudioDecoder()
-                file_type = "audio"
-            elif ext in VIDEO_EXTENSIONS:
-                self.encoder = VideoEncoder()
-                self.decoder = VideoDecoder()
-                file_type = "video"
-            else:
-                raise io.UnsupportedOperation(
-                    f"File extension '{ext}' not supported.")
-            data, params = self.encoder.read_file(cover_file)
-            # Encode `secret_data` into `cover_file`
-            self.encoded_data = self.encoder.encode(data, secret_data, num_lsb)
-        output_ext = "."
-        match self.encoder:
-            case ImageEncoder():
-                output_ext += IMAGE_EXTENSIONS[0]
-            case AudioEncoder():
-                output_ext += AUDIO_EXTENSIONS[0]
-            case VideoEncoder():
-                output_ext += VIDEO_EXTENSIONS[0]
+        # Initialise encoder based on `cover_file` type (image, audio, or video)
+        handler = self._init_handlers(
+            cover_file, compression=compression, compression_level=compression_level)
+        file_type = handler.media_type
+        # Reject oversized data from the headers, before the cover is loaded. The size of
+        # compressed data is only known once compressed, the encoders check it then.
+        cover_info = None
+        if handler.streaming != "frames":
+            with instrument.stage(self.reporter, "probe"):
+                cover_info = probe.cover_info(cover_file)
+            if compression is None \
+                    and payload.payload_size(secret_data) > probe.capacity(cover_info, num_lsb):
+                raise ValueError(
+                    f"[!] Insufficient bytes, use a larger {file_type},"
+                    + " greater LSBs, or less data."
+                )
+        # Encoded files take the first extension of their media type
+        output_ext = "." + handler.extensions[0]
+        if output_ext == ".bmp" and cover_info is not None and cover_info.bit_depth != 8:
+            # BMP only holds 8-bit samples, keep 16-bit images lossless as PNG
+            output_ext = ".png"
         match output_file:
             case str():
                 # Check if output file extension is valid
@@ -105,55 +246,108 @@ class Steganography:
                     path_to_file = os.path.dirname(output_filename)
                     if path_to_file:
                         os.makedirs(path_to_file, exist_ok=True)
-
-                # Open file handlers for `cover_file` and `output_file` (if not None)
-                # Save encoded data to `output_file` (if not None)
-                self.encoder.write_file(
-                    self.encoded_data, output_filename, params)
-                return output_filename
             case True:
-                if self.temp_dir is None:
-                    self.temp_dir = tempfile.TemporaryDirectory()
-
-                # Name file iteratively in temp directory based on file type
-                file_count = 1
-                while os.path.exists(os.path.join(self.temp_dir.name, f"{file_type}{file_count}{output_ext}")):
-                    file_count += 1
-
-                # Save encoded data to temp directory
-                temp_file = os.path.join(
-                    self.temp_dir.name, f"{file_type}{file_count}{output_ext}")
-                self.encoder.write_file(self.encoded_data, temp_file, params)
-                return temp_file
+                # Name file in the artifact store based on file type
+                output_filename = self.artifacts.reserve(file_type, output_ext)
             case _:
+                output_filename = None
+        if output_filename is not None \
+                and os.path.realpath(output_filename) == os.path.realpath(cover_file):
+            raise ValueError(f"Output file '{output_filename}' would overwrite the cover file.")
+
+        cache_key = None
+        # File objects are read once while encoding, so only in-memory data is keyed
+        if self.cache is not None and output_filename is not None \
+                and not payload.is_file(secret_data):
+            # Reuse the output of an identical earlier encode
+            cache_key = self.cache.key(
+                "encode", cover_file, secret_data, num_lsb, output_ext, self.encoder.__class__.__name__,
+                compression, compression_level)
+            cached_filename = self.cache.get_file(cache_key, output_ext)
+            if cached_filename is not None:
+                if output_file is True:
+                    # Each output gets its own artifact, which may be evicted independently
+                    link_or_copy(cached_filename, output_filename)
+                    self.artifacts.add(output_filename, file_type)
+                elif os.path.abspath(cached_filename) != os.path.abspath(output_filename):
+                    shutil.copyfile(cached_filename, output_filename)
+                return output_filename
+
+        # Only an output this call creates is removed if it fails, never a file it was to replace
+        created = output_filename is not None and not os.path.exists(output_filename)
+        try:
+            if output_filename is not None and handler.streaming == "frames":
+                # Stream frames from `cover_file` to the output in minibatches
+                video, params = self.encoder.open_file(cover_file)
+                self.encoded_data = self.encoder.batched_encode(
+                    video, secret_data, num_lsb)
+            elif output_filename is not None and handler.streaming == "file":
+                # Copy `cover_file` and patch only the samples holding `secret_data`
+                self.encoded_data = None
+                self.encoder.encode_file(
+                    cover_file, secret_data, output_filename, num_lsb)
+                if output_file is True:
+                    self.artifacts.add(output_filename, file_type)
+                if cache_key is not None:
+                    self.cache.put_file(cache_key, output_filename)
+                return output_filename
+            else:
+                data, params = self.encoder.read_file(cover_file)
+                # Encode `secret_data` into `cover_file`, reusing the freshly read buffer if possible
+                self.encoded_data = self.encoder.encode(
+                    data, secret_data, num_lsb, inplace=data.flags.writeable)
+            if output_filename is None:
                 return self.encoded_data
+            # Save encoded data to `output_file` or the temp directory
+            self.encoder.write_file(self.encoded_data, output_filename, params)
+            if output_file is True:
+                self.artifacts.add(output_filename, file_type)
+            if cache_key is not None:
+                self.cache.put_file(cache_key, output_filename)
+            return output_filename
+        except BaseException:
+            # Do not leave a partial output behind, e.g. when the encode is cancelled
+            if created and os.path.isfile(output_filename):
+                os.remove(output_filename)
+            raise
 
     def get_temp_file(self):
         """Get temp directory path"""
-        if self.temp_dir:
-            return self.temp_dir.name
+        if self.artifacts.temp_dir:
+            return self.artifacts.temp_dir.name
 
     def get_temp_dir(self):
         """Get temp directory object (to cleanup)"""
-        if self.temp_dir:
-            return self.temp_dir
+        if self.artifacts.temp_dir:
+            return self.artifacts.temp_dir
 
     def decode(
         self,
         encoded_file: str,
-        num_lsb: int = 1
-    ) -> str:
+        num_lsb: Union[int, None] = 1,
+        workers: Union[int, None] = None,
+        output: Union[BinaryIO, None] = None
+    ) -> DecodedData:
         """Decodes `encoded_file` and returns the decoded data
 
+        Text payloads are returned as str, binary payloads as bytes. With
+        `output`, the payload is written to it in chunks instead.
+
         Args:
             encoded_file (str): Encoded filepath to decode
-            num_lsb (int, optional): Number of LSBs to decode data from. Defaults to 1.
+            num_lsb (Union[int, None], optional): Number of LSBs to decode data from. If None, it is
+                detected from the header in the first samples. Defaults to 1.
+            workers (Union[int, None], optional):
+                Number of processes to decode videos with, for payloads spanning many frames.
+                Defaults to None, decoding in this process.
+            output (Union[BinaryIO, None], optional): Binary file object to write the decoded data to.
+                Defaults to None, returning it.
 
         Raises:
             NotImplementedError: Method not implemented.
 
         Returns:
-            str: Decoded data
+            DecodedData: Decoded data, or the number of bytes written to `output`
         """
         # Check if `encoded_file` is a valid filepath
         if not os.path.isfile(encoded_file):
@@ -163,24 +357,30 @@ class Steganography:
             match encoded_file:
                 case str():
                     # Initialise decoder based on `encoded_file` type (image, audio, or video)
-                    ext = os.path.splitext(encoded_file)[1][1:]
-                    if ext in IMAGE_EXTENSIONS:
-                        self.encoder = ImageEncoder()
-                        self.decoder = ImageDecoder()
-                    elif ext in AUDIO_EXTENSIONS:
-                        self.encoder = AudioEncoder()
-                        self.decoder = AudioDecoder()
-                    elif ext in VIDEO_EXTENSIONS:
-                        self.encoder = VideoEncoder()
-                        self.decoder = VideoDecoder()
-                    else:
-                        raise io.UnsupportedOperation(
-                            f"File extension '{ext}' not supported.")
+                    handler = self._init_handlers(encoded_file)
 
-                    # Read file to be decoded
-                    data, params = self.decoder.read_file(encoded_file)
-                    # Decode `encoded_file`
-                    decoded_data = self.decoder.decode(data, num_lsb)
+                    # Return the result of an earlier decode of the same file
+                    # Only text results are cached, binary payloads may be large
+                    cache_key = None
+                    if self.cache is not None and output is None:
+                        cache_key = self.cache.key("decode", encoded_file, num_lsb)
+                        decoded_data = self.cache.get_text(cache_key)
+                        if decoded_data is not None:
+                            return decoded_data
+                    # Long video payloads are split across processes
+                    if handler.streaming == "frames" and workers:
+                        decoded_data = self.decoder.parallel_decode(
+                            encoded_file, num_lsb, workers, output)
+                    else:
+                        # Read file to be decoded, videos lazily so only the frames holding data are read
+                        if handler.streaming == "frames":
+                            data, params = self.decoder.open_file(encoded_file)
+                        else:
+                            data, params = self.decoder.read_file(encoded_file)
+                        # Decode `encoded_file`
+                        decoded_data = self.decoder.decode(data, num_lsb, output)
+                    if cache_key is not None and isinstance(decoded_data, str):
+                        self.cache.put_text(cache_key, decoded_data)
 
                 case _:
                     # return nothing if `encoded_data` is not a string
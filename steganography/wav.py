@@ -0,0 +1,149 @@
+import os
+import shutil
+import struct
+from collections import namedtuple
+from typing import NamedTuple
+
+import numpy as np
+
+# same fields as `wave.Wave_read.getparams()`, so either can be passed to `wave.Wave_write.setparams()`
+WavParams = namedtuple(
+    "WavParams",
+    ["nchannels", "sampwidth", "framerate", "nframes", "comptype", "compname"]
+)
+
+# 24-bit little-endian samples, split so the byte holding the LSBs is addressable
+PCM24 = np.dtype([("low", "u1"), ("high", "<i2")])
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class WavInfo(NamedTuple):
+    """Location and layout of the samples of a WAV file
+
+    Attributes:
+        params (WavParams): audio parameters
+        data_offset (int): offset of the first sample in the file
+        data_size (int): size of the sample data in bytes
+    """
+    params: WavParams
+    data_offset: int
+    data_size: int
+
+
+def read_info(filename: str) -> WavInfo:
+    """Parses the RIFF chunks of a WAV file without reading its samples
+
+    Args:
+        filename (str): filepath to the WAV file
+
+    Raises:
+        ValueError: not a RIFF WAVE file, or not PCM encoded
+
+    Returns:
+        WavInfo: parameters and location of the sample data
+    """
+    file_size = os.path.getsize(filename)
+    fmt = None
+    with open(filename, "rb") as f:
+        riff, _, wave_id = struct.unpack("<4sI4s", f.read(12))
+        if riff != b"RIFF" or wave_id != b"WAVE":
+            raise ValueError(f"File {filename} is not a WAV file.")
+        while True:
+            chunk_header = f.read(8)
+            if len(chunk_header) < 8:
+                raise ValueError(f"File {filename} has no data chunk.")
+            chunk_id, chunk_size = struct.unpack("<4sI", chunk_header)
+            chunk_start = f.tell()
+            if chunk_id == b"fmt ":
+                fmt = f.read(min(chunk_size, 40))
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise ValueError(f"File {filename} has no fmt chunk before its data.")
+                data_size = min(chunk_size, file_size - chunk_start)
+                break
+            # chunks are padded to an even size
+            f.seek(chunk_start + chunk_size + chunk_size % 2)
+    audio_format, nchannels, framerate, _, block_align, bits = struct.unpack_from(
+        "<HHIIHH", fmt)
+    if audio_format == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+        # the sub format GUID starts with the actual format code
+        audio_format, = struct.unpack_from("<H", fmt, 24)
+    if audio_format != WAVE_FORMAT_PCM:
+        raise ValueError(f"File {filename} is not PCM encoded.")
+    sampwidth = (bits + 7) // 8
+    params = WavParams(
+        nchannels, sampwidth, framerate, data_size // block_align,
+        "NONE", "not compressed"
+    )
+    return WavInfo(params, chunk_start, params.nframes * block_align)
+
+
+def sample_dtype(sampwidth: int) -> np.dtype:
+    """Returns the dtype samples of `sampwidth` bytes are stored as
+
+    Args:
+        sampwidth (int): sample width in bytes
+
+    Raises:
+        ValueError: unsupported sample width
+
+    Returns:
+        np.dtype: 8-bit WAV samples are unsigned, wider ones little-endian signed
+    """
+    match sampwidth:
+        case 1:
+            return np.dtype(np.uint8)
+        case 2:
+            return np.dtype("<i2")
+        case 3:
+            return PCM24
+        case 4:
+            return np.dtype("<i4")
+        case _:
+            raise ValueError(f"{sampwidth * 8}-bit samples not supported.")
+
+
+def open_samples(filename: str, mode: str = "r") -> (np.ndarray, WavParams):
+    """Memory-maps the samples of a WAV file
+
+    Only the pages that are actually accessed are read from disk.
+
+    Args:
+        filename (str): filepath to the WAV file
+        mode (str, optional): `np.memmap` mode, "r", "r+" or "c" (copy-on-write). Defaults to "r".
+
+    Raises:
+        ValueError: not a PCM WAV file
+
+    Returns:
+        (np.ndarray, WavParams): samples of shape (frames, channels) and audio parameters
+    """
+    info = read_info(filename)
+    dtype = sample_dtype(info.params.sampwidth)
+    if info.data_size == 0:
+        samples = np.empty(0, dtype)
+    else:
+        samples = np.memmap(
+            filename, dtype, mode, info.data_offset, info.data_size // dtype.itemsize)
+    return samples.reshape(-1, info.params.nchannels), info.params
+
+
+def copy_samples(source: str, destination: str, mode: str = "r+") -> (np.ndarray, WavParams):
+    """Copies a WAV file and memory-maps the samples of the copy
+
+    The copy is left to the OS (`shutil.copyfile`), so patching a few samples
+    of the returned map never reads or rewrites the rest of the file in Python.
+
+    Args:
+        source (str): filepath to the WAV file to copy
+        destination (str): filepath to copy to
+        mode (str, optional): `np.memmap` mode. Defaults to "r+".
+
+    Returns:
+        (np.ndarray, WavParams): samples of the copy and audio parameters
+    """
+    if os.path.abspath(source) != os.path.abspath(destination):
+        shutil.copyfile(source, destination)
+    return open_samples(destination, mode)
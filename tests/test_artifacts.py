@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+from steganography.artifacts import ArtifactStore
+from steganography.cache import ResultCache
+from steganography.steganography import Steganography
+
+
+def _write(store, media_type, size):
+    filename = store.reserve(media_type, ".bin")
+    with open(filename, "wb") as f:
+        f.write(bytes(size))
+    return store.add(filename, media_type)
+
+
+class TestArtifacts:
+
+    def test_lookup_and_eviction(self, tmp_path):
+        store = ArtifactStore(str(tmp_path / "store"), max_bytes=250)
+        first = _write(store, "image", 100)
+        second = _write(store, "image", 100)
+        assert first.path != second.path and store.latest == second
+        # file names are numbered per media type
+        assert os.path.basename(second.path) == "image2.bin"
+        assert os.path.basename(store.reserve("audio", ".wav")) == "audio1.wav"
+        assert store.find(first.path) == store.get(first.id) == first
+        assert store.latest == first
+
+        # the least recently used artifact goes once over budget
+        third = _write(store, "audio", 100)
+        assert store.get(second.id) is None and not os.path.exists(second.path)
+        assert len(store) == 2 and store.total_bytes == 200
+        # the newest is kept even when larger than the budget
+        huge = _write(store, "video", 1000)
+        assert store.latest == huge and len(store) == 1
+        assert not os.path.exists(first.path) and not os.path.exists(third.path)
+
+    def test_save(self, tmp_path):
+        store = ArtifactStore()
+        artifact = _write(store, "image", 10)
+        destination = str(tmp_path / "saved.bin")
+        open(destination, "wb").close()
+        store.save(artifact, destination)
+        assert os.path.getsize(destination) == 10 and os.path.exists(artifact.path)
+        assert sorted(os.listdir(tmp_path)) == ["saved.bin"]
+
+        moved = str(tmp_path / "moved.bin")
+        store.save(artifact.id, moved, move=True)
+        assert os.path.getsize(moved) == 10 and not os.path.exists(artifact.path)
+        with pytest.raises(KeyError):
+            store.save(artifact, destination)
+
+        directory = store.directory
+        store.cleanup()
+        assert not os.path.exists(directory) and len(store) == 0
+
+    def test_encode(self):
+        stega = Steganography(cache=ResultCache())
+        output_file = stega.encode("tests/black_128.png", "secret", True, 2)
+        artifact = stega.artifacts.latest
+        assert artifact.path == os.path.abspath(output_file) and artifact.media_type == "image"
+        # a cached encode still gets its own artifact
+        cached_file = stega.encode("tests/black_128.png", "secret", True, 2)
+        assert cached_file != output_file and stega.artifacts.find(cached_file) is not None
+        assert stega.decode(cached_file, 2) == "secret"
+        stega.artifacts.cleanup()
+        assert stega.get_temp_dir() is None
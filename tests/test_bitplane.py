@@ -0,0 +1,133 @@
+import pytest
+
+import numpy as np
+
+import steganography.bitplane as bitplane
+
+
+class TestBitplane:
+
+    @pytest.fixture
+    def payload(self):
+        rng = np.random.default_rng(2005)
+        return rng.integers(0, 256, 1000, dtype=np.uint8)
+
+    @staticmethod
+    def _embed(payload: np.ndarray, num_lsb: int, n_samples: int) -> np.ndarray:
+        bits = np.unpackbits(payload)
+        bits = np.pad(bits, (0, -len(bits) % num_lsb))
+        weights = 2 ** np.arange(num_lsb - 1, -1, -1)
+        symbols = bits.reshape(-1, num_lsb) @ weights
+        samples = np.full(n_samples, 0b10101010, np.uint8)
+        samples[:len(symbols)] &= np.uint8(0xFF ^ (2 ** num_lsb - 1))
+        samples[:len(symbols)] |= symbols.astype(np.uint8)
+        return samples
+
+    def test_pack(self, payload):
+        bits = np.unpackbits(payload)
+        for num_lsb in range(1, 9):
+            symbols = bitplane.pack(payload.tobytes(), num_lsb)
+            assert len(symbols) == -(-len(bits) // num_lsb)
+            assert symbols.max() < 2 ** num_lsb
+            unpacked = np.unpackbits(symbols[:, None], axis=1)[:, 8 - num_lsb:]
+            assert np.array_equal(unpacked.reshape(-1)[:len(bits)], bits)
+
+    def test_pack_input_types(self, payload):
+        expected = bitplane.pack(payload, 3)
+        for data in (payload.tobytes(), bytearray(payload), memoryview(payload),
+                     payload.tobytes().decode("latin-1")):
+            assert np.array_equal(bitplane.pack(data, 3), expected)
+        with pytest.raises(TypeError):
+            bitplane.pack(payload.astype(np.int16), 3)
+
+    def test_pack_extract_roundtrip(self, payload):
+        for num_lsb in range(1, 9):
+            symbols = bitplane.pack(payload, num_lsb)
+            assert np.array_equal(
+                bitplane.extract(symbols, num_lsb)[:len(payload)], payload)
+
+    def test_extract(self, payload):
+        for num_lsb in range(1, 9):
+            samples = self._embed(payload, num_lsb, 10000)
+            extracted = bitplane.extract(samples, num_lsb)
+            assert np.array_equal(extracted[:len(payload)], payload)
+
+    def test_bit_reader_across_chunks(self, payload):
+        for num_lsb in range(1, 9):
+            samples = self._embed(payload, num_lsb, 10000)
+            for chunk_size in (1, 7, 333, 10000):
+                chunks = [samples[i:i + chunk_size]
+                          for i in range(0, len(samples), chunk_size)]
+                reader = bitplane.BitReader(iter(chunks), num_lsb)
+                assert reader.read_bytes(3) == payload[:3].tobytes()
+                assert reader.read_bytes(len(payload) - 3) == payload[3:].tobytes()
+                assert reader.samples_read == -(-len(payload) * 8 // num_lsb)
+
+    def test_bit_reader_is_lazy(self, payload):
+        samples = self._embed(payload, 8, 10000)
+        chunks = iter([samples[:500], samples[500:1000], samples[1000:]])
+        reader = bitplane.BitReader(chunks, 8)
+        assert reader.read_bytes(600) == payload[:600].tobytes()
+        assert len(next(chunks)) == 9000
+        with pytest.raises(ValueError):
+            reader.read_bytes(1000)
+
+    def test_embed_prefix_only(self, payload):
+        rng = np.random.default_rng(0)
+        for dtype in (np.uint8, np.int16, np.int32):
+            info = np.iinfo(dtype)
+            cover = rng.integers(info.min, info.max, (100, 50, 3), dtype=dtype)
+            for num_lsb in range(1, 9):
+                symbols = bitplane.pack(payload, num_lsb)
+                encoded = bitplane.embed(cover, symbols, num_lsb)
+                assert encoded.dtype == cover.dtype
+                assert encoded.shape == cover.shape
+                flat, original = encoded.reshape(-1), cover.reshape(-1)
+                assert np.array_equal(flat[len(symbols):], original[len(symbols):])
+                assert np.array_equal(
+                    flat[:len(symbols)] >> num_lsb, original[:len(symbols)] >> num_lsb)
+                assert np.array_equal(
+                    bitplane.extract(encoded, num_lsb)[:len(payload)], payload)
+
+    def test_embed_inplace(self, payload):
+        cover = np.zeros((100, 100, 3), np.uint8)
+        symbols = bitplane.pack(payload, 2)
+        encoded = bitplane.embed(cover, symbols, 2, inplace=True)
+        assert encoded is cover
+        assert np.array_equal(bitplane.extract(cover, 2)[:len(payload)], payload)
+        with pytest.raises(ValueError):
+            bitplane.embed(cover[:, ::2], symbols, 2, inplace=True)
+        with pytest.raises(ValueError):
+            bitplane.embed(cover[:10], symbols, 1)
+
+    def test_sample_view(self):
+        pcm24 = np.dtype([("low", "u1"), ("high", "<i2")])
+        samples = np.zeros((10, 2), pcm24)
+        view = bitplane.sample_view(samples, 8)
+        assert view.dtype == np.uint8 and len(view) == 20
+        assert np.shares_memory(view, samples)
+        assert bitplane.sample_view(np.zeros(4, np.int16)).dtype == np.uint16
+        with pytest.raises(ValueError):
+            bitplane.sample_view(samples, 9)
+        with pytest.raises(ValueError):
+            bitplane.sample_view(np.zeros(4, np.float32))
+
+    def test_blocked_matches_single_pass(self, payload):
+        rng = np.random.default_rng(1)
+        for dtype in (np.uint8, np.int16):
+            info = np.iinfo(dtype)
+            cover = rng.integers(info.min, info.max, (100, 50, 3), dtype=dtype)
+            for num_lsb in (1, 3, 8):
+                symbols = bitplane.pack(payload, num_lsb)
+                expected = bitplane.embed(cover, symbols, num_lsb)
+                for block_size in (1, 7, 1000):
+                    encoded = bitplane.embed(
+                        cover, symbols, num_lsb, workers=3, block_size=block_size)
+                    assert np.array_equal(encoded, expected)
+                    assert np.array_equal(
+                        bitplane.extract(encoded, num_lsb, 3, block_size),
+                        bitplane.extract(encoded, num_lsb))
+                    reader = bitplane.BitReader([encoded], num_lsb, 3, block_size)
+                    assert reader.read_bytes(len(payload)) == payload.tobytes()
+        with pytest.raises(ValueError):
+            bitplane.embed(cover, symbols, 1, workers=2, block_size=0)
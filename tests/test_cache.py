@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+from steganography.cache import ResultCache
+from steganography.steganography import Steganography
+
+
+class TestCache:
+
+    @pytest.fixture
+    def cover(self, tmp_path):
+        with open("tests/black_128.png", "rb") as src, open(tmp_path / "cover.png", "wb") as dst:
+            dst.write(src.read())
+        return str(tmp_path / "cover.png")
+
+    def test_memory_lru(self, cover):
+        cache = ResultCache(max_entries=2, max_bytes=10)
+        keys = [cache.key("decode", cover, num_lsb) for num_lsb in (1, 2, 3)]
+        assert len(set(keys)) == 3
+        for key in keys:
+            cache.put_text(key, "abc")
+        assert cache.get_text(keys[0]) is None
+        assert cache.get_text(keys[2]) == "abc"
+        cache.put_text(keys[0], "too long to keep")
+        assert cache.get_text(keys[0]) is None
+        assert (cache.hits, cache.misses) == (1, 2)
+
+    def test_key_follows_file_changes(self, cover):
+        cache = ResultCache()
+        key = cache.key("decode", cover, 1)
+        with open(cover, "ab") as f:
+            f.write(b"\0")
+        assert cache.key("decode", cover, 1) != key
+        assert cache.key("encode", cover, "ab", "c") != cache.key("encode", cover, "a", "bc")
+
+    def test_disk_store(self, cover, tmp_path):
+        directory = str(tmp_path / "cache")
+        cache = ResultCache(directory=directory, max_disk_bytes=30)
+        key = cache.key("decode", cover, 1)
+        cache.put_text(key, "x" * 20)
+        # a new cache finds the result on disk
+        assert ResultCache(directory=directory).get_text(key) == "x" * 20
+        cache.put_text(cache.key("decode", cover, 2), "y" * 20)
+        assert sorted(os.listdir(directory)) == [cache.key("decode", cover, 2) + ".txt"]
+
+    def test_steganography(self, cover, tmp_path):
+        stega = Steganography(cache=ResultCache(directory=str(tmp_path / "cache")))
+        output_file = stega.encode(cover, "secret", str(tmp_path / "first"), 2)
+        assert stega.decode(output_file, 2) == "secret"
+        assert stega.decode(output_file, 2) == "secret"
+        assert stega.cache.hits == 1
+
+        # the earlier output is copied instead of encoding again
+        second_file = stega.encode(cover, "secret", str(tmp_path / "second"), 2)
+        assert stega.cache.hits == 2
+        with open(output_file, "rb") as f, open(second_file, "rb") as g:
+            assert f.read() == g.read()
+
+        # a changed output file is not reused
+        with open(output_file, "ab") as f:
+            f.write(b"\0")
+        assert stega.decode(output_file, 2) == "secret"
+        assert stega.cache.hits == 2
@@ -0,0 +1,54 @@
+import io
+import json
+
+import pytest
+
+from steganography.cli import main, run_batch
+
+
+class TestCli:
+
+    @pytest.fixture
+    def manifest(self, tmp_path):
+        jobs = [
+            {"op": "encode", "cover": "tests/black_128.png", "output": str(tmp_path / "image"),
+             "message": "image secret", "num_lsb": 2},
+            {"op": "encode", "cover": "tests/test.wav", "output": str(tmp_path / "audio"),
+             "message": "audio secret"},
+            {"op": "decode", "file": "tests/test.wav"},
+        ]
+        manifest_file = tmp_path / "manifest.jsonl"
+        manifest_file.write_text("".join(json.dumps(job) + "\n" for job in jobs))
+        return manifest_file
+
+    def test_encode_decode(self, tmp_path, capsys):
+        assert main(["encode", "tests/black_128.png", str(tmp_path / "out"),
+                     "--message", "hello", "--num-lsb", "3"]) == 0
+        output_file = capsys.readouterr().out.strip()
+        assert main(["decode", output_file, "--num-lsb", "3"]) == 0
+        assert capsys.readouterr().out == "hello"
+        assert main(["decode", output_file, "--num-lsb", "auto"]) == 0
+        assert capsys.readouterr().out == "hello"
+        assert main(["decode", output_file, "--num-lsb", "1"]) == 1
+
+    def test_capacity(self, capsys):
+        assert main(["capacity", "tests/black_128.png", "--num-lsb", "2"]) == 0
+        assert int(capsys.readouterr().out) == 128 * 72 * 3 * 2 // 8 - 14
+        assert main(["capacity", "tests/missing.png"]) == 1
+
+    def test_batch(self, tmp_path, manifest, capsys):
+        results_file = tmp_path / "results.jsonl"
+        assert main(["batch", str(manifest), "--workers", "2",
+                     "--results", str(results_file)]) == 1
+        results = [json.loads(line) for line in results_file.read_text().splitlines()]
+        assert [result["ok"] for result in results] == [True, True, False]
+        assert results[0]["stages"]["embed"]["calls"] == 1
+        assert "1 failed" in capsys.readouterr().err
+
+        decode_jobs = [{"op": "decode", "file": result["result"], "num_lsb": result.get("num_lsb", 1)}
+                       for result in results[:2]]
+        results_file = io.StringIO()
+        summary = run_batch(decode_jobs, workers=2, results_file=results_file)
+        assert summary["failed"] == 0
+        results = [json.loads(line) for line in results_file.getvalue().splitlines()]
+        assert [result["result"] for result in results] == ["image secret", "audio secret"]
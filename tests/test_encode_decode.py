@@ -1,12 +1,17 @@
+import io
 import os
 import pytest
+import subprocess
 import wave
+from collections import namedtuple
 
 import numpy as np
 import cv2
 
 from steganography.decoder import ImageDecoder, AudioDecoder, VideoDecoder
-from steganography.encoder import ImageEncoder, AudioEncoder, VideoEncoder
+from steganography.encoder import ImageEncoder, AudioEncoder, VideoEncoder, VIDEO_CODECS
+from steganography.steganography import Steganography
+from steganography.header import HEADER_SIZE
 
 
 class TestEncodeDecode:
@@ -112,6 +117,28 @@ We'll take our leave and go"""
                 decoded_str = decoder.decode(encoded_data, num_lsb)
                 assert TestEncodeDecode.input_str == decoded_str
 
+    def test_decode_without_payload(self, audio, image):
+        for encoder, decoder, cover_filename in [image, audio]:
+            cover_file, params = encoder.read_file(cover_filename)
+            with pytest.raises(ValueError):
+                decoder.decode(cover_file, 1)
+
+    def test_detect_num_lsb(self, audio, image):
+        rng = np.random.default_rng(2)
+        covers = [(image[0], image[1], image[0].read_file(image[2])[0]),
+                  (audio[0], audio[1], audio[0].read_file(audio[2])[0]),
+                  (VideoEncoder(), VideoDecoder(), rng.integers(0, 256, (2, 8, 8, 3), np.uint8)),
+                  (ImageEncoder(), ImageDecoder(), rng.integers(0, 2 ** 16, (64, 64, 3), np.uint16))]
+        for encoder, decoder, cover_file in covers:
+            for num_lsb in range(1, 9):
+                encoded_data = encoder.encode(cover_file, "detect me", num_lsb)
+                assert decoder.decode(encoded_data, None) == "detect me"
+            with pytest.raises(ValueError):
+                decoder.decode(cover_file, None)
+        # frames are only pulled as far as the header reaches
+        frames = iter(encoder.encode(covers[2][2], "detect me", 1))
+        assert VideoDecoder().decode(frames, None) == "detect me"
+
     def test_file_integrity(self, audio, image, video, lsb):
         for encoder, decoder, cover_filename in [image, audio, video]:
             cover_file, params = encoder.read_file(cover_filename)
@@ -156,4 +183,228 @@ We'll take our leave and go"""
             assert np.allclose(encoded_data, encoded_read_data)
             decoded_str = decoder.decode(encoded_read_data, num_lsb)
             assert TestEncodeDecode.input_str == decoded_str
-            os.remove(output_temp_filename)
\ No newline at end of file
+            os.remove(output_temp_filename)
+
+    def test_batched_encode(self, video, lsb):
+        encoder, decoder, cover_filename = video
+        cover_file, params = encoder.read_file(cover_filename)
+        secret_data = TestEncodeDecode.input_str * 500
+        for num_lsb in lsb:
+            expected = encoder.encode(cover_file, secret_data, num_lsb)
+            video_capture, _ = encoder.open_file(cover_filename)
+            minibatches = list(encoder.batched_encode(
+                video_capture, secret_data, num_lsb, minibatch_size=7))
+            assert all(len(minibatch) <= 7 for minibatch in minibatches)
+            encoded_data = np.concatenate(minibatches)
+            assert np.array_equal(expected, encoded_data)
+            assert decoder.decode(encoded_data, num_lsb) == secret_data
+
+    def test_lazy_video_decode(self, video):
+        encoder, decoder, cover_filename = video
+        frames, params = decoder.open_file(cover_filename)
+        first_frames = [next(frames), next(frames)]
+        frames.close()
+        encoded_data = encoder.encode(
+            np.array(first_frames), TestEncodeDecode.input_str, 1)
+        pulled = []
+
+        def frame_iterator():
+            for frame in encoded_data:
+                pulled.append(frame)
+                yield frame
+        assert decoder.decode(frame_iterator(), 1) == TestEncodeDecode.input_str
+        assert len(pulled) == 1
+
+    def test_video_audio_failure_is_reported(self, video, tmp_path):
+        encoder, decoder, cover_filename = video
+        frames = np.zeros((2, 16, 16, 3), np.uint8)
+        VideoParams = namedtuple("VideoParams", ["fps", "width", "height", "filename"])
+        # PCM audio is stream-copied into AVI, Opus cannot be
+        encoder.write_file(frames, str(tmp_path / "pcm.avi"),
+                           VideoParams(30.0, 16.0, 16.0, "tests/test.wav"))
+        audio_filename = str(tmp_path / "audio.mka")
+        subprocess.run(
+            ["ffmpeg", "-loglevel", "error", "-y", "-f", "lavfi", "-i", "sine=duration=0.2",
+             "-ar", "48000", "-c:a", "opus", "-strict", "-2", audio_filename],
+            check=True)
+        with pytest.raises(RuntimeError, match=r"ffmpeg failed to write .*codec"):
+            encoder.write_file(frames, str(tmp_path / "opus.avi"),
+                               VideoParams(30.0, 16.0, 16.0, audio_filename))
+
+    def test_video_codecs(self, video):
+        encoder, decoder, cover_filename = video
+        rng = np.random.default_rng(0)
+        frames = rng.integers(0, 256, (5, 48, 64, 3), dtype=np.uint8)
+        params = namedtuple("VideoParams", ["fps", "width", "height"])(30.0, 64.0, 48.0)
+        output_temp_filename = "tests/output.avi"
+        for codec in VIDEO_CODECS:
+            encoder = VideoEncoder(codec)
+            for num_lsb in (1, 3):
+                encoded_data = encoder.encode(
+                    frames, TestEncodeDecode.input_str[:100], num_lsb)
+                encoder.write_file(encoded_data, output_temp_filename, params)
+                encoded_read_data, _ = decoder.read_file(output_temp_filename)
+                assert np.array_equal(encoded_data, encoded_read_data)
+                assert decoder.decode(encoded_read_data, num_lsb) \
+                    == TestEncodeDecode.input_str[:100]
+                os.remove(output_temp_filename)
+        with pytest.raises(ValueError):
+            VideoEncoder("mjpeg")
+
+    def test_parallel_video_decode(self, video):
+        encoder, decoder, cover_filename = video
+        rng = np.random.default_rng(1)
+        frames = rng.integers(0, 256, (10, 48, 64, 3), dtype=np.uint8)
+        params = namedtuple("VideoParams", ["fps", "width", "height"])(30.0, 64.0, 48.0)
+        secret = "".join(chr(c) for c in rng.integers(32, 127, 5000))
+        output_temp_filename = "tests/output.avi"
+        for num_lsb in (1, 3):
+            encoder.write_file(encoder.encode(frames, secret, num_lsb), output_temp_filename, params)
+            assert decoder.parallel_decode(output_temp_filename, num_lsb, workers=2) == secret
+            assert decoder.decode(decoder.open_file(output_temp_filename)[0], num_lsb) == secret
+            os.remove(output_temp_filename)
+
+    def test_audio_encode_file(self, audio, lsb):
+        encoder, decoder, cover_filename = audio
+        output_temp_filename = "tests/output.wav"
+        with open(cover_filename, "rb") as f:
+            cover_bytes = f.read()
+        for num_lsb in lsb:
+            params = encoder.encode_file(
+                cover_filename, TestEncodeDecode.input_str, output_temp_filename, num_lsb)
+            encoded_read_data, read_data_params = decoder.read_file(
+                output_temp_filename)
+            assert params == read_data_params
+            assert decoder.decode(encoded_read_data, num_lsb) == TestEncodeDecode.input_str
+            del encoded_read_data
+            # only the samples holding the payload differ from the cover
+            with open(output_temp_filename, "rb") as f:
+                encoded_bytes = f.read()
+            assert len(encoded_bytes) == len(cover_bytes)
+            changed = np.flatnonzero(
+                np.frombuffer(encoded_bytes, np.uint8) != np.frombuffer(cover_bytes, np.uint8))
+            assert changed.max() - changed.min() < len(TestEncodeDecode.input_str) * 4
+            os.remove(output_temp_filename)
+
+    def test_sample_widths(self, tmp_path, lsb):
+        rng = np.random.default_rng(0)
+        stega = Steganography()
+        covers = []
+        for sampwidth in (1, 2, 3, 4):
+            for nchannels in (1, 2):
+                cover_filename = str(tmp_path / f"cover_{sampwidth}_{nchannels}.wav")
+                with wave.open(cover_filename, "wb") as audio:
+                    audio.setnchannels(nchannels)
+                    audio.setsampwidth(sampwidth)
+                    audio.setframerate(8000)
+                    audio.writeframes(rng.integers(0, 256, 30000 * sampwidth * nchannels,
+                                                   dtype=np.uint8).tobytes())
+                covers.append(cover_filename)
+        for ext in ("png", "tiff"):
+            cover_filename = str(tmp_path / f"cover_16.{ext}")
+            cv2.imwrite(cover_filename, rng.integers(0, 2 ** 16, (64, 96, 3), dtype=np.uint16))
+            covers.append(cover_filename)
+        for cover_filename in covers:
+            for num_lsb in lsb:
+                output_filename = stega.encode(
+                    cover_filename, TestEncodeDecode.input_str,
+                    str(tmp_path / "output"), num_lsb)
+                assert stega.decode(output_filename, num_lsb) == TestEncodeDecode.input_str
+                cover_data, _ = stega.decoder.read_file(cover_filename)
+                encoded_data, _ = stega.decoder.read_file(output_filename)
+                assert cover_data.dtype == encoded_data.dtype
+                cover_data = cover_data.view(np.uint8).reshape(-1, cover_data.dtype.itemsize)
+                encoded_data = encoded_data.view(np.uint8).reshape(-1, encoded_data.dtype.itemsize)
+                # only the low byte of the first samples may differ
+                assert np.array_equal(cover_data[:, 1:], encoded_data[:, 1:])
+                changed = np.flatnonzero(cover_data[:, 0] != encoded_data[:, 0])
+                assert changed.max() < len(TestEncodeDecode.input_str) * 8
+
+    def test_binary_payloads(self, audio, image, video, tmp_path):
+        rng = np.random.default_rng(19)
+        secret = rng.integers(0, 256, 3000, dtype=np.uint8).tobytes()
+        for encoder, decoder, cover_filename in [image, audio]:
+            cover_file, params = encoder.read_file(cover_filename)
+            for secret_data in (secret, memoryview(secret), io.BytesIO(secret)):
+                encoded_data = encoder.encode(cover_file, secret_data, 2)
+                assert decoder.decode(encoded_data, 2) == secret
+            output = io.BytesIO()
+            assert decoder.decode(encoded_data, 2, output) == len(secret)
+            assert output.getvalue() == secret
+        # files are streamed into WAV copies and video minibatches
+        encoder, decoder, cover_filename = audio
+        output_temp_filename = str(tmp_path / "output.wav")
+        encoder.encode_file(cover_filename, io.BytesIO(secret), output_temp_filename, 3)
+        assert decoder.decode(decoder.read_file(output_temp_filename)[0], 3) == secret
+        encoder, decoder, cover_filename = video
+        video_capture, _ = encoder.open_file(cover_filename)
+        encoded_data = np.concatenate(list(encoder.batched_encode(
+            video_capture, io.BytesIO(secret), 1, minibatch_size=2)))
+        assert decoder.decode(encoded_data, 1) == secret
+        # text payloads still decode to str
+        stega = Steganography()
+        output_file = stega.encode(
+            "tests/black_128.png", TestEncodeDecode.input_str, str(tmp_path / "out"), 1)
+        assert stega.decode(output_file, 1) == TestEncodeDecode.input_str
+
+    def test_compression(self, audio, image, video, tmp_path):
+        secret = TestEncodeDecode.input_str * 50
+        for encoder, decoder, cover_filename in [image, audio, video]:
+            cover_file, params = encoder.read_file(cover_filename)
+            for compression in ("zlib", "bz2", "lzma"):
+                encoder.compression = compression
+                encoded_data = encoder.encode(cover_file, secret, 2)
+                assert decoder.decode(encoded_data, 2) == secret
+            encoder.compression = None
+        stega = Steganography()
+        estimate = stega.estimate_compression("tests/black_128.png", secret, 1, "lzma")
+        assert estimate.payload_size > estimate.capacity
+        assert estimate.fits and estimate.effective_capacity > estimate.capacity
+        with pytest.raises(ValueError):
+            stega.encode("tests/black_128.png", secret, str(tmp_path / "output"), 1)
+        output_file = stega.encode(
+            "tests/black_128.png", secret, str(tmp_path / "output"), 1, "lzma", 9)
+        assert stega.decode(output_file, None) == secret
+        with pytest.raises(ValueError):
+            VideoEncoder(compression="zip")
+
+    def test_capacity(self, tmp_path):
+        stega = Steganography()
+        for cover_filename in ("tests/black_128.png", "tests/test.wav"):
+            for num_lsb in (1, 3):
+                capacity = stega.capacity(cover_filename, num_lsb)
+                output_file = stega.encode(
+                    cover_filename, "a" * capacity, str(tmp_path / "output"), num_lsb)
+                assert stega.decode(output_file, num_lsb) == "a" * capacity
+                with pytest.raises(ValueError):
+                    stega.encode(
+                        cover_filename, "a" * (capacity + 1), str(tmp_path / "output"), num_lsb)
+        assert stega.capacity("tests/black_128.png", 8) == 128 * 72 * 3 - HEADER_SIZE
+        with pytest.raises(ValueError):
+            stega.capacity("tests/black_128.png", 9)
+
+
+    def test_failed_encode_keeps_files(self, tmp_path):
+        stega = Steganography()
+        cover_filename = str(tmp_path / "cover.bmp")
+        cv2.imwrite(cover_filename, cv2.imread("tests/black_128.png"))
+        with open(cover_filename, "rb") as f:
+            cover = f.read()
+        with pytest.raises(ValueError, match="overwrite the cover"):
+            stega.encode(cover_filename, "secret", str(tmp_path / "cover"), 1)
+
+        # an existing output is only replaced by a successful encode
+        output_filename = str(tmp_path / "output.bmp")
+        with open(output_filename, "wb") as f:
+            f.write(b"previous output")
+        with pytest.raises(ValueError, match="ASCII"):
+            stega.encode(cover_filename, "café", str(tmp_path / "output"), 1)
+        with open(output_filename, "rb") as f:
+            assert f.read() == b"previous output"
+        with open(cover_filename, "rb") as f:
+            assert f.read() == cover
+
+        # a new output is removed when the encode fails
+        with pytest.raises(ValueError, match="ASCII"):
+            stega.encode(cover_filename, "café", str(tmp_path / "new"), 1)
+        assert not os.path.exists(tmp_path / "new.bmp")
@@ -0,0 +1,51 @@
+import io
+import subprocess
+import sys
+
+import pytest
+
+import steganography.handlers as handlers
+from steganography.encoder import AudioEncoder
+from steganography.decoder import AudioDecoder
+from steganography.steganography import Steganography
+
+
+class TestHandlers:
+
+    @pytest.fixture
+    def custom_handler(self):
+        handler = handlers.MediaHandler(
+            "pcm", ("wav", "pcm"),
+            "steganography.encoder:AudioEncoder", "steganography.decoder:AudioDecoder", streaming="file")
+        audio = handlers.get_handler("audio")
+        handlers.register(handler)
+        yield handler
+        handlers.register(audio)
+        del handlers._extensions["pcm"]
+        del handlers._handlers["pcm"]
+
+    def test_lookup(self):
+        assert handlers.handler_for("a/b.png").media_type == "image"
+        assert handlers.handler_for("b.wav").media_type == "audio"
+        assert handlers.handler_for("b.mp4").media_type == "video"
+        assert handlers.load(handlers.get_handler("audio").encoder) is AudioEncoder
+        with pytest.raises(io.UnsupportedOperation):
+            handlers.handler_for("b.txt")
+
+    def test_register(self, custom_handler, tmp_path):
+        assert handlers.handler_for("b.wav") is custom_handler
+        stega = Steganography()
+        output_file = stega.encode("tests/test.wav", "secret", str(tmp_path / "output"), 2)
+        assert stega.media_type == "pcm" and isinstance(stega.decoder, AudioDecoder)
+        # the cover was patched in place by `encode_file`, not read whole
+        assert stega.encoded_data is None
+        assert stega.decode(output_file, 2) == "secret"
+
+    def test_backends_imported_lazily(self):
+        code = ("import sys\n"
+                "from steganography.steganography import Steganography\n"
+                "Steganography().capacity('tests/test.wav')\n"
+                "assert 'cv2' not in sys.modules and 'ffmpeg' not in sys.modules\n"
+                "Steganography().capacity('tests/black_128.png')\n"
+                "assert 'ffmpeg' not in sys.modules\n")
+        subprocess.run([sys.executable, "-c", code], check=True)
@@ -0,0 +1,44 @@
+from collections import namedtuple
+
+import numpy as np
+
+import steganography.instrument as instrument
+from steganography.decoder import VideoDecoder
+from steganography.encoder import VideoEncoder
+from steganography.steganography import Steganography
+
+
+class TestInstrument:
+
+    def test_recording(self, tmp_path):
+        stega = Steganography()
+        with stega.recording() as recorder:
+            output_file = stega.encode("tests/black_128.png", "secret", str(tmp_path / "output"), 2)
+            assert stega.decode(output_file, 2) == "secret"
+        assert {"probe", "read", "pack", "embed", "write", "header", "extract"} <= set(recorder.stages)
+        assert recorder.stages["read"].calls == 2
+        assert recorder.stages["read"].frames == 2
+        assert recorder.stages["pack"].bytes == len("secret")
+        assert recorder.stages["extract"].bytes == len("secret")
+        assert stega.reporter is instrument.NULL_REPORTER
+
+    def test_progress_per_chunk(self, tmp_path):
+        progress = []
+        reporter = instrument.CallbackReporter(on_progress=lambda *args: progress.append(args))
+        rng = np.random.default_rng(0)
+        frames = rng.integers(0, 256, (10, 48, 64, 3), dtype=np.uint8)
+        params = namedtuple("VideoParams", ["fps", "width", "height"])(30.0, 64.0, 48.0)
+        cover_filename = str(tmp_path / "cover.avi")
+        VideoEncoder().write_file(frames, cover_filename, params)
+
+        encoder = VideoEncoder(reporter=reporter)
+        video, params = encoder.open_file(cover_filename)
+        output_filename = str(tmp_path / "output.avi")
+        encoder.write_file(encoder.batched_encode(video, "x" * 1000, 1, minibatch_size=4),
+                           output_filename, params)
+        assert progress == [("encode", 4, 10), ("encode", 8, 10), ("encode", 10, 10)]
+
+        progress.clear()
+        decoder = VideoDecoder(reporter=reporter)
+        assert decoder.decode(decoder.open_file(output_filename)[0], 1) == "x" * 1000
+        assert progress == [("decode", 1000, 1000)]
@@ -0,0 +1,91 @@
+import os
+import threading
+import time
+
+import pytest
+
+from steganography.jobs import JobExecutor
+from steganography.steganography import Steganography
+
+
+def _dispatch_until_finished(executor, job, timeout=60):
+    deadline = time.monotonic() + timeout
+    while not job.finished:
+        assert time.monotonic() < deadline, "job did not finish"
+        executor.dispatch()
+        time.sleep(0.01)
+
+
+class TestJobs:
+
+    @pytest.fixture
+    def executor(self):
+        executor = JobExecutor(workers=1, max_pending=1)
+        yield executor
+        executor.shutdown()
+
+    def test_done_and_error(self, executor, tmp_path):
+        results = []
+        stega = Steganography()
+
+        def encode(reporter):
+            with stega.reporting(reporter):
+                return stega.encode("tests/black_128.png", "secret", str(tmp_path / "output"), 2)
+
+        job = executor.submit(encode, on_done=results.append, on_progress=lambda *args: results.append(args))
+        _dispatch_until_finished(executor, job)
+        assert results[-1] == str(tmp_path / "output.bmp")
+        assert results[0] == ("encode", 6, 6)
+
+        job = executor.submit(lambda reporter: stega.decode("missing.png"), on_error=results.append)
+        _dispatch_until_finished(executor, job)
+        assert isinstance(results[-1], FileNotFoundError)
+        assert executor.jobs == []
+
+    def test_callbacks_on_dispatching_thread(self, executor):
+        threads = []
+        job = executor.submit(
+            lambda reporter: threading.current_thread(), on_done=lambda thread: threads.extend(
+                [thread, threading.current_thread()]))
+        _dispatch_until_finished(executor, job)
+        assert threads[0] is not threads[1] and threads[1] is threading.current_thread()
+
+    def test_bounded(self, executor):
+        release = threading.Event()
+        running = executor.submit(lambda reporter: release.wait())
+        queued = executor.submit(lambda reporter: "never run", on_done=pytest.fail)
+        with pytest.raises(RuntimeError):
+            executor.submit(lambda reporter: None)
+        cancelled = []
+        queued.on_cancelled = lambda: cancelled.append(queued.id)
+        queued.cancel()
+        release.set()
+        _dispatch_until_finished(executor, running)
+        _dispatch_until_finished(executor, queued)
+        assert cancelled == [queued.id]
+        # both slots are free again
+        executor.submit(lambda reporter: None)
+        executor.submit(lambda reporter: None)
+
+    def test_cancel_running_encode(self, executor, tmp_path):
+        started, release = threading.Event(), threading.Event()
+        stega = Steganography()
+        output_file = str(tmp_path / "output")
+
+        def encode(reporter):
+            started.set()
+            release.wait()
+            with stega.reporting(reporter):
+                return stega.encode("tests/test.mp4", "secret" * 100, output_file, 1)
+
+        outcome = []
+        job = executor.submit(encode, on_done=outcome.append, on_error=outcome.append,
+                              on_cancelled=lambda: outcome.append("cancelled"))
+        assert started.wait(10)
+        executor.cancel_all()
+        release.set()
+        _dispatch_until_finished(executor, job)
+        assert outcome == ["cancelled"]
+        # the partial output is removed and the instance is usable again
+        assert not os.path.exists(output_file + ".avi")
+        assert stega.reporter is not None and not hasattr(stega.reporter, "job")
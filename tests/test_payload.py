@@ -0,0 +1,70 @@
+import io
+
+import pytest
+
+import numpy as np
+
+import steganography.bitplane as bitplane
+import steganography.header as header
+import steganography.payload as payload
+
+
+class TestPayload:
+
+    @pytest.fixture
+    def data(self):
+        rng = np.random.default_rng(2019)
+        return rng.integers(0, 256, 1001, dtype=np.uint8).tobytes()
+
+    def test_symbol_stream_matches_pack(self, data):
+        for num_lsb in range(1, 9):
+            payload_header = header.PayloadHeader(len(data), num_lsb, header.FLAG_BINARY)
+            expected = bitplane.pack(header.pack_header(payload_header) + data, num_lsb)
+            for secret_data in (data, bytearray(data), memoryview(data), io.BytesIO(data)):
+                stream = payload.SymbolStream(secret_data, num_lsb, chunk_size=37)
+                assert len(stream) == len(expected)
+                symbols = np.concatenate([stream.read(100) for _ in range(-(-len(expected) // 100))])
+                assert np.array_equal(symbols, expected)
+                assert len(stream) == 0
+
+    def test_text_and_size(self, data):
+        assert payload.payload_header("abc", 2) == header.PayloadHeader(3, 2)
+        with pytest.raises(ValueError):
+            payload.payload_header("é", 2)
+        f = io.BytesIO(data)
+        f.seek(1)
+        assert payload.payload_size(f) == len(data) - 1
+        assert f.tell() == 1
+        with pytest.raises(TypeError):
+            payload.payload_size(42)
+
+    def test_short_file(self, data):
+        class Truncated(io.BytesIO):
+            def seekable(self):
+                return True
+
+            def seek(self, offset, whence=io.SEEK_SET):
+                # announces one byte more than it holds
+                position = super().seek(offset, whence)
+                return position + 1 if whence == io.SEEK_END else position
+        stream = payload.SymbolStream(Truncated(data), 4)
+        with pytest.raises(ValueError):
+            stream.read(len(stream))
+
+    def test_compression(self, data):
+        text = "the quick brown fox jumps over the lazy dog " * 200
+        for compression in payload.CODECS:
+            for secret_data in (text, data, io.BytesIO(data)):
+                stream = payload.SymbolStream(secret_data, 3, compression=compression)
+                assert stream.header.flags & header.COMPRESSION_MASK
+                embedded = bitplane.BitReader([stream.read(len(stream))], 3).read_bytes(
+                    header.HEADER_SIZE + stream.header.length)[header.HEADER_SIZE:]
+                restored = b"".join(payload.decompress([embedded], stream.header.flags))
+                assert restored == (text.encode() if secret_data is text else data)
+            assert payload.SymbolStream(text, 1, compression=compression).header.length < len(text)
+            with pytest.raises(ValueError):
+                payload.get_codec(compression, 10)
+            with pytest.raises(ValueError):
+                list(payload.decompress([embedded[:-10]], stream.header.flags))
+        with pytest.raises(ValueError):
+            payload.get_codec("zip")
@@ -0,0 +1,43 @@
+import os
+
+import cv2
+import numpy as np
+
+import steganography.preview as preview
+from steganography.preview import PreviewCache
+
+
+class TestPreview:
+
+    def test_reduced_image(self, tmp_path):
+        filename = str(tmp_path / "large.jpg")
+        cv2.imwrite(filename, np.full((1000, 2000, 3), (255, 0, 0), dtype=np.uint8))
+        image = preview.image_preview(filename)
+        assert image.shape == (100, 200, 3) and image.dtype == np.uint8
+        # BGR on disk, RGB in the preview
+        assert image[50, 100, 2] > 200 and image[50, 100, 0] < 50
+        # small images are not upscaled
+        assert preview.image_preview("tests/black_128.png").shape == cv2.imread("tests/black_128.png").shape
+
+    def test_video(self):
+        image = preview.video_preview("tests/test.mp4", (100, 100))
+        assert max(image.shape[:2]) == 100 and image.shape[2] == 3
+
+    def test_cache(self, tmp_path):
+        filename = str(tmp_path / "cover.png")
+        cv2.imwrite(filename, np.zeros((300, 300, 3), dtype=np.uint8))
+        previews = PreviewCache(max_entries=2)
+        first = previews.get(filename)
+        assert previews.get(filename) is first
+        assert (previews.hits, previews.misses) == (1, 1)
+
+        # a modified file gets a new preview
+        cv2.imwrite(filename, np.full((300, 300, 3), 255, dtype=np.uint8))
+        stat = os.stat(filename)
+        os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        assert previews.get(filename).min() == 255
+
+        assert previews.get("tests/test.wav") is None
+        previews.get("tests/black_128.png")
+        previews.get("tests/test.mp4")
+        assert len(previews) == 2
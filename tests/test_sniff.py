@@ -0,0 +1,69 @@
+import io
+import shutil
+
+import pytest
+
+import steganography.handlers as handlers
+import steganography.sniff as sniff
+from steganography.steganography import Steganography
+
+
+class TestSniff:
+
+    @pytest.fixture
+    def heads(self):
+        return {
+            b"RIFF\x24\x00\x00\x00WAVEfmt ": ("wav", "audio"),
+            b"RIFF\x24\x00\x00\x00AVI LIST": ("avi", "video"),
+            b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR": ("png", "image"),
+            b"BM\x36\x00\x0c\x00\x00\x00\x00\x00\x36\x00\x00\x00": ("bmp", "image"),
+            b"II*\x00\x08\x00\x00\x00": ("tiff", "image"),
+            b"MM\x00*\x00\x00\x00\x08": ("tiff", "image"),
+            b"\x1a\x45\xdf\xa3\x9f\x42\x86\x81": ("mkv", "video"),
+            b"\x00\x00\x00\x20ftypisom": ("mp4", "video"),
+            b"\x00\x00\x00\x1cftypavif": ("avif", "image"),
+            b"\x00\x00\x00\x20ftypM4A ": ("m4a", "audio"),
+            b"OggS\x00\x02\x00\x00\x00\x00\x00\x00": ("ogg", None),
+        }
+
+    def test_sniff_bytes(self, heads):
+        for head, expected in heads.items():
+            assert sniff.sniff_bytes(head) == expected
+        assert sniff.sniff_bytes(b"BMP is not a bitmap") is None
+        assert sniff.sniff_bytes(b"") is None
+
+    def test_sniff_stream(self, heads):
+        stream = io.BytesIO(b"junk" + next(iter(heads)))
+        stream.seek(4)
+        assert sniff.sniff(stream) == ("wav", "audio")
+        assert stream.tell() == 4
+        with open("tests/test.wav", "rb") as f:
+            assert sniff.sniff(f) == ("wav", "audio")
+            assert f.tell() == 0
+
+    def test_mislabeled_file(self, tmp_path):
+        mislabeled = str(tmp_path / "cover.png")
+        shutil.copyfile("tests/test.wav", mislabeled)
+        assert sniff.media_type(mislabeled) == "audio"
+        assert handlers.handler_for(mislabeled).media_type == "audio"
+        stega = Steganography()
+        output_file = stega.encode(mislabeled, "secret", str(tmp_path / "output"), 2)
+        assert output_file.endswith(".wav")
+        assert stega.decode(output_file, 2) == "secret"
+        # unknown content falls back to the extension
+        unknown = tmp_path / "notes.MP4"
+        unknown.write_bytes(b"not a video")
+        assert sniff.media_type(str(unknown)) == "video"
+        assert sniff.media_type(str(tmp_path / "missing.txt")) is None
+        # Ogg may hold audio or video, the extension decides
+        for name, expected in (("song.opus", None), ("clip.ogv", "video")):
+            ogg = tmp_path / name
+            ogg.write_bytes(b"OggS" + bytes(60))
+            assert sniff.media_type(str(ogg)) == expected
+        with pytest.raises(io.UnsupportedOperation):
+            handlers.handler_for(str(tmp_path / "song.opus"))
+        assert handlers.handler_for(str(tmp_path / "clip.ogv")).media_type == "video"
+        # M4A audio is not routed to the video handler despite its MP4 container
+        m4a = tmp_path / "song.mp4"
+        m4a.write_bytes(b"\x00\x00\x00\x20ftypM4A " + bytes(24))
+        assert handlers.handler_for(str(m4a)).media_type == "audio"